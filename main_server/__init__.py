@@ -1 +1 @@
-from .main import startup_event
\ No newline at end of file
+from .main import lifespan
\ No newline at end of file
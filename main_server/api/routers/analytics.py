@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+
+from main_server.api.routers import auth
+from main_server.api.schemas import TopConsumerOut, AnomalyStreakOut, DeviceHistoryOut
+from main_server.core.dependencies import get_device_summary_repository
+from main_server.core.dictionir import MeterCategoryEnum
+from main_server.db.models import User
+from main_server.db.repositories import DeviceSummaryRepository
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/top-consumers", response_model=List[TopConsumerOut])
+async def get_top_consumers(
+        date_from: Optional[datetime] = Query(None, description="Начало периода"),
+        date_to: Optional[datetime] = Query(None, description="Конец периода"),
+        category: Optional[MeterCategoryEnum] = Query(None, description="Фильтр по категории"),
+        limit: int = Query(10, ge=1, le=100, description="Количество устройств"),
+        summary_repo: DeviceSummaryRepository = Depends(get_device_summary_repository),
+        current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Устройства с наибольшим суммарным потреблением по отчетам пользователя за период
+
+    Период отчета учитывается по его началу; повторные отчеты по тем же данным
+    учитываются один раз.
+    """
+    return await summary_repo.get_top_consumers(
+        user_id=current_user.id, date_from=date_from, date_to=date_to, category=category, limit=limit
+    )
+
+
+@router.get("/anomaly-streaks", response_model=List[AnomalyStreakOut])
+async def get_anomaly_streaks(
+        min_reports: int = Query(3, ge=1, description="Минимальное число последовательных отчетов с аномалиями"),
+        date_from: Optional[datetime] = Query(None, description="Начало периода"),
+        date_to: Optional[datetime] = Query(None, description="Конец периода"),
+        summary_repo: DeviceSummaryRepository = Depends(get_device_summary_repository),
+        current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Устройства, у которых аномалии найдены в min_reports и более отчетах подряд
+    """
+    return await summary_repo.get_anomaly_streaks(
+        user_id=current_user.id, min_reports=min_reports, date_from=date_from, date_to=date_to
+    )
+
+
+@router.get("/devices/{device_id}", response_model=DeviceHistoryOut)
+async def get_device_history(
+        device_id: UUID,
+        date_from: Optional[datetime] = Query(None, description="Начало периода"),
+        date_to: Optional[datetime] = Query(None, description="Конец периода"),
+        summary_repo: DeviceSummaryRepository = Depends(get_device_summary_repository),
+        current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Итоги устройства по отчетам пользователя в хронологическом порядке
+    """
+    summaries = await summary_repo.get_device_history(
+        user_id=current_user.id, device_id=device_id, date_from=date_from, date_to=date_to
+    )
+    return {"device_id": device_id, "summaries": summaries}
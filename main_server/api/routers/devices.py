@@ -0,0 +1,66 @@
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from main_server.api.routers import auth
+from main_server.api.schemas import DeviceOut, DevicePaginationResponse, DeviceUpdate
+from main_server.core.dependencies import get_device_repository, get_admin_user
+from main_server.core.dictionir import MeterCategoryEnum
+from main_server.db.repositories import DeviceRepository
+from main_server.services.device_service import DeviceService
+
+router = APIRouter(prefix="/devices", tags=["devices"])
+
+
+@router.get("/", response_model=DevicePaginationResponse)
+async def get_devices(
+        category: Optional[MeterCategoryEnum] = Query(None, description="Фильтр по категории"),
+        search: Optional[str] = Query(None, description="Подстрока названия устройства"),
+        page: int = Query(default=1, ge=1, description="Номер страницы"),
+        per_page: int = Query(default=50, ge=1, le=500, description="Количество на странице"),
+        device_repo: DeviceRepository = Depends(get_device_repository),
+        _=Depends(auth.get_current_user),
+):
+    """
+    Реестр устройств: постоянные ID и категории счетчиков из загруженных выгрузок
+    """
+    devices, total = await device_repo.list_devices(
+        category=category, search=search, offset=(page - 1) * per_page, limit=per_page
+    )
+    total_pages = (total + per_page - 1) // per_page
+    return {
+        "devices": devices,
+        "pagination": {
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "total_pages": total_pages,
+            "has_next": page < total_pages,
+            "has_prev": page > 1
+        }
+    }
+
+
+@router.patch("/{device_id}", response_model=DeviceOut)
+async def update_device(
+        device_id: UUID,
+        update: DeviceUpdate,
+        device_repo: DeviceRepository = Depends(get_device_repository),
+        _=Depends(get_admin_user),
+):
+    """
+    Переназначить категорию и/или метаданные устройства (доступно администраторам)
+
+    Назначенная вручную категория используется во всех следующих отчетах;
+    reset_category возвращает категорию по правилам классификации.
+    """
+    if update.reset_category and update.category is not None:
+        raise HTTPException(400, detail="category and reset_category are mutually exclusive")
+
+    device = await DeviceService(device_repo).update_device(
+        device_id, category=update.category, reset_category=update.reset_category, metadata=update.metadata
+    )
+    if device is None:
+        raise HTTPException(404, detail="Device not found")
+    return device
@@ -2,42 +2,406 @@ from datetime import datetime
 from typing import List, Optional, Tuple
 from uuid import UUID
 
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
 
 from main_server.api.routers import auth
-from main_server.core.dictionir import DeliveryMethodEnum
+from main_server.api.schemas import ReportParams, ReportFromObjects
+from main_server.core.dictionir import DeliveryMethodEnum, ReportFileEnum, ReportFormatEnum, ReportQualityEnum, \
+    UnderutilizationMethodEnum, UserRoles
 from main_server.db.models import User, GeneratedReport
 from main_server.services import ReportDeliveryService
 from main_server.services.report_service import ReportService
 from main_server.core.dependencies import get_s3_storage_repository, get_report_repository, get_report_delivery_service, \
-    get_admin_user
-from main_server.db.repositories import ReportRepository, S3StorageRepository
+    get_admin_user, get_batch_report_service, get_device_repository, get_report_delivery_log_repository
+from main_server.generation_reports import run_in_worker, validate_template, DEFAULT_ANALYSIS_PARAMS
+from main_server.services.batch_report_service import BatchReportService
+from main_server.services.source_files import spool_upload, release_spooled
+from main_server.services.s3_url_generate_service import S3UrlGenerateService
+from main_server.db.config import settings
+from main_server.db.repositories import ReportRepository, S3StorageRepository, DeviceRepository
+from main_server.db.repositories.report_delivery_log_repository import ReportDeliveryLogRepository
 
 router = APIRouter(prefix="/reports")
 
+
+def get_report_params(
+    sigma_threshold: float = Query(DEFAULT_ANALYSIS_PARAMS['sigma_threshold']),
+    window_size: int = Query(DEFAULT_ANALYSIS_PARAMS['window_size']),
+    top_n: int = Query(DEFAULT_ANALYSIS_PARAMS['top_n']),
+    fixed_pct: float = Query(DEFAULT_ANALYSIS_PARAMS['fixed_pct']),
+    percentile: float = Query(DEFAULT_ANALYSIS_PARAMS['percentile']),
+    std_dev: float = Query(DEFAULT_ANALYSIS_PARAMS['std_dev']),
+    best_method: UnderutilizationMethodEnum = Query(DEFAULT_ANALYSIS_PARAMS['best_method']),
+) -> ReportParams:
+    """Параметры анализа из строки запроса; ограничения значений задает ReportParams"""
+    try:
+        return ReportParams(sigma_threshold=sigma_threshold, window_size=window_size, top_n=top_n,
+                            fixed_pct=fixed_pct, percentile=percentile, std_dev=std_dev, best_method=best_method)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("query", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+
 @router.post("/")
 async def create_report(
-    excel_file: UploadFile = File(...),
-    template_file: UploadFile = File(...),
+    excel_file: List[UploadFile] = File(...),
+    template_file: Optional[UploadFile] = File(None),
     report_name: str = "Generated Report",
+    incremental: bool = False,
+    all_sheets: bool = False,
+    output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+    quality: ReportQualityEnum = ReportQualityEnum.FULL,
+    params: ReportParams = Depends(get_report_params),
     storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
     report_repo: ReportRepository = Depends(get_report_repository),
+    device_repo: DeviceRepository = Depends(get_device_repository),
     current_user: User = Depends(auth.get_current_user),
 ):
-    """Create new report"""
-    service = ReportService(storage_repo, report_repo)
+    """
+    Create new report
+
+    Параметры:
+    - excel_file: одна или несколько выгрузок (поле можно передать несколько раз)
+    - incremental: досчитать агрегаты (суммы, простои, аномалии) от ранее загруженной части выгрузки;
+               выгрузка все равно разбирается целиком, а недоиспользование и графики
+               показаний строятся по всему периоду
+    - all_sheets: использовать все листы с показаниями, а не только основной
+    - output_format: docx (по шаблону, с графиками) или xlsx (таблицы и диаграммы Excel, шаблон не нужен)
+    - quality: draft (быстрая проверка данных) или full (полный отчет); у каждого уровня
+               есть предельное время генерации, при превышении возвращается 504
+    - sigma_threshold, window_size, top_n, fixed_pct, percentile, std_dev, best_method:
+               параметры анализа (по умолчанию - значения генератора)
+    """
+    if template_file is None and output_format == ReportFormatEnum.DOCX:
+        raise HTTPException(400, detail="template_file is required for docx reports")
+
+    service = ReportService(storage_repo, report_repo, device_repo)
+    # Файлы копируются на диск по частям: разбор идет по пути, в хранилище - потоковая загрузка
+    spooled: List[str] = []
     try:
+        for file in excel_file:
+            spooled.append(await spool_upload(file, ".xlsx"))
+        template_path = None
+        if template_file is not None:
+            template_path = await spool_upload(template_file, ".docx")
+            spooled.append(template_path)
         return await service.generate_report(
-            excel_data=await excel_file.read(),
-            template_data=await template_file.read(),
+            excel_files=spooled[:len(excel_file)],
+            template_data=template_path,
             report_name=report_name,
             user_id=current_user.id,
+            incremental=incremental,
+            all_sheets=all_sheets,
+            output_format=output_format,
+            quality=quality,
+            params=params.model_dump(mode="json"),
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, detail=str(e))
+    finally:
+        release_spooled(spooled)
+
+
+@router.post("/from-objects")
+async def create_report_from_objects(
+    sources: ReportFromObjects,
+    report_name: str = "Generated Report",
+    incremental: bool = False,
+    all_sheets: bool = False,
+    output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+    quality: ReportQualityEnum = ReportQualityEnum.FULL,
+    params: ReportParams = Depends(get_report_params),
+    storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
+    report_repo: ReportRepository = Depends(get_report_repository),
+    device_repo: DeviceRepository = Depends(get_device_repository),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Create new report from sources uploaded directly to storage
+
+    Файлы загружаются клиентом по ссылкам POST /url-generate/upload, затем их ключи
+    передаются в теле запроса; через API проходят только ключи, а не сами файлы.
+
+    Параметры:
+    - excel_keys: ключи выгрузок в хранилище
+    - template_key: ключ шаблона (не нужен для xlsx)
+    - остальные параметры - как при создании отчета (POST /reports/)
+    """
+    service = ReportService(storage_repo, report_repo, device_repo)
+    return await service.generate_from_objects(
+        excel_keys=sources.excel_keys,
+        template_key=sources.template_key,
+        report_name=report_name,
+        user_id=current_user.id,
+        incremental=incremental,
+        all_sheets=all_sheets,
+        output_format=output_format,
+        quality=quality,
+        params=params.model_dump(mode="json"),
+    )
+
+
+@router.post("/{report_id}/rerender")
+async def rerender_report(
+    report_id: UUID,
+    template_file: Optional[UploadFile] = File(None),
+    report_name: Optional[str] = None,
+    output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+    quality: ReportQualityEnum = ReportQualityEnum.FULL,
+    params: ReportParams = Depends(get_report_params),
+    storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
+    report_repo: ReportRepository = Depends(get_report_repository),
+    device_repo: DeviceRepository = Depends(get_device_repository),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Строит новый отчет по сохраненным данным существующего отчета с другими параметрами
+
+    Исходная выгрузка не загружается и не разбирается повторно.
+
+    Параметры:
+    - report_id: ID исходного отчета
+    - template_file: новый шаблон (по умолчанию - шаблон исходного отчета)
+    - report_name: название нового отчета (по умолчанию - название исходного)
+    - output_format, quality: как при создании отчета
+    - sigma_threshold, window_size, top_n, fixed_pct, percentile, std_dev, best_method:
+               параметры анализа (по умолчанию - значения генератора)
+    """
+    report = await report_repo.get_report_by_id(report_id)
+    if report is None or report.user_id != current_user.id:
+        raise HTTPException(404, detail="Report not found")
+    if report.dataset_url is None:
+        raise HTTPException(400, detail="Report has no stored dataset")
+    if output_format == ReportFormatEnum.DOCX and template_file is None and report.template_url is None:
+        raise HTTPException(400, detail="template_file is required for docx reports")
+
+    service = ReportService(storage_repo, report_repo, device_repo)
+    template_path = await spool_upload(template_file, ".docx") if template_file is not None else None
+    try:
+        return await service.rerender_report(
+            report=report,
+            report_name=report_name or report.report_name,
+            user_id=current_user.id,
+            template_data=template_path,
+            output_format=output_format,
+            quality=quality,
+            params=params.model_dump(mode="json"),
+        )
+    finally:
+        release_spooled([template_path])
+
+
+# Типы содержимого файлов отчета по расширению
+MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+async def get_accessible_report(
+        report_id: UUID,
+        user: User,
+        report_repo: ReportRepository,
+        delivery_log_repo: ReportDeliveryLogRepository
+) -> GeneratedReport:
+    """Отчет, доступный пользователю: автору, администратору или получателю доставки; иначе 404"""
+    report = await report_repo.get_report_by_id(report_id)
+    if report is None or not (
+            report.user_id == user.id
+            or user.user_type == UserRoles.SUPERUSER
+            or await delivery_log_repo.was_delivered(user.id, report_id)
+    ):
+        raise HTTPException(404, detail="Report not found")
+    return report
+
+
+@router.get("/{report_id}/download")
+async def download_report_file(
+    report_id: UUID,
+    file: ReportFileEnum = ReportFileEnum.REPORT,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
+    report_repo: ReportRepository = Depends(get_report_repository),
+    delivery_log_repo: ReportDeliveryLogRepository = Depends(get_report_delivery_log_repository),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Потоковая отдача файла отчета из хранилища
+
+    Файл передается частями, не загружаясь в память целиком. Поддерживаются
+    Range (докачка, ответ 206) и If-None-Match (ответ 304 при совпадении ETag).
+
+    Параметры:
+    - report_id: ID отчета (доступен автору, администратору и получателям отчета)
+    - file: report (отчет), excel (исходная выгрузка) или template (шаблон)
+    """
+    report = await get_accessible_report(report_id, current_user, report_repo, delivery_log_repo)
+    object_name = {
+        ReportFileEnum.REPORT: report.report_url,
+        ReportFileEnum.EXCEL: report.excel_url,
+        ReportFileEnum.TEMPLATE: report.template_url,
+    }[file]
+    if object_name is None:
+        raise HTTPException(404, detail="File not found")
+
+    try:
+        stored = await storage_repo.open_object(object_name, range_header, if_none_match)
+    except ValueError:
+        info = await storage_repo.get_object_info(object_name)
+        size = info["ContentLength"] if info is not None else 0
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    except RuntimeError as e:
+        raise HTTPException(500, detail=str(e))
+    if stored is None:
+        raise HTTPException(404, detail="File not found")
+    if stored.get("NotModified"):
+        return Response(status_code=304, headers={"ETag": if_none_match})
+
+    filename = f"{file.value}.{object_name.rsplit('.', 1)[-1]}"
+    headers = {
+        "Content-Length": str(stored["ContentLength"]),
+        "Accept-Ranges": "bytes",
+        "ETag": stored["ETag"],
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if stored.get("ContentRange"):
+        headers["Content-Range"] = stored["ContentRange"]
+
+    async def chunks():
+        body = stored["Body"]
+        async with body:
+            async for chunk in body.iter_chunks(settings.REPORT_STREAM_CHUNK_KB * 1024):
+                yield chunk
+
+    return StreamingResponse(
+        chunks(),
+        status_code=206 if stored.get("ContentRange") else 200,
+        media_type=MEDIA_TYPES.get(object_name.rsplit('.', 1)[-1], "application/octet-stream"),
+        headers=headers
+    )
+
+
+class BatchItemResponse(BaseModel):
+    index: int
+    report_name: str
+    source_report_id: Optional[UUID] = None
+    status: str
+    report_id: Optional[UUID] = None
+    error: Optional[str] = None
+
+
+class BatchJobResponse(BaseModel):
+    batch_id: UUID
+    status: str
+    output_format: ReportFormatEnum
+    quality: ReportQualityEnum
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    total: int
+    completed: int
+    failed: int
+    running: int
+    pending: int
+    items: List[BatchItemResponse]
+
+
+@router.post("/batch", response_model=BatchJobResponse, status_code=202)
+async def create_report_batch(
+    template_file: Optional[UploadFile] = File(None),
+    excel_file: Optional[List[UploadFile]] = File(None),
+    report_ids: Optional[List[UUID]] = Form(None),
+    report_name: str = "Generated Report",
+    output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+    quality: ReportQualityEnum = ReportQualityEnum.FULL,
+    params: ReportParams = Depends(get_report_params),
+    report_repo: ReportRepository = Depends(get_report_repository),
+    batch_service: BatchReportService = Depends(get_batch_report_service),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Запускает пакетную генерацию отчетов по одному шаблону
+
+    Параметры:
+    - template_file: общий шаблон для всех отчетов пакета (не нужен для xlsx)
+    - excel_file: выгрузки, по одному отчету на файл
+    - report_ids: либо ID ранее сгенерированных отчетов, чьи сохраненные наборы данных
+                  используются повторно (без повторной загрузки и разбора Excel)
+    - report_name: общее название, к нему добавляется имя файла или исходного отчета
+    - output_format: формат отчетов пакета (docx или xlsx)
+    - quality: уровень качества отчетов пакета (draft или full)
+    - sigma_threshold, window_size, top_n, fixed_pct, percentile, std_dev, best_method:
+               параметры анализа отчетов пакета, как при создании отчета (POST /reports/)
+
+    Возвращает:
+    - Состояние пакета; прогресс доступен по GET /reports/batch/{batch_id}
+    """
+    if bool(excel_file) == bool(report_ids):
+        raise HTTPException(400, detail="Provide either excel_file or report_ids")
+    if output_format == ReportFormatEnum.DOCX and template_file is None:
+        raise HTTPException(400, detail="template_file is required for docx reports")
+
+    # Файлы копируются на диск по частям, как при создании отчета; после запуска
+    # пакета временные файлы удаляет он сам
+    spooled: List[str] = []
+    try:
+        template_path = None
+        if output_format == ReportFormatEnum.DOCX:
+            template_path = await spool_upload(template_file, ".docx")
+            spooled.append(template_path)
+            try:
+                await run_in_worker(validate_template, template_path)
+            except ValueError as e:
+                raise HTTPException(400, detail=str(e))
+
+        if excel_file:
+            files = []
+            for file in excel_file:
+                path = await spool_upload(file, ".xlsx")
+                spooled.append(path)
+                files.append((file.filename, path))
+            job = batch_service.submit_files(current_user.id, template_path, files, report_name, output_format,
+                                             quality, params.model_dump(mode="json"))
+        else:
+            reports = []
+            for report_id in report_ids:
+                report = await report_repo.get_report_by_id(report_id)
+                if report is None or report.user_id != current_user.id:
+                    raise HTTPException(404, detail=f"Report {report_id} not found")
+                if report.dataset_url is None:
+                    raise HTTPException(400, detail=f"Report {report_id} has no stored dataset")
+                reports.append(report)
+            job = batch_service.submit_datasets(current_user.id, template_path, reports, report_name,
+                                                output_format, quality, params.model_dump(mode="json"))
+    except BaseException:
+        release_spooled(spooled)
+        raise
+
+    return job.to_dict()
+
+
+@router.get("/batch/{batch_id}", response_model=BatchJobResponse)
+async def get_report_batch(
+    batch_id: UUID,
+    batch_service: BatchReportService = Depends(get_batch_report_service),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Прогресс пакетной генерации и результаты по каждому отчету
+
+    Параметры:
+    - batch_id: ID пакета, полученный при запуске
+    """
+    job = batch_service.get_job(batch_id, current_user.id)
+    if job is None:
+        raise HTTPException(404, detail="Batch not found")
+    return job.to_dict()
 
 
 class SendReportRequest(BaseModel):
@@ -102,8 +466,11 @@ class ReportResponse(BaseModel):
     id: UUID
     report_name: str
     report_url: str
+    report_size: Optional[int] = None
+    download_url: Optional[str] = None
+    download_url_expires_at: Optional[float] = None
     excel_url: str
-    template_url: str
+    template_url: Optional[str] = None
     generated_at: datetime
 
     @classmethod
@@ -112,15 +479,33 @@ class ReportResponse(BaseModel):
             id=report.id,
             report_name=report.report_name,
             report_url=report.report_url,
+            report_size=report.report_size,
             excel_url=report.excel_url,
             template_url=report.template_url,
             generated_at=report.generated_at
         )
 
+
+async def add_download_urls(storage_repo: S3StorageRepository, items: List[dict]) -> List[dict]:
+    """
+    Добавляет к элементам списка ссылки на скачивание report_url одним пакетом:
+    ссылки подписываются локально и повторно выдаются из кэша, пока действительны
+    """
+    urls = await S3UrlGenerateService(storage_repo).generate_download_urls(
+        (item["report_url"] for item in items), settings.PRESIGNED_URL_EXPIRATION_SECONDS
+    )
+    by_key = {url["key"]: url for url in urls}
+    for item in items:
+        item["download_url"] = by_key[item["report_url"]]["url"]
+        item["download_url_expires_at"] = by_key[item["report_url"]]["expires_at"]
+    return items
+
+
 @router.get("/admin", response_model=List[ReportResponse])
 async def get_admin_reports(
         date_from: Optional[datetime] = None,
         date_to: Optional[datetime] = None,
+        include_urls: bool = False,
         admin_user: User = Depends(get_admin_user),
         s3_storage_repository: S3StorageRepository = Depends(get_s3_storage_repository),
         report_repository: ReportRepository = Depends(get_report_repository),
@@ -131,6 +516,7 @@ async def get_admin_reports(
     Параметры:
     - date_from: Начальная дата фильтрации (опционально)
     - date_to: Конечная дата фильтрации (опционально)
+    - include_urls: добавить к каждому отчету ссылку на скачивание (download_url)
 
     Возвращает:
     - Список отчетов в формате ReportResponse
@@ -143,7 +529,10 @@ async def get_admin_reports(
             date_from=date_from,
             date_to=date_to
         )
-        return [ReportResponse.from_orm(report) for report in reports]
+        items = [ReportResponse.from_orm(report).model_dump() for report in reports]
+        if include_urls:
+            items = await add_download_urls(s3_storage_repository, items)
+        return items
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -153,6 +542,9 @@ async def get_admin_reports(
 
 class ReceivedReportModel(BaseModel):
     report_url: str
+    report_size: Optional[int] = None
+    download_url: Optional[str] = None
+    download_url_expires_at: Optional[float] = None
     sender_name: str
     report_name: str
     delivered_at: datetime
@@ -168,8 +560,10 @@ class PaginatedReportsResponse(BaseModel):
 async def get_user_received_reports(
         page: int = 1,
         per_page: int = 10,
+        include_urls: bool = False,
         current_user: User = Depends(auth.get_current_user),
-        service: ReportDeliveryService = Depends(get_report_delivery_service)
+        service: ReportDeliveryService = Depends(get_report_delivery_service),
+        s3_storage_repository: S3StorageRepository = Depends(get_s3_storage_repository)
 ):
     """
     Получает список отчетов, доставленных текущему пользователю с пагинацией.
@@ -177,6 +571,7 @@ async def get_user_received_reports(
     Параметры:
     - page: номер страницы (начиная с 1)
     - per_page: количество записей на странице
+    - include_urls: добавить к каждому отчету ссылку на скачивание (download_url)
 
     Возвращает:
     - items: список отчетов с информацией о URL, отправителе и методах доставки
@@ -188,6 +583,8 @@ async def get_user_received_reports(
             page=page,
             per_page=per_page
         )
+        if include_urls:
+            reports_list = await add_download_urls(s3_storage_repository, reports_list)
 
         return {
             "items": reports_list,
@@ -0,0 +1,46 @@
+from typing import List
+
+from fastapi import APIRouter, Depends
+
+from main_server.api.routers import auth
+from main_server.api.schemas import StorageUsageOut, MyStorageUsageOut, StorageGcOut
+from main_server.core.dependencies import get_admin_user, get_storage_usage_repository, schedule_storage_gc
+from main_server.db.models import User
+from main_server.db.repositories import StorageUsageRepository
+
+router = APIRouter(prefix="/storage", tags=["storage"])
+
+
+@router.get("/usage", response_model=List[StorageUsageOut])
+async def get_storage_usage(
+        usage_repo: StorageUsageRepository = Depends(get_storage_usage_repository),
+        admin_user: User = Depends(get_admin_user),
+):
+    """
+    Объем хранилища по пользователям (файлы их отчетов) по последней сверке хранилища
+    """
+    return await usage_repo.get_all_usage()
+
+
+@router.get("/usage/me", response_model=MyStorageUsageOut)
+async def get_my_storage_usage(
+        usage_repo: StorageUsageRepository = Depends(get_storage_usage_repository),
+        current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Объем хранилища, занятый файлами отчетов текущего пользователя, по последней сверке
+    """
+    usage = await usage_repo.get_usage(current_user.id)
+    if usage is None:
+        return MyStorageUsageOut(object_count=0, total_bytes=0)
+    return usage
+
+
+@router.post("/gc", response_model=StorageGcOut)
+async def run_storage_gc(
+        admin_user: User = Depends(get_admin_user),
+):
+    """
+    Запускает сверку хранилища сейчас, не дожидаясь очередного периода
+    """
+    return StorageGcOut(job_id=await schedule_storage_gc(run_now=True))
@@ -1,7 +1,12 @@
-from fastapi import Query, APIRouter, Depends
+from fastapi import Query, APIRouter, Depends, HTTPException
 
-from main_server.core.dependencies import get_s3_storage_repository
-from main_server.db.repositories import S3StorageRepository
+from main_server.api.routers import auth
+from main_server.api.schemas import MAX_SOURCE_FILES, SourceUploadOut, DownloadUrlsRequest, DownloadUrlsOut
+from main_server.core.dependencies import get_s3_storage_repository, get_report_repository
+from main_server.core.dictionir import UserRoles
+from main_server.db.config import settings
+from main_server.db.models import User
+from main_server.db.repositories import S3StorageRepository, ReportRepository
 from main_server.services.s3_url_generate_service import S3UrlGenerateService
 
 router = APIRouter(prefix="/url-generate")
@@ -9,8 +14,63 @@ router = APIRouter(prefix="/url-generate")
 @router.get("/download")
 async def get_download_url(
     object_key: str = Query(..., description="S3 object key to download"),
-    s3_storage_repo: S3StorageRepository = Depends(get_s3_storage_repository)
+    s3_storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
+    report_repo: ReportRepository = Depends(get_report_repository),
+    current_user: User = Depends(auth.get_current_user),
 ):
+    """
+    Download URL for one object
+
+    Only files of reports the caller created or received (any report for a superuser)
+    are signed; for other keys the response is 404, as for a missing report.
+    """
+    allowed = await report_repo.get_accessible_object_keys(
+        current_user.id, [object_key], all_reports=current_user.user_type == UserRoles.SUPERUSER
+    )
+    if object_key not in allowed:
+        raise HTTPException(404, detail="File not found")
+    service = S3UrlGenerateService(s3_storage_repo)
+    url = await service.generate_download_url(object_key, settings.PRESIGNED_URL_EXPIRATION_SECONDS)
+    return {"url": url}
+
+
+@router.post("/download/batch", response_model=DownloadUrlsOut)
+async def get_download_urls(
+    request: DownloadUrlsRequest,
+    s3_storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
+    report_repo: ReportRepository = Depends(get_report_repository),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Download URLs for many objects in one call
+
+    Only files of reports the caller created or received (any report for a superuser)
+    are signed; other keys are returned in denied. URLs are signed locally and
+    still valid URLs are reused from cache.
+    """
+    allowed = await report_repo.get_accessible_object_keys(
+        current_user.id, request.object_keys, all_reports=current_user.user_type == UserRoles.SUPERUSER
+    )
+    service = S3UrlGenerateService(s3_storage_repo)
+    items = await service.generate_download_urls(
+        [key for key in request.object_keys if key in allowed], settings.PRESIGNED_URL_EXPIRATION_SECONDS
+    )
+    return {"items": items, "denied": [key for key in dict.fromkeys(request.object_keys) if key not in allowed]}
+
+
+@router.post("/upload", response_model=SourceUploadOut)
+async def get_source_upload_urls(
+    excel_count: int = Query(1, ge=1, le=MAX_SOURCE_FILES, description="Number of Excel files"),
+    with_template: bool = Query(True, description="Also issue a URL for the docx template"),
+    s3_storage_repo: S3StorageRepository = Depends(get_s3_storage_repository),
+    current_user: User = Depends(auth.get_current_user),
+):
+    """
+    Presigned PUT URLs for uploading report sources directly to storage
+
+    After uploading, pass the returned keys to POST /reports/from-objects.
+    """
     service = S3UrlGenerateService(s3_storage_repo)
-    url = await service.generate_download_url(object_key, 15*60)
-    return {"url": url}
\ No newline at end of file
+    return await service.generate_source_upload_urls(
+        current_user.id, excel_count, with_template, settings.SOURCE_UPLOAD_URL_EXPIRATION_SECONDS
+    )
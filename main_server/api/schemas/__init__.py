@@ -1,4 +1,9 @@
 from .core import PaginationOut
+from .report import ReportParams, MAX_SOURCE_FILES, PresignedUploadOut, SourceUploadOut, ReportFromObjects
+from .url import MAX_DOWNLOAD_URLS, DownloadUrlsRequest, DownloadUrlOut, DownloadUrlsOut
+from .device import DeviceOut, DevicePaginationResponse, DeviceUpdate
+from .analytics import TopConsumerOut, AnomalyStreakOut, DeviceSummaryOut, DeviceHistoryOut
 from .user import UserRoles, UserOut, UserPaginationResponse, Token, UserLogin, UserCreate, PasswordChange, \
     TelegramBind, UserCreateWithoutPassword, UserBanUpdate,FullIndoUserOut,AllUserPaginationResponse
+from .storage import StorageUsageOut, MyStorageUsageOut, StorageGcOut
 
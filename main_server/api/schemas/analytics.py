@@ -0,0 +1,49 @@
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from main_server.core.dictionir import MeterCategoryEnum
+
+
+class TopConsumerOut(BaseModel):
+    device_id: uuid.UUID
+    name: str
+    category: MeterCategoryEnum
+    total_consumption: float
+    idle_hours: float
+    anomaly_count: int
+    reports: int
+    period_start: datetime
+    period_end: datetime
+
+
+class AnomalyStreakOut(BaseModel):
+    device_id: uuid.UUID
+    name: str
+    category: MeterCategoryEnum
+    reports: int
+    period_start: datetime
+    period_end: datetime
+    anomaly_count: int
+
+
+class DeviceSummaryOut(BaseModel):
+    report_id: uuid.UUID
+    period_start: datetime
+    period_end: datetime
+    total_consumption: float
+    idle_hours: float
+    anomaly_count: int
+    anomaly_deviation: float
+    # Часы недоиспользования по методам; None - метод не считался (черновой отчет)
+    underutilization_hours: Dict[str, Optional[float]]
+
+    class Config:
+        from_attributes = True
+
+
+class DeviceHistoryOut(BaseModel):
+    device_id: uuid.UUID
+    summaries: List[DeviceSummaryOut]
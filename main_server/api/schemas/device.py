@@ -0,0 +1,34 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from main_server.api.schemas.core import PaginationOut
+from main_server.core.dictionir import MeterCategoryEnum
+
+
+class DeviceOut(BaseModel):
+    id: uuid.UUID
+    name: str
+    normalized_name: str
+    category: MeterCategoryEnum
+    category_override: bool
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias="device_metadata")
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class DevicePaginationResponse(BaseModel):
+    devices: List[DeviceOut]
+    pagination: PaginationOut
+
+
+class DeviceUpdate(BaseModel):
+    """Изменение устройства реестра; не переданные поля не меняются"""
+    category: Optional[MeterCategoryEnum] = Field(None, description="Категория, назначенная вручную")
+    reset_category: bool = Field(False, description="Вернуть категорию по правилам классификации")
+    metadata: Optional[Dict[str, Any]] = Field(None, description="Метаданные устройства (заменяют прежние)")
@@ -0,0 +1,47 @@
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from main_server.core.dictionir import UnderutilizationMethodEnum
+from main_server.generation_reports import DEFAULT_ANALYSIS_PARAMS
+
+# Наибольшее число выгрузок в одном отчете при прямой загрузке в хранилище
+MAX_SOURCE_FILES = 20
+
+
+class ReportParams(BaseModel):
+    """Параметры анализа отчета; по умолчанию - значения генератора"""
+    sigma_threshold: float = Field(DEFAULT_ANALYSIS_PARAMS['sigma_threshold'], gt=0, le=10,
+                                   description="Порог аномалий в σ от скользящего среднего")
+    window_size: int = Field(DEFAULT_ANALYSIS_PARAMS['window_size'], ge=2, le=24 * 31,
+                             description="Окно скользящего среднего (в интервалах выгрузки)")
+    top_n: int = Field(DEFAULT_ANALYSIS_PARAMS['top_n'], ge=1, le=100,
+                       description="Количество устройств в таблице аномалий")
+    fixed_pct: float = Field(DEFAULT_ANALYSIS_PARAMS['fixed_pct'], gt=0, lt=1,
+                             description="Метод fixed_pct: доля от среднего потребления")
+    percentile: float = Field(DEFAULT_ANALYSIS_PARAMS['percentile'], gt=0, lt=100,
+                              description="Метод percentile: перцентиль потребления")
+    std_dev: float = Field(DEFAULT_ANALYSIS_PARAMS['std_dev'], gt=0, le=10,
+                           description="Метод std_dev: множитель σ")
+    best_method: UnderutilizationMethodEnum = Field(UnderutilizationMethodEnum(DEFAULT_ANALYSIS_PARAMS['best_method']),
+                                                    description="Метод для графиков недоиспользования")
+
+
+class PresignedUploadOut(BaseModel):
+    key: str
+    url: str
+
+
+class SourceUploadOut(BaseModel):
+    """Ссылки для прямой загрузки исходных файлов отчета в хранилище (HTTP PUT)"""
+    upload_id: UUID
+    excel_files: List[PresignedUploadOut]
+    template_file: Optional[PresignedUploadOut] = None
+    expires_in: int
+
+
+class ReportFromObjects(BaseModel):
+    """Исходные файлы отчета, уже загруженные в хранилище по ссылкам SourceUploadOut"""
+    excel_keys: List[str] = Field(..., min_length=1, max_length=MAX_SOURCE_FILES)
+    template_key: Optional[str] = None
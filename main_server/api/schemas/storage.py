@@ -0,0 +1,27 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class StorageUsageOut(BaseModel):
+    user_id: uuid.UUID
+    full_name: str
+    email: str
+    object_count: int
+    total_bytes: int
+    computed_at: datetime
+
+
+class MyStorageUsageOut(BaseModel):
+    object_count: int
+    total_bytes: int
+    computed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class StorageGcOut(BaseModel):
+    job_id: str
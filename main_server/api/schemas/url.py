@@ -0,0 +1,21 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+# Наибольшее число ключей в одном запросе ссылок на скачивание
+MAX_DOWNLOAD_URLS = 200
+
+
+class DownloadUrlsRequest(BaseModel):
+    object_keys: List[str] = Field(..., min_length=1, max_length=MAX_DOWNLOAD_URLS)
+
+
+class DownloadUrlOut(BaseModel):
+    key: str
+    url: str
+    expires_at: float
+
+
+class DownloadUrlsOut(BaseModel):
+    items: List[DownloadUrlOut]
+    denied: List[str]
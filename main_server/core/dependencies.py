@@ -1,6 +1,9 @@
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import datetime
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 import aioboto3
+from aiobotocore.config import AioConfig
+from boto3.s3.transfer import TransferConfig
 import timedelta
 from botocore.client import BaseClient
 from fastapi import Depends, HTTPException
@@ -12,11 +15,15 @@ from main_server.core.dictionir.ROLE import UserRoles
 from main_server.db.config import settings
 from main_server.db.database import async_session_factory
 from sqlalchemy.ext.asyncio import AsyncSession
-from main_server.db.repositories import ReportRepository, S3StorageRepository, UserRepository
+from main_server.db.repositories import ReportRepository, S3StorageRepository, UserRepository, DeviceRepository, \
+    DeviceSummaryRepository, StorageUsageRepository
 from main_server.db.repositories.report_delivery_log_repository import ReportDeliveryLogRepository
 from main_server.services import ReportDeliveryService, AuthService
+from main_server.services.batch_report_service import BatchReportService
 from main_server.services.email_schedule_send import EmailScheduleSend
 from main_server.services.scheduler_service import SchedulerService
+from main_server.services.object_cache import get_object_cache
+from main_server.services.storage_gc_service import STORAGE_GC_JOB_ID, storage_gc_task
 from uuid import UUID
 from main_server.services.email import EmailService
 
@@ -87,25 +94,142 @@ async def get_db_session() -> AsyncGenerator[Any, Any]:
         yield session
 
 
+def s3_client_context():
+    """Клиент S3 как асинхронный контекстный менеджер, для фоновых задач вне запроса"""
+    return aioboto3.Session().client(
+        's3',
+        endpoint_url=settings.MINIO_ENDPOINT_URL,
+        aws_access_key_id=settings.MINIO_ROOT_USER,
+        aws_secret_access_key=settings.MINIO_ROOT_PASSWORD,
+        region_name="us-east-1",
+        config=AioConfig(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            connector_args={'keepalive_timeout': settings.S3_KEEPALIVE_SECONDS}
+        )
+    )
+
+
+def s3_transfer_config() -> TransferConfig:
+    """Параметры составной передачи объектов хранилища из настроек"""
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE_MB * 1024 * 1024,
+        max_concurrency=settings.S3_MAX_CONCURRENCY
+    )
+
+
+def storage_repository(s3_client) -> S3StorageRepository:
+    """Репозиторий хранилища с параметрами передачи из настроек"""
+    return S3StorageRepository(s3_client, settings.MINIO_BUCKET, s3_transfer_config())
+
+
+# Клиент S3 процесса: создается при запуске приложения и общий для всех запросов
+_s3_client = None
+_s3_client_stack: Optional[AsyncExitStack] = None
+
+async def start_s3_client() -> BaseClient:
+    """
+    Создает клиент S3 процесса (вызывается в lifespan приложения).
+
+    Returns:
+        BaseClient: клиент с пулом соединений, общий для всех S3StorageRepository
+    """
+    global _s3_client, _s3_client_stack
+    if _s3_client is None:
+        stack = AsyncExitStack()
+        _s3_client = await stack.enter_async_context(s3_client_context())
+        _s3_client_stack = stack
+    return _s3_client
+
+
+async def verify_storage() -> None:
+    """Проверяет бакет при запуске; при ошибке проверка повторяется при первом обращении к хранилищу"""
+    try:
+        await storage_repository(await get_s3_client()).initialize()
+    except RuntimeError as exc:
+        print(f"Хранилище недоступно при запуске, проверка повторится при первом обращении: {exc}")
+
+
+async def stop_s3_client() -> None:
+    """Закрывает клиент S3 процесса и его соединения"""
+    global _s3_client, _s3_client_stack
+    if _s3_client_stack is not None:
+        stack, _s3_client, _s3_client_stack = _s3_client_stack, None, None
+        await stack.aclose()
+
+
 async def get_s3_client() -> BaseClient:
-    session = aioboto3.Session()
+    """
+    Получение клиента S3 процесса.
+
+    Returns:
+        BaseClient: клиент, созданный start_s3_client()
+    """
+    if _s3_client is None:
+        raise RuntimeError("S3 client is not started")
+    return _s3_client
 
-    async with session.client(
-            's3',
-            endpoint_url=settings.MINIO_ENDPOINT_URL,
-            aws_access_key_id=settings.MINIO_ROOT_USER,
-            aws_secret_access_key=settings.MINIO_ROOT_PASSWORD,
-            region_name="us-east-1"
-    ) as client:
-        return client
+
+@asynccontextmanager
+async def shared_s3_client_context():
+    """Клиент S3 процесса как контекстный менеджер; при выходе клиент не закрывается"""
+    yield await get_s3_client()
+
+
+async def schedule_storage_gc(run_now: bool = False) -> str:
+    """
+    Планирует периодическую сверку хранилища; задача одна на все процессы приложения
+    и хранится в базе планировщика, поэтому перезапуск не сдвигает срок очередной сверки.
+
+    Args:
+        run_now: Запустить сверку сразу, не дожидаясь очередного периода
+
+    Returns:
+        str: ID задачи планировщика
+    """
+    scheduler_service = await get_scheduler_service()
+    job = scheduler_service.scheduler.get_job(STORAGE_GC_JOB_ID)
+    if job is None:
+        job = scheduler_service.add_job(
+            storage_gc_task,
+            'interval',
+            hours=settings.STORAGE_GC_INTERVAL_HOURS,
+            kwargs={'db_url_asyncpg': scheduler_service.db_url_asyncpg},
+            id=STORAGE_GC_JOB_ID,
+            replace_existing=True,
+            max_instances=1
+        )
+    if run_now:
+        job.modify(next_run_time=datetime.now())
+    return job.id
+
+
+# Singleton экземпляр сервиса пакетной генерации отчетов
+_batch_report_service = None
+
+async def get_batch_report_service() -> BatchReportService:
+    """
+    Получение экземпляра сервиса пакетной генерации отчетов.
+
+    Returns:
+        BatchReportService: сервис пакетной генерации с реестром пакетов
+    """
+    global _batch_report_service
+    if _batch_report_service is None:
+        _batch_report_service = BatchReportService(s3_client_factory=shared_s3_client_context,
+                                                   storage_factory=storage_repository)
+    return _batch_report_service
 
 
 async def get_s3_storage_repository(
         s3_client=Depends(get_s3_client)
 ) -> S3StorageRepository:
-    repo = S3StorageRepository(s3_client, settings.MINIO_BUCKET)
-    await repo.initialize()
-    return repo
+    """
+    Репозиторий хранилища без обращения к MinIO: бакет проверяется при запуске
+    приложения и повторно - при первом обращении после ошибки хранилища
+    """
+    return storage_repository(s3_client)
 
 async def get_user_repository(session: AsyncSession = Depends(get_db_session)) -> UserRepository:
     return UserRepository(session)
@@ -115,6 +239,21 @@ async def get_report_repository(
 ) -> ReportRepository:
     return ReportRepository(session)
 
+async def get_device_repository(
+        session: AsyncSession = Depends(get_db_session)
+) -> DeviceRepository:
+    return DeviceRepository(session)
+
+async def get_device_summary_repository(
+        session: AsyncSession = Depends(get_db_session)
+) -> DeviceSummaryRepository:
+    return DeviceSummaryRepository(session)
+
+async def get_storage_usage_repository(
+        session: AsyncSession = Depends(get_db_session)
+) -> StorageUsageRepository:
+    return StorageUsageRepository(session)
+
 async def get_report_delivery_log_repository(session: AsyncSession = Depends(get_db_session)) -> ReportDeliveryLogRepository:
     return ReportDeliveryLogRepository(session)
 
@@ -132,7 +271,8 @@ async def get_report_delivery_service(
         s3_storage_repository=s3_storage_repository,
         report_repository=report_repository,
         report_delivery_log_repository=report_delivery_log_repository,
-        tg_bot_api_url=secret_settings.TG_BOT_API_URL
+        tg_bot_api_url=secret_settings.TG_BOT_API_URL,
+        object_cache=get_object_cache()
     )
 
 async def get_auth_service(
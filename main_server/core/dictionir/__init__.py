@@ -1,3 +1,9 @@
 from .ROLE import UserRoles
 from .delivery_method_enum import DeliveryMethodEnum
-from .delivery_status_enum import DeliveryStatusEnum
\ No newline at end of file
+from .delivery_status_enum import DeliveryStatusEnum
+from .report_format_enum import ReportFormatEnum
+from .report_quality_enum import ReportQualityEnum
+from .underutilization_method_enum import UnderutilizationMethodEnum
+
+from .meter_category_enum import MeterCategoryEnum
+from .report_file_enum import ReportFileEnum
\ No newline at end of file
@@ -0,0 +1,11 @@
+import enum
+
+class MeterCategoryEnum(str, enum.Enum):
+    PZS_12V = "PzS_12V"
+    CHINA = "China"
+    SM = "SM"
+    MO = "MO"
+    BG = "BG"
+    DIG = "DIG"
+    CP_300 = "CP-300"
+    OTHER = "Other"
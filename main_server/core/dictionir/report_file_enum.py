@@ -0,0 +1,6 @@
+import enum
+
+class ReportFileEnum(str, enum.Enum):
+    REPORT = "report"      # Сгенерированный отчет
+    EXCEL = "excel"        # Исходная выгрузка
+    TEMPLATE = "template"  # Шаблон отчета
@@ -0,0 +1,5 @@
+import enum
+
+class ReportFormatEnum(str, enum.Enum):
+    DOCX = "docx"  # Отчет по шаблону Word с графиками
+    XLSX = "xlsx"  # Таблицы анализа и нативные диаграммы Excel, без шаблона
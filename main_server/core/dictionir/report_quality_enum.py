@@ -0,0 +1,5 @@
+import enum
+
+class ReportQualityEnum(str, enum.Enum):
+    DRAFT = "draft"  # Быстрая проверка данных: низкое разрешение, без kmeans и миниатюр
+    FULL = "full"    # Полный отчет
@@ -0,0 +1,7 @@
+import enum
+
+class UnderutilizationMethodEnum(str, enum.Enum):
+    FIXED_PCT = "fixed_pct"    # Доля от среднего потребления
+    PERCENTILE = "percentile"  # Перцентиль потребления устройства
+    STD_DEV = "std_dev"        # Среднее минус несколько σ
+    KMEANS = "kmeans"          # Кластеризация на низкое/высокое потребление
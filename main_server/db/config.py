@@ -24,6 +24,42 @@ class Settings(BaseSettings):
     MINIO_HOST:str
     TEMP_FILES_DIR:str
 
+    # Количество процессов для разбора выгрузок и генерации отчетов
+    REPORT_WORKERS: int = 2
+    # Время хранения состояния завершенных пакетов генерации отчетов
+    BATCH_JOB_TTL_MINUTES: int = 60
+    # Предельное время генерации отчета по уровням качества (секунды)
+    REPORT_TIMEOUT_DRAFT_SECONDS: int = 30
+    REPORT_TIMEOUT_FULL_SECONDS: int = 600
+    # Кэш фрагментов разделов отчета: память каждого процесса пула и хранилище (МБ)
+    SECTION_CACHE_MEMORY_MB: int = 256
+    SECTION_CACHE_STORAGE_MB: int = 2048
+    # Передача объектов хранилища: порог составной передачи, размер части (не меньше 5 МБ)
+    # и число частей, передаваемых параллельно
+    S3_MULTIPART_THRESHOLD_MB: int = 8
+    S3_MULTIPART_CHUNK_SIZE_MB: int = 8
+    S3_MAX_CONCURRENCY: int = 10
+    # Клиент S3 процесса: размер пула соединений и время удержания простаивающего соединения (секунды)
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    S3_KEEPALIVE_SECONDS: int = 60
+    # Предельный размер локального кэша файлов отчетов для доставки (МБ)
+    DELIVERY_CACHE_MB: int = 1024
+    # Размер части при потоковой отдаче файлов отчетов через API (КБ)
+    REPORT_STREAM_CHUNK_KB: int = 256
+    # Ссылки на скачивание: время действия (секунды), доля оставшегося времени действия,
+    # при которой ссылка выдается из кэша повторно, и наибольшее число ссылок в кэше
+    PRESIGNED_URL_EXPIRATION_SECONDS: int = 15 * 60
+    PRESIGNED_URL_MIN_REMAINING_SHARE: float = 0.5
+    PRESIGNED_URL_CACHE_SIZE: int = 10000
+    # Время действия ссылок на прямую загрузку исходных файлов в хранилище (секунды)
+    SOURCE_UPLOAD_URL_EXPIRATION_SECONDS: int = 15 * 60
+    # Сверка хранилища: период запуска (часы) и возраст, после которого объект без ссылки
+    # из отчетов удаляется (часы; моложе - файлы идущих генераций и загрузок по ссылкам)
+    STORAGE_GC_INTERVAL_HOURS: int = 24
+    STORAGE_GC_MIN_AGE_HOURS: int = 24
+    # Файлы локального кэша доставки, не запрашивавшиеся дольше этого времени, удаляются сверкой (часы)
+    DELIVERY_CACHE_MAX_AGE_HOURS: int = 24
+
     @property
     def MINIO_ENDPOINT_URL(self):
         return f"http://{self.MINIO_HOST}:{self.MINIO_API_PORT}"
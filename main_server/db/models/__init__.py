@@ -2,6 +2,9 @@ from .user import User
 from .generated_report import GeneratedReport
 from .activation_key import ActivationKey
 from .report_delivery_log import ReportDeliveryLog
+from .device import Device
+from .device_report_summary import DeviceReportSummary
+from .storage_usage import StorageUsage
 
 
-__all__ = [User,GeneratedReport, ActivationKey,ReportDeliveryLog, ReportDeliveryLog]
\ No newline at end of file
+__all__ = [User,GeneratedReport, ActivationKey,ReportDeliveryLog, ReportDeliveryLog, Device, DeviceReportSummary, StorageUsage]
\ No newline at end of file
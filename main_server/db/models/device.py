@@ -0,0 +1,26 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, String, DateTime, UUID, Boolean, JSON
+from sqlalchemy import Enum as SqlEnum
+
+from main_server.core.dictionir import MeterCategoryEnum
+from .base import Base
+
+
+class Device(Base):
+    """Устройство (счетчик) из реестра: постоянный ID и категория для всех отчетов"""
+    __tablename__ = 'devices'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Ключ сопоставления (normalize_device_name), по нему устройства ищутся в выгрузках
+    normalized_name = Column(String(255), nullable=False, unique=True, index=True)
+    name = Column(String(255), nullable=False)
+    category = Column(SqlEnum(MeterCategoryEnum, native_enum=False), nullable=False)
+    # Категория задана вручную и не пересчитывается по правилам классификации
+    category_override = Column(Boolean, nullable=False, default=False)
+    # Имя атрибута metadata зарезервировано в SQLAlchemy
+    device_metadata = Column('metadata', JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.utcnow() + timedelta(hours=3))
+    updated_at = Column(DateTime, default=lambda: datetime.utcnow() + timedelta(hours=3),
+                        onupdate=lambda: datetime.utcnow() + timedelta(hours=3))
@@ -0,0 +1,33 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, UUID, ForeignKey, Index, Float, Integer, JSON
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+
+class DeviceReportSummary(Base):
+    """Итоги одного отчета по одному устройству для межотчетной аналитики"""
+    __tablename__ = 'device_report_summaries'
+    __table_args__ = (
+        Index('ix_device_report_summaries_user_device_period', 'user_id', 'device_id', 'period_start'),
+        Index('ix_device_report_summaries_user_period', 'user_id', 'period_start'),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    report_id = Column(UUID(as_uuid=True), ForeignKey('generated_reports.id'), nullable=False, index=True)
+    device_id = Column(UUID(as_uuid=True), ForeignKey('devices.id'), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    period_end = Column(DateTime, nullable=False)
+    total_consumption = Column(Float, nullable=False)
+    idle_hours = Column(Float, nullable=False)
+    anomaly_count = Column(Integer, nullable=False)
+    anomaly_deviation = Column(Float, nullable=False)
+    # Часы недоиспользования по методам: {метод: часы или None, если уровень качества метод не считает}
+    underutilization_hours = Column(JSON, nullable=False)
+    generated_at = Column(DateTime, default=lambda: datetime.utcnow() + timedelta(hours=3))
+
+    report = relationship("GeneratedReport", back_populates="device_summaries")
+    device = relationship("Device")
@@ -1,21 +1,35 @@
 import uuid
 from datetime import datetime, timedelta
 
-from sqlalchemy import Column, String, DateTime, UUID, ForeignKey
+from sqlalchemy import Column, String, DateTime, UUID, ForeignKey, Index, BigInteger, JSON
 from sqlalchemy.orm import relationship
 
 from .base import Base
 
 class GeneratedReport(Base):
     __tablename__ = 'generated_reports'
+    __table_args__ = (
+        Index('ix_generated_reports_devices_hash', 'user_id', 'devices_hash', 'data_start'),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'))
     report_name = Column(String(255))
     report_url = Column(String(512))
+    report_size = Column(BigInteger, nullable=True)
     excel_url = Column(String(512))
     template_url = Column(String(512))
+    # Ключи всех исходных файлов (выгрузки и шаблон); excel_url - только первая выгрузка.
+    # NULL у отчетов, созданных до появления столбца
+    source_urls = Column(JSON, nullable=True)
+    dataset_url = Column(String(512), nullable=True)
+    aggregates_url = Column(String(512), nullable=True)
+    dataset_hash = Column(String(64), nullable=True)
+    devices_hash = Column(String(64), nullable=True)
+    data_start = Column(DateTime, nullable=True)
+    data_end = Column(DateTime, nullable=True)
     generated_at = Column(DateTime, default=lambda: datetime.utcnow() + timedelta(hours=3))
 
     user = relationship("User", back_populates="reports")
-    delivery_logs = relationship("ReportDeliveryLog", back_populates="report")
\ No newline at end of file
+    delivery_logs = relationship("ReportDeliveryLog", back_populates="report")
+    device_summaries = relationship("DeviceReportSummary", back_populates="report")
\ No newline at end of file
@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, UUID, ForeignKey, Integer, BigInteger
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+
+class StorageUsage(Base):
+    """Объем хранилища, занятый файлами отчетов пользователя, по последней сверке хранилища"""
+    __tablename__ = 'storage_usage'
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
+    object_count = Column(Integer, nullable=False)
+    total_bytes = Column(BigInteger, nullable=False)
+    computed_at = Column(DateTime, default=lambda: datetime.utcnow() + timedelta(hours=3))
+
+    user = relationship("User")
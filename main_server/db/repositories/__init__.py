@@ -3,6 +3,10 @@ from .report_repository import ReportRepository
 from .user_repository import UserRepository
 from .activation_key_repository import ActivationKeyRepository
 from .report_delivery_log_repository import ReportDeliveryLogRepository
+from .device_repository import DeviceRepository
+from .device_summary_repository import DeviceSummaryRepository
+from .storage_usage_repository import StorageUsageRepository
 from .s3_storage_repository import S3StorageRepository
 
-__all__ = [S3StorageRepository,ReportRepository,UserRepository, ActivationKeyRepository,ReportDeliveryLogRepository, S3StorageRepository]
\ No newline at end of file
+__all__ = [S3StorageRepository,ReportRepository,UserRepository, ActivationKeyRepository,ReportDeliveryLogRepository, S3StorageRepository,
+           DeviceRepository, DeviceSummaryRepository, StorageUsageRepository]
\ No newline at end of file
@@ -0,0 +1,125 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from main_server.core.dictionir import MeterCategoryEnum
+from main_server.db.models.device import Device
+
+
+class DeviceRepository:
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def get(self, device_id: UUID) -> Optional[Device]:
+        return await self._session.get(Device, device_id)
+
+    async def get_by_normalized_names(self, normalized_names: Iterable[str]) -> Dict[str, Device]:
+        """
+        Устройства реестра по ключам сопоставления одним запросом
+
+        Args:
+            normalized_names: Ключи сопоставления (normalize_device_name)
+
+        Returns:
+            {ключ: устройство}; отсутствующие в реестре ключи пропускаются
+        """
+        normalized_names = list(set(normalized_names))
+        if not normalized_names:
+            return {}
+        result = await self._session.execute(
+            select(Device).where(Device.normalized_name.in_(normalized_names))
+        )
+        return {device.normalized_name: device for device in result.scalars().all()}
+
+    async def register_devices(self, devices: Dict[str, Tuple[str, MeterCategoryEnum]]) -> Dict[str, Device]:
+        """
+        Добавляет в реестр новые устройства и возвращает их записи
+
+        Устройства, уже добавленные параллельным запросом, не перезаписываются.
+
+        Args:
+            devices: {ключ сопоставления: (название, категория)}
+
+        Returns:
+            {ключ: устройство} для всех переданных ключей
+        """
+        if not devices:
+            return {}
+        await self._session.execute(
+            insert(Device)
+            .values([
+                {"normalized_name": normalized_name, "name": name, "category": category}
+                for normalized_name, (name, category) in devices.items()
+            ])
+            .on_conflict_do_nothing(index_elements=[Device.normalized_name])
+        )
+        await self._session.commit()
+        return await self.get_by_normalized_names(devices)
+
+    async def list_devices(
+            self,
+            category: Optional[MeterCategoryEnum] = None,
+            search: Optional[str] = None,
+            offset: int = 0,
+            limit: int = 50
+    ) -> Tuple[List[Device], int]:
+        """
+        Устройства реестра с фильтрами и пагинацией, по названию
+
+        Args:
+            category: Фильтр по категории
+            search: Подстрока названия (без учета регистра)
+            offset: Смещение
+            limit: Количество записей
+
+        Returns:
+            Устройства страницы и общее количество подходящих устройств
+        """
+        query = select(Device)
+        if category is not None:
+            query = query.where(Device.category == category)
+        if search:
+            query = query.where(Device.normalized_name.contains(search.casefold()))
+
+        total = (await self._session.execute(
+            select(func.count()).select_from(query.subquery())
+        )).scalar_one()
+        result = await self._session.execute(
+            query.order_by(Device.normalized_name).offset(offset).limit(limit)
+        )
+        return list(result.scalars().all()), total
+
+    async def update_device(
+            self,
+            device_id: UUID,
+            category: Optional[MeterCategoryEnum] = None,
+            category_override: Optional[bool] = None,
+            metadata: Optional[Dict[str, Any]] = None
+    ) -> Optional[Device]:
+        """
+        Изменяет категорию и/или метаданные устройства
+
+        Args:
+            device_id: ID устройства
+            category: Новая категория
+            category_override: Категория задана вручную
+            metadata: Новые метаданные (заменяют прежние)
+
+        Returns:
+            Обновленное устройство или None, если устройство не найдено
+        """
+        device = await self._session.get(Device, device_id)
+        if device is None:
+            return None
+        if category is not None:
+            device.category = category
+        if category_override is not None:
+            device.category_override = category_override
+        if metadata is not None:
+            device.device_metadata = metadata
+        await self._session.commit()
+        await self._session.refresh(device)
+        return device
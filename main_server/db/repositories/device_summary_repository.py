@@ -0,0 +1,176 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from main_server.core.dictionir import MeterCategoryEnum
+from main_server.db.models.device import Device
+from main_server.db.models.device_report_summary import DeviceReportSummary
+
+
+class DeviceSummaryRepository:
+    """
+    Запросы межотчетной аналитики по сводкам устройств.
+
+    Повторные отчеты по тем же данным (перерендеринг, инкрементальное дополнение)
+    дают сводки с тем же началом периода; учитывается только последняя из них,
+    чтобы потребление не суммировалось дважды.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    def _latest(
+            self,
+            user_id: UUID,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+            device_id: Optional[UUID] = None
+    ):
+        """Последние сводки пользователя для каждой пары (устройство, начало периода)"""
+        query = (
+            select(DeviceReportSummary)
+            .where(DeviceReportSummary.user_id == user_id)
+            .distinct(DeviceReportSummary.device_id, DeviceReportSummary.period_start)
+            .order_by(
+                DeviceReportSummary.device_id,
+                DeviceReportSummary.period_start,
+                desc(DeviceReportSummary.period_end),
+                desc(DeviceReportSummary.generated_at)
+            )
+        )
+        if device_id is not None:
+            query = query.where(DeviceReportSummary.device_id == device_id)
+        if date_from:
+            query = query.where(DeviceReportSummary.period_start >= date_from)
+        if date_to:
+            query = query.where(DeviceReportSummary.period_start <= date_to)
+        return query
+
+    async def get_top_consumers(
+            self,
+            user_id: UUID,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+            category: Optional[MeterCategoryEnum] = None,
+            limit: int = 10
+    ) -> List[Dict]:
+        """
+        Устройства с наибольшим суммарным потреблением по отчетам пользователя
+
+        Args:
+            user_id: ID владельца отчетов
+            date_from: Начало периода (по началу периода отчета)
+            date_to: Конец периода (по началу периода отчета)
+            category: Фильтр по категории устройства
+            limit: Количество устройств
+
+        Returns:
+            Список словарей по убыванию потребления
+        """
+        latest = self._latest(user_id, date_from, date_to).subquery()
+        stmt = (
+            select(
+                Device.id.label("device_id"),
+                Device.name.label("name"),
+                Device.category.label("category"),
+                func.sum(latest.c.total_consumption).label("total_consumption"),
+                func.sum(latest.c.idle_hours).label("idle_hours"),
+                func.sum(latest.c.anomaly_count).label("anomaly_count"),
+                func.count().label("reports"),
+                func.min(latest.c.period_start).label("period_start"),
+                func.max(latest.c.period_end).label("period_end")
+            )
+            .join(latest, latest.c.device_id == Device.id)
+            .group_by(Device.id)
+            .order_by(desc("total_consumption"))
+            .limit(limit)
+        )
+        if category is not None:
+            stmt = stmt.where(Device.category == category)
+
+        result = await self._session.execute(stmt)
+        return [dict(row._mapping) for row in result.all()]
+
+    async def get_anomaly_streaks(
+            self,
+            user_id: UUID,
+            min_reports: int = 3,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Устройства с аномалиями в min_reports и более последовательных отчетах
+
+        Последовательность - отчеты устройства, упорядоченные по началу периода;
+        серии выделяются разностью номеров строк (все отчеты устройства и
+        отчеты с тем же признаком наличия аномалий).
+
+        Args:
+            user_id: ID владельца отчетов
+            min_reports: Минимальная длина серии отчетов с аномалиями
+            date_from: Начало периода (по началу периода отчета)
+            date_to: Конец периода (по началу периода отчета)
+
+        Returns:
+            Список серий (устройство, длина, период, число аномалий) по убыванию длины
+        """
+        latest = self._latest(user_id, date_from, date_to).subquery()
+        has_anomalies = latest.c.anomaly_count > 0
+        numbered = select(
+            latest.c.device_id,
+            latest.c.period_start,
+            latest.c.period_end,
+            latest.c.anomaly_count,
+            (
+                func.row_number().over(partition_by=latest.c.device_id, order_by=latest.c.period_start)
+                - func.row_number().over(partition_by=[latest.c.device_id, has_anomalies],
+                                         order_by=latest.c.period_start)
+            ).label("series")
+        ).subquery()
+        streaks = (
+            select(
+                numbered.c.device_id,
+                func.count().label("reports"),
+                func.min(numbered.c.period_start).label("period_start"),
+                func.max(numbered.c.period_end).label("period_end"),
+                func.sum(numbered.c.anomaly_count).label("anomaly_count")
+            )
+            .where(numbered.c.anomaly_count > 0)
+            .group_by(numbered.c.device_id, numbered.c.series)
+            .having(func.count() >= min_reports)
+            .subquery()
+        )
+        stmt = (
+            select(
+                Device.id.label("device_id"),
+                Device.name.label("name"),
+                Device.category.label("category"),
+                streaks.c.reports,
+                streaks.c.period_start,
+                streaks.c.period_end,
+                streaks.c.anomaly_count
+            )
+            .join(streaks, streaks.c.device_id == Device.id)
+            .order_by(desc(streaks.c.reports), desc(streaks.c.anomaly_count))
+        )
+        result = await self._session.execute(stmt)
+        return [dict(row._mapping) for row in result.all()]
+
+    async def get_device_history(
+            self,
+            user_id: UUID,
+            device_id: UUID,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None
+    ) -> List[DeviceReportSummary]:
+        """Сводки устройства по отчетам пользователя в хронологическом порядке"""
+        latest = self._latest(user_id, date_from, date_to, device_id=device_id).subquery()
+        result = await self._session.execute(
+            select(DeviceReportSummary)
+            .join(latest, latest.c.id == DeviceReportSummary.id)
+            .order_by(DeviceReportSummary.period_start)
+        )
+        return list(result.scalars().all())
@@ -59,6 +59,19 @@ class ReportDeliveryLogRepository:
         return log
 
 
+    async def was_delivered(self, user_id: UUID, report_id: UUID) -> bool:
+        """Был ли отчет успешно доставлен пользователю"""
+        result = await self.session.execute(
+            select(ReportDeliveryLog.id)
+            .where(
+                ReportDeliveryLog.user_id == user_id,
+                ReportDeliveryLog.report_id == report_id,
+                ReportDeliveryLog.status == DeliveryStatusEnum.SENT
+            )
+            .limit(1)
+        )
+        return result.scalar_one_or_none() is not None
+
     async def get_user_logs_count(self, user_id: UUID) -> int:
         """Получить общее количество логов для пользователя"""
         result = await self.session.execute(
@@ -109,6 +122,7 @@ class ReportDeliveryLogRepository:
                 ReportDeliveryLog.delivered_at.label("delivered_at"),
                 GeneratedReport.report_name.label("report_name"),
                 GeneratedReport.report_url.label("report_url"),
+                GeneratedReport.report_size.label("report_size"),
                 User.full_name.label("sender_name")
             )
             .join(
@@ -145,6 +159,7 @@ class ReportDeliveryLogRepository:
             {
                 "report_name": row.report_name,
                 "report_url": row.report_url,
+                "report_size": row.report_size,
                 "sender_name": row.sender_name,
                 "delivered_at": row.delivered_at,
                 "delivery_method": row.delivery_method
@@ -1,10 +1,12 @@
 from uuid import uuid4
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, or_
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Set
+from main_server.core.dictionir import DeliveryStatusEnum
 from main_server.db.models.generated_report import GeneratedReport
+from main_server.db.models.report_delivery_log import ReportDeliveryLog
 
 
 class ReportRepository:
@@ -17,7 +19,8 @@ class ReportRepository:
             report_url: str,
             excel_url: str,
             template_url: str,
-            user_id: uuid4
+            user_id: uuid4,
+            **dataset_info
     ) -> GeneratedReport:
         report = GeneratedReport(
             report_name=report_name,
@@ -25,6 +28,7 @@ class ReportRepository:
             excel_url=excel_url,
             template_url=template_url,
             user_id=user_id,
+            **dataset_info
         )
         self._session.add(report)
         await self._session.commit()
@@ -74,4 +78,114 @@ class ReportRepository:
             select(GeneratedReport)
             .where(GeneratedReport.id == report_id)
         )
-        return result.scalar_one_or_none()
\ No newline at end of file
+        return result.scalar_one_or_none()
+
+    async def get_latest_dataset_report(
+            self,
+            user_id: uuid4,
+            devices_hash: str,
+            data_start: datetime
+    ) -> Optional[GeneratedReport]:
+        """
+        Находит последний отчет пользователя по тому же набору устройств и с тем же
+        началом периода, для которого сохранены агрегаты данных.
+
+        Args:
+            user_id: UUID пользователя
+            devices_hash: Хэш набора устройств выгрузки
+            data_start: Первая отметка времени выгрузки
+
+        Returns:
+            Отчет с наиболее поздним концом периода или None
+        """
+        result = await self._session.execute(
+            select(GeneratedReport)
+            .where(
+                GeneratedReport.user_id == user_id,
+                GeneratedReport.devices_hash == devices_hash,
+                GeneratedReport.data_start == data_start,
+                GeneratedReport.aggregates_url.is_not(None)
+            )
+            .order_by(GeneratedReport.data_end.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_accessible_object_keys(
+            self,
+            user_id: uuid4,
+            object_keys: Iterable[str],
+            all_reports: bool = False
+    ) -> Set[str]:
+        """
+        Отбирает ключи файлов (отчет, выгрузка, шаблон) отчетов, доступных пользователю:
+        созданных им или успешно доставленных ему.
+
+        Args:
+            user_id: UUID пользователя
+            object_keys: Проверяемые ключи объектов хранилища
+            all_reports: Доступны файлы всех отчетов (администратор)
+
+        Returns:
+            Подмножество object_keys, относящееся к доступным отчетам
+        """
+        keys = set(object_keys)
+        if not keys:
+            return set()
+        columns = (GeneratedReport.report_url, GeneratedReport.excel_url, GeneratedReport.template_url)
+        query = select(*columns).where(or_(*(column.in_(keys) for column in columns)))
+        if not all_reports:
+            delivered = (
+                select(ReportDeliveryLog.report_id)
+                .where(
+                    ReportDeliveryLog.user_id == user_id,
+                    ReportDeliveryLog.status == DeliveryStatusEnum.SENT
+                )
+            )
+            query = query.where(or_(GeneratedReport.user_id == user_id, GeneratedReport.id.in_(delivered)))
+
+        result = await self._session.execute(query)
+        return {key for row in result.all() for key in row if key in keys}
+
+    async def get_object_keys_by_user(self) -> Dict[Optional[uuid4], Set[str]]:
+        """
+        Ключи всех объектов хранилища, на которые ссылаются отчеты
+        (отчет, исходные файлы, набор данных, агрегаты), по авторам отчетов
+
+        Части наборов данных перечислены в манифестах (dataset_url) и сюда не входят.
+
+        Returns:
+            Словарь {UUID автора: множество ключей}
+        """
+        result = await self._session.execute(
+            select(
+                GeneratedReport.user_id,
+                GeneratedReport.source_urls,
+                GeneratedReport.report_url,
+                GeneratedReport.excel_url,
+                GeneratedReport.template_url,
+                GeneratedReport.dataset_url,
+                GeneratedReport.aggregates_url
+            )
+        )
+        keys: Dict[Optional[uuid4], Set[str]] = {}
+        for user_id, source_urls, *urls in result.all():
+            keys.setdefault(user_id, set()).update(url for url in [*urls, *(source_urls or [])] if url)
+        return keys
+
+    async def get_legacy_source_keys_by_user(self) -> Dict[Optional[uuid4], Set[str]]:
+        """
+        Ключи первых выгрузок отчетов без списка исходных файлов (source_urls),
+        созданных до его появления: остальные выгрузки таких отчетов лежат рядом
+
+        Returns:
+            Словарь {UUID автора: множество ключей}
+        """
+        result = await self._session.execute(
+            select(GeneratedReport.user_id, GeneratedReport.excel_url)
+            .where(GeneratedReport.source_urls.is_(None), GeneratedReport.excel_url.is_not(None))
+        )
+        keys: Dict[Optional[uuid4], Set[str]] = {}
+        for user_id, excel_url in result.all():
+            keys.setdefault(user_id, set()).add(excel_url)
+        return keys
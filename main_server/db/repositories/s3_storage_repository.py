@@ -1,18 +1,73 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
 from io import BytesIO
-from typing import Union, BinaryIO
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from boto3.s3.transfer import TransferConfig
+
+# Minimum S3 multipart part size (every part except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+# Maximum number of keys in one DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+# Attempts of a ranged download when the object is overwritten while it is read
+DOWNLOAD_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+# Buckets confirmed by head_bucket in this process; a failed storage call clears the mark
+_verified_buckets: Set[str] = set()
 
 
 class S3StorageRepository:
-    def __init__(self, s3_client, bucket_name: str):
+    def __init__(self, s3_client, bucket_name: str, transfer_config: Optional[TransferConfig] = None):
+        """
+        Args:
+            s3_client: aioboto3 S3 client
+            bucket_name: Bucket name
+            transfer_config: Multipart threshold, part size and concurrency of transfers
+                             (boto3 defaults if not given)
+        """
         self.client = s3_client
         self.bucket = bucket_name
+        self.transfer_config = transfer_config or TransferConfig()
 
     async def initialize(self):
         """Checked bucket exits"""
         try:
             await self.client.head_bucket(Bucket=self.bucket)
         except Exception as e:
+            _verified_buckets.discard(self.bucket)
             raise RuntimeError(f"Bucket {self.bucket} unavailable: {str(e)}")
+        _verified_buckets.add(self.bucket)
+
+    async def _ensure_bucket(self) -> None:
+        """Checks the bucket on first use and again after a failed storage call"""
+        if self.bucket not in _verified_buckets:
+            await self.initialize()
+
+    @staticmethod
+    def _is_missing(exc: Exception) -> bool:
+        """Whether the error means the object does not exist"""
+        return getattr(exc, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def _failed(self, message: str, exc: Exception) -> RuntimeError:
+        """
+        Error for a failed storage call; unless the object is simply missing,
+        the bucket is re-checked before the next call
+        """
+        if not self._is_missing(exc):
+            _verified_buckets.discard(self.bucket)
+        return RuntimeError(f"{message}: {exc}")
+
+    @staticmethod
+    def _log_transfer(direction: str, object_name: str, size: int, started: float) -> None:
+        """Logs size, duration and throughput of a finished transfer"""
+        seconds = max(time.perf_counter() - started, 1e-6)
+        logger.info("S3 %s %s: %d bytes in %.3f s (%.1f MB/s)",
+                    direction, object_name, size, seconds, size / seconds / (1024 * 1024))
 
     async def _bucket_exists(self) -> bool:
         """Checks if the bucket exists in the storage"""
@@ -36,19 +91,189 @@ class S3StorageRepository:
         Raises:
             RuntimeError: If file upload fails
         """
+        await self._ensure_bucket()
         if isinstance(file_data, bytes):
             file_data = BytesIO(file_data)
 
         try:
             file_data.seek(0)
+            started = time.perf_counter()
             await self.client.upload_fileobj(
                 file_data,
                 self.bucket,
-                object_name
+                object_name,
+                Config=self.transfer_config
             )
+            self._log_transfer("upload", object_name, file_data.tell(), started)
             return object_name
         except Exception as exc:
-            raise RuntimeError(f"Failed to upload file: {exc}")
+            raise self._failed("Failed to upload file", exc)
+
+    async def upload_stream(
+            self,
+            read: Callable[[int], Awaitable[bytes]],
+            object_name: str,
+            part_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Uploads a stream in parts
+
+        Data smaller than one part is stored with a single put_object;
+        otherwise parts are uploaded concurrently (up to max_concurrency of the
+        transfer config, so at most that many parts are held in memory) and the
+        multipart upload is aborted on failure.
+
+        Args:
+            read: Async callable returning up to n bytes (b"" at end of stream)
+            object_name: Object name in storage
+            part_size: Part size in bytes (at least MIN_PART_SIZE;
+                       multipart_chunksize of the transfer config by default)
+
+        Returns:
+            Dict[str, Any]: Key, Size and SHA256 (hex digest computed while uploading)
+
+        Raises:
+            RuntimeError: If upload fails
+        """
+        await self._ensure_bucket()
+        part_size = max(part_size or self.transfer_config.multipart_chunksize, MIN_PART_SIZE)
+        sha256 = hashlib.sha256()
+        size = 0
+        started = time.perf_counter()
+
+        async def read_part() -> bytes:
+            nonlocal size
+            part = bytearray()
+            while len(part) < part_size:
+                chunk = await read(part_size - len(part))
+                if not chunk:
+                    break
+                part.extend(chunk)
+            sha256.update(part)
+            size += len(part)
+            return bytes(part)
+
+        upload_id = None
+        uploads: List[asyncio.Task] = []
+        try:
+            part = await read_part()
+            if len(part) < part_size:
+                await self.client.put_object(Bucket=self.bucket, Key=object_name, Body=part)
+                self._log_transfer("upload", object_name, size, started)
+                return {"Key": object_name, "Size": size, "SHA256": sha256.hexdigest()}
+
+            upload = await self.client.create_multipart_upload(Bucket=self.bucket, Key=object_name)
+            upload_id = upload["UploadId"]
+            semaphore = asyncio.Semaphore(self.transfer_config.max_concurrency)
+
+            async def upload_part(number: int, body: bytes) -> Dict[str, Any]:
+                try:
+                    response = await self.client.upload_part(
+                        Bucket=self.bucket, Key=object_name, UploadId=upload_id,
+                        PartNumber=number, Body=body
+                    )
+                    return {"PartNumber": number, "ETag": response["ETag"]}
+                finally:
+                    semaphore.release()
+
+            while part:
+                await semaphore.acquire()
+                failed = next((task for task in uploads if task.done() and task.exception()), None)
+                if failed is not None:
+                    raise failed.exception()
+                uploads.append(asyncio.ensure_future(upload_part(len(uploads) + 1, part)))
+                part = await read_part()
+            parts = await asyncio.gather(*uploads)
+
+            await self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=object_name, UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+            self._log_transfer("upload", object_name, size, started)
+            return {"Key": object_name, "Size": size, "SHA256": sha256.hexdigest()}
+        except BaseException as exc:
+            for task in uploads:
+                task.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+            if upload_id is not None:
+                try:
+                    await self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_name,
+                                                             UploadId=upload_id)
+                except Exception:
+                    pass
+            if isinstance(exc, Exception):
+                raise self._failed("Failed to upload file", exc)
+            raise
+
+    @staticmethod
+    def _is_changed(exc: Exception) -> bool:
+        """Whether an If-Match request failed because the object was overwritten"""
+        return getattr(exc, 'response', {}).get('Error', {}).get('Code') in ('412', 'PreconditionFailed')
+
+    async def _download_ranges(self, object_name: str, write: Callable[[int, bytes], Awaitable[None]]) -> int:
+        """
+        Downloads an object with ranged GETs
+
+        The first request fetches one part and reveals the object size and ETag, so objects
+        up to multipart_chunksize take a single request; the remaining ranges are fetched
+        concurrently (up to max_concurrency) with If-Match on that ETag. If the object is
+        overwritten meanwhile, the download starts over (up to DOWNLOAD_ATTEMPTS times),
+        so the result never mixes two versions. Data from a failed attempt may stay
+        past the returned size; callers truncate to it.
+
+        Args:
+            object_name: Object name in storage
+            write: Async callable storing data at the given offset
+
+        Returns:
+            int: Object size in bytes
+        """
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            try:
+                return await self._download_version(object_name, write)
+            except Exception as exc:
+                if not self._is_changed(exc) or attempt == DOWNLOAD_ATTEMPTS:
+                    raise
+                logger.info("S3 object %s changed during download, restarting", object_name)
+
+    async def _download_version(self, object_name: str, write: Callable[[int, bytes], Awaitable[None]]) -> int:
+        """One attempt of _download_ranges; all ranges come from the version read first"""
+        chunk_size = self.transfer_config.multipart_chunksize
+        try:
+            response = await self.client.get_object(Bucket=self.bucket, Key=object_name,
+                                                    Range=f"bytes=0-{chunk_size - 1}")
+        except Exception as exc:
+            # Empty objects have no satisfiable range
+            if getattr(exc, 'response', {}).get('Error', {}).get('Code') != 'InvalidRange':
+                raise
+            response = await self.client.get_object(Bucket=self.bucket, Key=object_name)
+        async with response["Body"]:
+            first = await response["Body"].read()
+        content_range = response.get("ContentRange")
+        total = int(content_range.rsplit("/", 1)[1]) if content_range else len(first)
+        etag = response["ETag"]
+        await write(0, first)
+
+        semaphore = asyncio.Semaphore(self.transfer_config.max_concurrency)
+
+        async def download_range(start: int) -> None:
+            end = min(start + chunk_size, total) - 1
+            async with semaphore:
+                part = await self.client.get_object(Bucket=self.bucket, Key=object_name,
+                                                    Range=f"bytes={start}-{end}", IfMatch=etag)
+                async with part["Body"]:
+                    await write(start, await part["Body"].read())
+
+        # Every range finishes before a failure is raised, so no write of this attempt
+        # can land after the next attempt has started
+        results = await asyncio.gather(
+            *(download_range(start) for start in range(len(first), total, chunk_size)),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return total
 
     async def download_file(self, object_name: str) -> BytesIO:
         """
@@ -63,17 +288,111 @@ class S3StorageRepository:
         Raises:
             RuntimeError: If file download fails
         """
+        await self._ensure_bucket()
         file_data = BytesIO()
+
+        async def write(offset: int, data: bytes) -> None:
+            file_data.seek(offset)
+            file_data.write(data)
+
         try:
-            await self.client.download_fileobj(
-                self.bucket,
-                object_name,
-                file_data
-            )
+            started = time.perf_counter()
+            size = await self._download_ranges(object_name, write)
+            file_data.truncate(size)
+            self._log_transfer("download", object_name, size, started)
             file_data.seek(0)
             return file_data
         except Exception as exc:
-            raise RuntimeError(f"Failed to download file: {exc}")
+            raise self._failed("Failed to download file", exc)
+
+    async def download_to_file(self, object_name: str, file_path: str) -> None:
+        """
+        Downloads a file from storage to a local file without holding it in memory
+
+        Args:
+            object_name: Object name in storage
+            file_path: Local file path (overwritten)
+
+        Raises:
+            RuntimeError: If file download fails
+        """
+        await self._ensure_bucket()
+        try:
+            with open(file_path, 'wb') as file:
+                async def write(offset: int, data: bytes) -> None:
+                    await asyncio.to_thread(os.pwrite, file.fileno(), data, offset)
+
+                started = time.perf_counter()
+                size = await self._download_ranges(object_name, write)
+                file.truncate(size)
+            self._log_transfer("download", object_name, size, started)
+        except Exception as exc:
+            raise self._failed("Failed to download file", exc)
+
+    async def get_object_info(self, object_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns object metadata
+
+        Args:
+            object_name: Object name in storage
+
+        Returns:
+            Optional[Dict[str, Any]]: head_object response or None if the object does not exist
+
+        Raises:
+            RuntimeError: If the request fails for another reason
+        """
+        await self._ensure_bucket()
+        try:
+            return await self.client.head_object(Bucket=self.bucket, Key=object_name)
+        except Exception as exc:
+            if self._is_missing(exc):
+                return None
+            raise self._failed("Failed to get object info", exc)
+
+    async def open_object(
+            self,
+            object_name: str,
+            byte_range: Optional[str] = None,
+            if_none_match: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Opens an object for streaming without reading it
+
+        Range and If-None-Match are evaluated by the storage. The caller must
+        read or close the returned Body (an async context manager).
+
+        Args:
+            object_name: Object name in storage
+            byte_range: HTTP Range header value (e.g. "bytes=0-1023")
+            if_none_match: HTTP If-None-Match header value
+
+        Returns:
+            Optional[Dict[str, Any]]: get_object response (Body, ContentLength, ContentRange,
+            ETag, ...), {"NotModified": True} if the ETag matches, or None if the object
+            does not exist
+
+        Raises:
+            ValueError: If the range is not satisfiable
+            RuntimeError: If the request fails for another reason
+        """
+        await self._ensure_bucket()
+        params = {"Bucket": self.bucket, "Key": object_name}
+        if byte_range:
+            params["Range"] = byte_range
+        if if_none_match:
+            params["IfNoneMatch"] = if_none_match
+        try:
+            return await self.client.get_object(**params)
+        except Exception as exc:
+            code = getattr(exc, 'response', {}).get('Error', {}).get('Code')
+            if code in ('304', 'NotModified'):
+                return {"NotModified": True}
+            if code == 'InvalidRange':
+                raise ValueError(f"Range not satisfiable: {byte_range}")
+            if self._is_missing(exc):
+                return None
+            raise self._failed("Failed to open file", exc)
 
     async def generate_presigned_url(self, object_name: str, expiration: int = 3600) -> str:
         """
@@ -127,6 +446,85 @@ class S3StorageRepository:
         except Exception as exc:
             raise RuntimeError(f"Failed to generate upload URL: {exc}")
 
+    async def list_objects(self, prefix: str = "") -> List[Dict[str, Any]]:
+        """
+        Lists objects under a prefix
+
+        Args:
+            prefix: Object name prefix
+
+        Returns:
+            List[Dict[str, Any]]: Objects with Key, Size and LastModified
+
+        Raises:
+            RuntimeError: If listing fails
+        """
+        await self._ensure_bucket()
+        objects = []
+        try:
+            paginator = self.client.get_paginator('list_objects_v2')
+            async for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+                objects.extend(page.get('Contents', []))
+            return objects
+        except Exception as exc:
+            raise self._failed("Failed to list objects", exc)
+
+    async def list_children(self, prefix: str = "") -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Lists one level under a prefix: the objects directly under it and its sub-prefixes
+
+        Args:
+            prefix: Object name prefix ending with '/'
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[str]]: Objects (Key, Size, LastModified) and sub-prefixes
+
+        Raises:
+            RuntimeError: If listing fails
+        """
+        await self._ensure_bucket()
+        objects, prefixes = [], []
+        try:
+            paginator = self.client.get_paginator('list_objects_v2')
+            async for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+                objects.extend(page.get('Contents', []))
+                prefixes.extend(item['Prefix'] for item in page.get('CommonPrefixes', []))
+            return objects, prefixes
+        except Exception as exc:
+            raise self._failed("Failed to list objects", exc)
+
+    async def delete_objects(self, object_names: List[str]) -> List[str]:
+        """
+        Deletes objects with batched DeleteObjects requests (up to 1000 keys each),
+        sending the batches concurrently
+
+        Args:
+            object_names: Object names in storage
+
+        Returns:
+            List[str]: Object names that could not be deleted
+
+        Raises:
+            RuntimeError: If a delete request fails
+        """
+        await self._ensure_bucket()
+        batches = [object_names[i:i + DELETE_BATCH_SIZE] for i in range(0, len(object_names), DELETE_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(self.transfer_config.max_concurrency)
+
+        async def delete_batch(batch: List[str]) -> List[str]:
+            async with semaphore:
+                response = await self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+            return [error['Key'] for error in response.get('Errors', [])]
+
+        try:
+            results = await asyncio.gather(*(delete_batch(batch) for batch in batches))
+        except Exception as exc:
+            raise self._failed("Failed to delete objects", exc)
+        return [key for failed in results for key in failed]
+
     async def delete_file(self, object_name: str) -> bool:
         """
         Deletes a file from storage
@@ -140,6 +538,7 @@ class S3StorageRepository:
         Raises:
             RuntimeError: If file deletion fails
         """
+        await self._ensure_bucket()
         try:
             await self.client.delete_object(
                 Bucket=self.bucket,
@@ -147,4 +546,4 @@ class S3StorageRepository:
             )
             return True
         except Exception as exc:
-            raise RuntimeError(f"Failed to delete file: {exc}")
+            raise self._failed("Failed to delete file", exc)
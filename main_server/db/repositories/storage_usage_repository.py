@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from main_server.db.models import User
+from main_server.db.models.storage_usage import StorageUsage
+
+
+class StorageUsageRepository:
+    """Объем хранилища по пользователям, рассчитанный последней сверкой хранилища"""
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    async def replace_usage(self, usage: Dict[UUID, Tuple[int, int]], computed_at: datetime) -> None:
+        """
+        Заменяет итоги предыдущей сверки новыми
+
+        Args:
+            usage: {UUID пользователя: (число объектов, объем в байтах)}
+            computed_at: Время сверки
+        """
+        await self._session.execute(delete(StorageUsage))
+        self._session.add_all([
+            StorageUsage(user_id=user_id, object_count=count, total_bytes=size, computed_at=computed_at)
+            for user_id, (count, size) in usage.items()
+        ])
+        await self._session.flush()
+
+    async def get_usage(self, user_id: UUID) -> Optional[StorageUsage]:
+        """Объем хранилища пользователя или None, если сверка его файлов не найдена"""
+        result = await self._session.execute(select(StorageUsage).where(StorageUsage.user_id == user_id))
+        return result.scalar_one_or_none()
+
+    async def get_all_usage(self) -> List[Dict]:
+        """Объем хранилища всех пользователей, от большего к меньшему"""
+        result = await self._session.execute(
+            select(StorageUsage, User.full_name, User.email)
+            .join(User, User.id == StorageUsage.user_id)
+            .order_by(desc(StorageUsage.total_bytes))
+        )
+        return [
+            {
+                "user_id": usage.user_id,
+                "full_name": full_name,
+                "email": email,
+                "object_count": usage.object_count,
+                "total_bytes": usage.total_bytes,
+                "computed_at": usage.computed_at
+            }
+            for usage, full_name, email in result.all()
+        ]
@@ -0,0 +1,15 @@
+from .aggregates import DatasetAggregates
+from .dataset import (read_dataset, list_data_sheets, merge_datasets, merge_device_columns, normalize_device_name,
+                      dataset_fingerprint, devices_fingerprint, dump_dataset, load_dataset, load_dataset_chunks,
+                      DatasetManifest)
+from .analysis import (ReportAnalysis, build_aggregates, classify_meters, classify_device, analysis_params,
+                       QUALITY_PROFILES, DEFAULT_ANALYSIS_PARAMS, CATEGORIES)
+from .completeness import rows_per_day, sampling_interval, find_gaps, classify_days
+from .report_generator import generate_report_content, build_report, validate_template, section_keys
+from .excel_report import generate_excel_report
+from .raster import Panel, render_small_multiples
+from .section_cache import SectionCache, PngImage, get_section_cache
+from .shared_dataset import SharedDataset, as_frame, read_shared_dataset, cleanup_shared_datasets
+from .streaming import WelfordState, IdleCounter, RollingAnomalyDetector
+from .sketches import QuantileSketch
+from .workers import get_worker_pool, run_in_worker, run_in_worker_until, shutdown_worker_pool
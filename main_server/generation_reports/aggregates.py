@@ -0,0 +1,162 @@
+import pickle
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from main_server.generation_reports.completeness import (GAP_COLUMNS, find_gaps, rows_per_day, sampling_interval,
+                                                         timestamps_ns)
+from main_server.generation_reports.sketches import QuantileSketch
+from main_server.generation_reports.streaming import IdleCounter, RollingAnomalyDetector, WelfordState
+
+
+class DatasetAggregates:
+    """
+    Частичные агрегаты набора показаний для инкрементальной перегенерации отчета.
+
+    Хранит суточные суммы, почасовые суммы и количества (для профиля по часам суток),
+    а также состояние потоковых ядер: среднее и дисперсию по Уэлфорду, счетчик
+    нулевых показаний, кольцевые буферы окна поиска аномалий и квантильные скетчи
+    для порогов метода percentile, а также разрывы в ряду отметок времени.
+    Новые строки добавляются через extend() без пересчета всей истории.
+    Разделы, которым нужны все строки (часы недоиспользования, графики показаний),
+    по агрегатам не строятся.
+    """
+
+    # Версия формата; сохраненные агрегаты другой версии не используются
+    FORMAT_VERSION = 3
+
+    def __init__(self, columns, window_size: int = 24, sigma_threshold: float = 2,
+                 sketch_accuracy: float = 0.01):
+        self.format_version = self.FORMAT_VERSION
+        self.columns = list(columns)
+        self.window_size = window_size
+        self.sigma_threshold = sigma_threshold
+        self.sketch_accuracy = sketch_accuracy
+
+        self.start: Optional[pd.Timestamp] = None
+        self.end: Optional[pd.Timestamp] = None
+        self.rows = 0
+        self.time_delta: Optional[float] = None
+        # Шаг выгрузки в наносекундах (медиана интервалов первой части данных)
+        self.interval: Optional[int] = None
+
+        empty_index = pd.DatetimeIndex([])
+        self.daily_sum = pd.DataFrame(index=empty_index, columns=self.columns, dtype='float64')
+        self.daily_rows = pd.Series(index=empty_index, dtype='int64')
+        self.hourly_sum = pd.DataFrame(index=empty_index, columns=self.columns, dtype='float64')
+        self.hourly_count = pd.DataFrame(index=empty_index, columns=self.columns, dtype='int64')
+        self.gaps = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in
+                                  zip(GAP_COLUMNS, ('datetime64[ns]', 'datetime64[ns]', 'int64'))})
+
+        self.moments = WelfordState(self.columns)
+        self.idle = IdleCounter(self.columns)
+        self.anomaly_detector = RollingAnomalyDetector(self.columns, window_size, sigma_threshold)
+        self.quantiles = QuantileSketch(self.columns, sketch_accuracy)
+
+    @classmethod
+    def from_frame(cls, data_numeric: pd.DataFrame, window_size: int = 24,
+                   sigma_threshold: float = 2, sketch_accuracy: float = 0.01) -> "DatasetAggregates":
+        """Строит агрегаты по полному набору данных"""
+        return cls(data_numeric.columns, window_size, sigma_threshold, sketch_accuracy).extend(data_numeric)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DatasetAggregates":
+        aggregates = pickle.loads(data)
+        if not isinstance(aggregates, cls):
+            raise ValueError("Stored object is not DatasetAggregates")
+        if getattr(aggregates, 'format_version', None) != cls.FORMAT_VERSION:
+            raise ValueError("Stored aggregates have an outdated format")
+        return aggregates
+
+    def to_bytes(self) -> bytes:
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def is_compatible(self, columns, window_size: int, sigma_threshold: float,
+                      sketch_accuracy: float) -> bool:
+        """Проверяет, что агрегаты посчитаны для тех же устройств и параметров анализа"""
+        return (
+                self.columns == list(columns)
+                and self.window_size == window_size
+                and self.sigma_threshold == sigma_threshold
+                and self.sketch_accuracy == sketch_accuracy
+        )
+
+    def extend(self, data_numeric: pd.DataFrame) -> "DatasetAggregates":
+        """
+        Добавляет в агрегаты строки, которые идут позже уже учтенного периода
+
+        Args:
+            data_numeric: Показания (полная выгрузка или только новые строки)
+
+        Returns:
+            DatasetAggregates: self, для цепочки вызовов
+        """
+        chunk = data_numeric[self.columns]
+        if self.end is not None:
+            chunk = chunk[chunk.index > self.end]
+        if chunk.empty:
+            return self
+
+        if self.start is None:
+            self.start = chunk.index[0]
+        if self.time_delta is None:
+            index = chunk.index if self.end is None else chunk.index.insert(0, self.end)
+            if len(index) >= 2:
+                self.time_delta = (index[1] - index[0]).total_seconds() / 3600
+
+        # Разрывы ищутся и на стыке с уже учтенным периодом
+        timestamps = timestamps_ns(chunk.index if self.end is None else chunk.index.insert(0, self.end))
+        if self.interval is None:
+            self.interval = sampling_interval(timestamps)
+        if self.interval is not None:
+            gaps = find_gaps(timestamps, self.interval)
+            if not gaps.empty:
+                self.gaps = gaps if self.gaps.empty else pd.concat([self.gaps, gaps], ignore_index=True)
+
+        self.end = chunk.index[-1]
+        self.rows += len(chunk)
+
+        self.daily_sum = self.daily_sum.add(chunk.resample('D').sum(), fill_value=0)
+        self.daily_rows = self.daily_rows.add(rows_per_day(chunk.index), fill_value=0).astype('int64')
+
+        hourly = chunk.resample('h')
+        self.hourly_sum = self.hourly_sum.add(hourly.sum(), fill_value=0)
+        self.hourly_count = self.hourly_count.add(hourly.count(), fill_value=0)
+
+        values = chunk.to_numpy(dtype='float64')
+        self.moments.update_chunk(values)
+        self.idle.update_chunk(values)
+        self.anomaly_detector.update_chunk(chunk)
+        self.quantiles.update_chunk(chunk)
+
+        return self
+
+    @property
+    def total_hours(self) -> float:
+        return (self.end - self.start).total_seconds() / 3600
+
+    def daily_data(self) -> pd.DataFrame:
+        """Суточное потребление, аналог data_numeric.resample('D').sum()"""
+        days = pd.date_range(self.start.floor('D'), self.end.floor('D'), freq='D')
+        return self.daily_sum.reindex(index=days, fill_value=0)[self.columns]
+
+    def hourly_data(self) -> pd.DataFrame:
+        """Почасовое среднее, аналог data_numeric.resample('h').mean()"""
+        hours = pd.date_range(self.start.floor('h'), self.end.floor('h'), freq='h')
+        sums = self.hourly_sum.reindex(index=hours, fill_value=0)[self.columns]
+        counts = self.hourly_count.reindex(index=hours, fill_value=0)[self.columns]
+        return sums / counts.where(counts > 0)
+
+    def rows_per_day(self) -> pd.Series:
+        """Количество строк выгрузки за каждый день периода, включая дни без строк"""
+        days = pd.date_range(self.start.floor('D'), self.end.floor('D'), freq='D')
+        return self.daily_rows.reindex(index=days, fill_value=0)
+
+    @property
+    def zero_count(self) -> pd.Series:
+        return self.idle.counts()
+
+    def anomalies(self) -> pd.DataFrame:
+        """Статистика аномалий по устройствам, у которых они найдены"""
+        return self.anomaly_detector.stats()
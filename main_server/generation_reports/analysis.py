@@ -0,0 +1,398 @@
+import re
+import time
+from functools import cached_property
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from sklearn.cluster import KMeans
+
+from main_server.generation_reports.aggregates import DatasetAggregates
+from main_server.generation_reports.completeness import classify_days
+
+# Параметры анализа аномалий
+SIGMA_THRESHOLD = 2  # Пороговое значение σ для определения аномалий
+WINDOW_SIZE = 24  # Размер окна для скользящего среднего (в часах)
+TOP_N = 10  # Количество топовых счетчиков для отображения
+# Относительная погрешность квантильных скетчей для метода percentile
+PERCENTILE_SKETCH_ACCURACY = 0.01
+
+# Методы определения недоиспользования и их параметры
+UNDERUTILIZATION_PARAMS = {'fixed_pct': 0.2, 'percentile': 5, 'std_dev': 1, 'kmeans': None}
+# Метод, по которому строятся графики недоиспользования
+BEST_UNDERUTILIZATION_METHOD = 'percentile'
+
+# Параметры анализа по умолчанию; запрос на генерацию может переопределить любой из них
+DEFAULT_ANALYSIS_PARAMS = {
+    'sigma_threshold': SIGMA_THRESHOLD,
+    'window_size': WINDOW_SIZE,
+    'top_n': TOP_N,
+    'fixed_pct': UNDERUTILIZATION_PARAMS['fixed_pct'],
+    'percentile': UNDERUTILIZATION_PARAMS['percentile'],
+    'std_dev': UNDERUTILIZATION_PARAMS['std_dev'],
+    'best_method': BEST_UNDERUTILIZATION_METHOD,
+}
+
+# Уровни качества отчета:
+#   dpi - разрешение графиков
+#   max_plot_points - максимум точек временного ряда на графике (None - без прореживания)
+#   underutilization_methods - методы недоиспользования (kmeans - самый дорогой)
+#   miniatures - строить ли миниатюры аномалий
+QUALITY_PROFILES = {
+    'draft': {
+        'dpi': 100,
+        'max_plot_points': 2000,
+        'underutilization_methods': ('fixed_pct', 'percentile', 'std_dev'),
+        'miniatures': False,
+    },
+    'full': {
+        'dpi': 300,
+        'max_plot_points': None,
+        'underutilization_methods': tuple(UNDERUTILIZATION_PARAMS),
+        'miniatures': True,
+    },
+}
+
+
+def _number(value):
+    """Целые значения приводятся к int: 2.0 и 2 дают одинаковые подписи в отчете и ключи кэша"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def analysis_params(params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Параметры анализа: значения по умолчанию, дополненные переданными
+
+    Args:
+        params: Переопределяемые параметры из DEFAULT_ANALYSIS_PARAMS (None - значение по умолчанию)
+
+    Returns:
+        Полный набор параметров в нормализованном виде
+
+    Raises:
+        ValueError: Если передан неизвестный параметр или метод недоиспользования
+    """
+    resolved = dict(DEFAULT_ANALYSIS_PARAMS)
+    for name, value in (params or {}).items():
+        if name not in resolved:
+            raise ValueError(f"Unknown analysis parameter: {name}")
+        if value is not None:
+            resolved[name] = value
+
+    for name in ('sigma_threshold', 'fixed_pct', 'percentile', 'std_dev'):
+        resolved[name] = _number(resolved[name])
+    resolved['window_size'] = int(resolved['window_size'])
+    resolved['top_n'] = int(resolved['top_n'])
+    resolved['best_method'] = getattr(resolved['best_method'], 'value', resolved['best_method'])
+    if resolved['best_method'] not in UNDERUTILIZATION_PARAMS:
+        raise ValueError(f"Unknown underutilization method: {resolved['best_method']}")
+    return resolved
+
+
+def underutilization_methods(quality: str, params: Dict[str, Any]) -> List[str]:
+    """Методы недоиспользования уровня качества; метод для графиков считается всегда"""
+    methods = list(QUALITY_PROFILES[quality]['underutilization_methods'])
+    if params['best_method'] not in methods:
+        methods.append(params['best_method'])
+    return methods
+
+
+# Правила классификации счетчиков по названию: первое совпавшее правило задает категорию.
+# Выражения применяются к названию в нижнем регистре
+CATEGORY_RULES = [
+    ('PzS_12V', re.compile(r'^(?=.*pzs)(?=.*12v)', re.DOTALL)),
+    ('China', re.compile(r'china')),
+    ('SM', re.compile(r' sm|sm ')),
+    ('MO', re.compile(r' mo|mo ')),
+    ('BG', re.compile(r' bg|bg ')),
+    ('DIG', re.compile(r'dig')),
+    ('CP-300', re.compile(r'cp-300')),
+]
+DEFAULT_CATEGORY = 'Other'
+# Порядок категорий в отчете
+CATEGORIES = tuple(category for category, _ in CATEGORY_RULES) + (DEFAULT_CATEGORY,)
+
+
+def classify_device(name: str) -> str:
+    """Категория счетчика по правилам CATEGORY_RULES"""
+    name_lower = str(name).lower()
+    for category, pattern in CATEGORY_RULES:
+        if pattern.search(name_lower):
+            return category
+    return DEFAULT_CATEGORY
+
+
+def classify_meters(column_names, categories: Optional[Dict[str, str]] = None) -> Dict[str, List[str]]:
+    """
+    Классифицирует счетчики по типам на основе их названий
+
+    Args:
+        column_names: Названия счетчиков
+        categories: Известные категории из реестра устройств: {название: категория};
+                    остальные счетчики классифицируются по CATEGORY_RULES
+
+    Returns:
+        {категория: [названия]} без пустых категорий; сначала категории из CATEGORIES
+    """
+    categories = categories or {}
+    result: Dict[str, List[str]] = {category: [] for category in CATEGORIES}
+    for col in column_names:
+        category = categories.get(col) or classify_device(col)
+        result.setdefault(category, []).append(col)
+
+    # Удаляем пустые категории
+    return {k: v for k, v in result.items() if v}
+
+
+def build_aggregates(
+        data_numeric: pd.DataFrame,
+        previous: Optional[DatasetAggregates] = None,
+        window_size: int = WINDOW_SIZE,
+        sigma_threshold: float = SIGMA_THRESHOLD
+) -> DatasetAggregates:
+    """
+    Возвращает агрегаты data_numeric с заданными параметрами анализа
+
+    Args:
+        data_numeric: Показания по устройствам
+        previous: Агрегаты ранее загруженного префикса этих данных; дополняются
+                  новыми строками, если посчитаны с теми же параметрами
+        window_size: Окно скользящего среднего для поиска аномалий
+        sigma_threshold: Порог аномалий в σ
+
+    Returns:
+        DatasetAggregates: Агрегаты полного набора данных
+    """
+    if previous is not None and previous.is_compatible(
+            data_numeric.columns, window_size, sigma_threshold, PERCENTILE_SKETCH_ACCURACY):
+        return previous.extend(data_numeric)
+    return DatasetAggregates.from_frame(
+        data_numeric, window_size, sigma_threshold, PERCENTILE_SKETCH_ACCURACY)
+
+
+class ReportAnalysis:
+    """
+    Таблицы анализа отчета, не зависящие от формата вывода.
+
+    Используется генераторами docx и xlsx: каждый из них оформляет
+    одни и те же результаты по-своему.
+    """
+
+    def __init__(
+            self,
+            data_numeric: pd.DataFrame,
+            aggregates: Optional[DatasetAggregates] = None,
+            quality: str = 'full',
+            deadline: Optional[float] = None,
+            params: Optional[Dict[str, Any]] = None,
+            categories: Optional[Dict[str, str]] = None
+    ):
+        """
+        Args:
+            data_numeric: Показания по устройствам
+            aggregates: Готовые агрегаты этого набора данных (опционально)
+            quality: Уровень качества из QUALITY_PROFILES
+            deadline: Время (time.time()), после которого генерация прерывается
+            params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+            categories: Категории устройств из реестра: {столбец: категория} (опционально)
+        """
+        if quality not in QUALITY_PROFILES:
+            raise ValueError(f"Unknown report quality: {quality}")
+        self.quality = quality
+        self.profile = QUALITY_PROFILES[quality]
+        self.deadline = deadline
+        self.params = analysis_params(params)
+        self.categories = categories or {}
+
+        self.data_numeric = data_numeric
+        aggregates = build_aggregates(data_numeric, aggregates, self.params['window_size'],
+                                      self.params['sigma_threshold'])
+        self.aggregates = aggregates
+
+        self.time_delta = aggregates.time_delta
+        self.total_hours = aggregates.total_hours
+        self.daily_data = aggregates.daily_data()
+
+    def _check_deadline(self) -> None:
+        """
+        Прерывает генерацию, если время уровня качества истекло; вызывается между разделами
+        и в долгих циклах по устройствам (кластеризация, графики)
+        """
+        if self.deadline is not None and time.time() > self.deadline:
+            raise TimeoutError("Report generation exceeded the time limit")
+
+    @cached_property
+    def total_consumption(self) -> pd.Series:
+        """Суммарное потребление по устройствам, по убыванию"""
+        return self.daily_data.sum().sort_values(ascending=False)
+
+    @property
+    def top10(self) -> pd.Index:
+        return self.total_consumption.head(10).index
+
+    @cached_property
+    def meter_categories(self) -> Dict[str, List[str]]:
+        return classify_meters(self.daily_data.columns, self.categories)
+
+    @cached_property
+    def category_data(self) -> pd.DataFrame:
+        """Суточное потребление по автоматически определенным категориям"""
+        category_data = pd.DataFrame()
+        for category, cols in self.meter_categories.items():
+            category_data[category] = self.daily_data[cols].sum(axis=1)
+        return category_data
+
+    @cached_property
+    def typical_day(self) -> pd.DataFrame:
+        """Среднее потребление по часам суток"""
+        hourly_data = self.aggregates.hourly_data()
+        return hourly_data.groupby(hourly_data.index.hour).mean()
+
+    @cached_property
+    def days_status(self) -> pd.DataFrame:
+        """Полнота данных по дням: строк, ожидалось, пропущено интервалов, полный ли день"""
+        return classify_days(self.aggregates.rows_per_day(), self.aggregates.interval)
+
+    @property
+    def data_gaps(self) -> pd.DataFrame:
+        """Разрывы в ряду отметок времени: начало, конец, пропущено интервалов"""
+        return self.aggregates.gaps
+
+    @cached_property
+    def anomalies_df(self) -> pd.DataFrame:
+        """Статистика аномалий по устройствам, по убыванию суммарного отклонения"""
+        # Статистика аномалий по всем счетчикам уже накоплена в агрегатах
+        device_anomalies = self.aggregates.anomalies()
+        anomalies_df = pd.DataFrame({
+            'Устройство': device_anomalies.index,
+            'Кол-во аномалий': device_anomalies['count'].to_numpy(),
+            'Макс. отклонение (кВт·ч)': device_anomalies['max_deviation'].to_numpy(),
+            'Среднее отклонение (кВт·ч)': device_anomalies['mean_deviation'].to_numpy(),
+            'Суммарное отклонение (кВт·ч)': device_anomalies['total_deviation'].to_numpy()
+        })
+        if anomalies_df.empty:
+            return anomalies_df
+        return anomalies_df.sort_values('Суммарное отклонение (кВт·ч)', ascending=False)
+
+    @cached_property
+    def idle_stats(self) -> pd.DataFrame:
+        """Время выключенного состояния (показание = 0) по устройствам"""
+        idle_counts = self.aggregates.zero_count
+        idle_hours = idle_counts * self.time_delta
+        idle_perc = idle_hours / self.total_hours * 100
+        idle_stats = pd.DataFrame({'часов_выключено': idle_hours, 'процент_выключено': idle_perc})
+        idle_stats.sort_values('часов_выключено', ascending=False, inplace=True)
+        return idle_stats
+
+    # === МЕТОДЫ ОПРЕДЕЛЕНИЯ НЕДОИСПОЛЬЗОВАНИЯ ОБОРУДОВАНИЯ ===
+    def _compute_underutilization(self, method='fixed_pct', param=0.2):
+        """
+        method:
+          'fixed_pct' - фиксированный процент от среднего (param = доля, например 0.2)
+          'percentile' - порог на основе k-го перцентиля (param = перцентиль, 5 = 5%)
+          'std_dev' - порог = среднее - param * std (param = множитель)
+          'kmeans' - кластеризация на 2 группы, низкое/высокое
+
+        Пороги берутся из агрегатов, но строки ниже порога считаются по всему набору:
+        порог зависит от всей истории, поэтому при досчете часы не дополняются.
+        """
+        data_numeric = self.data_numeric
+
+        if method == 'fixed_pct':
+            mean_cons = self.aggregates.moments.mean()
+            thresh = mean_cons * param
+            mask = data_numeric.lt(thresh)
+
+        elif method == 'percentile':
+            # Порог берется из сливаемых скетчей агрегатов, без полной сортировки истории
+            thresh = self.aggregates.quantiles.quantile(param / 100)
+            mask = data_numeric.lt(thresh)
+
+        elif method == 'std_dev':
+            mean_cons = self.aggregates.moments.mean()
+            std_cons = self.aggregates.moments.std()
+            thresh = mean_cons - param * std_cons
+            thresh = thresh.clip(lower=0)  # Предотвращаем отрицательные пороги
+            mask = data_numeric.lt(thresh)
+
+        elif method == 'kmeans':
+            # Для каждого устройства: кластеризация значений на два кластера
+            mask = pd.DataFrame(index=data_numeric.index, columns=data_numeric.columns)
+            for col in data_numeric:
+                self._check_deadline()
+                vals = data_numeric[[col]].dropna().values
+                if len(vals) > 1:  # Проверка на достаточное количество данных
+                    vals = vals.reshape(-1, 1)
+                    kmeans = KMeans(n_clusters=2, random_state=42).fit(vals)
+                    # кластеры, отсортированные по центру
+                    centers = sorted([(c, i) for i, c in enumerate(kmeans.cluster_centers_.flatten())])
+                    low_label = centers[0][1]
+                    labels = pd.Series(kmeans.labels_, index=data_numeric[col].dropna().index)
+                    mask[col] = labels.map(lambda x: x == low_label)
+                else:
+                    mask[col] = False
+            thresh = None
+
+        else:
+            raise ValueError('Unknown method')
+
+        counts = mask.sum()
+        hours = counts * self.time_delta
+        perc = hours / self.total_hours * 100
+        stats = pd.DataFrame({
+            'часов_недоиспользования': hours,
+            'процент_недоиспользования': perc,
+            'метод': method
+        }).sort_values('часов_недоиспользования', ascending=False)
+        return stats, thresh
+
+    @cached_property
+    def underutilization(self) -> Dict[str, dict]:
+        """Результаты методов уровня качества: {метод: {'stats': ..., 'threshold': ...}}"""
+        results = {}
+        for method in underutilization_methods(self.quality, self.params):
+            self._check_deadline()
+            stats, thresh = self._compute_underutilization(method=method, param=self.params.get(method))
+            results[method] = {'stats': stats, 'threshold': thresh}
+        return results
+
+    def underutilization_hours(self) -> Dict[str, Dict[str, float]]:
+        """Часы недоиспользования по методам уровня качества: {метод: {устройство: часы}}"""
+        return {
+            method: result['stats']['часов_недоиспользования'].astype(float).to_dict()
+            for method, result in self.underutilization.items()
+        }
+
+    def device_summaries(self) -> List[Dict[str, Any]]:
+        """
+        Компактные итоги отчета по каждому устройству для межотчетной аналитики
+
+        Часы недоиспользования считаются всеми методами уровня качества; методы,
+        которые уровень не считает (kmeans в черновике), сохраняются как None.
+
+        Returns:
+            Список словарей: device, total_consumption, idle_hours, anomaly_count,
+            anomaly_deviation, underutilization_hours ({метод: часы или None})
+        """
+        underutilization_hours = {method: None for method in UNDERUTILIZATION_PARAMS}
+        underutilization_hours.update(self.underutilization_hours())
+
+        total_consumption = self.total_consumption
+        idle_hours = self.idle_stats['часов_выключено']
+        anomalies = self.aggregates.anomalies()
+
+        summaries = []
+        for device in self.data_numeric.columns:
+            anomaly_count = int(anomalies['count'][device]) if device in anomalies.index else 0
+            summaries.append({
+                'device': device,
+                'total_consumption': float(total_consumption.get(device, 0.0)),
+                'idle_hours': float(idle_hours.get(device, 0.0)),
+                'anomaly_count': anomaly_count,
+                'anomaly_deviation': float(anomalies['total_deviation'][device]) if anomaly_count else 0.0,
+                'underutilization_hours': {
+                    method: None if hours is None else hours.get(device, 0.0)
+                    for method, hours in underutilization_hours.items()
+                },
+            })
+        return summaries
@@ -0,0 +1,97 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 24 * 3600 * 10 ** 9
+# Разрыв - интервал между соседними строками больше шага выгрузки в GAP_TOLERANCE раз
+GAP_TOLERANCE = 1.5
+# День полный, если строк в нем не меньше этой доли от максимума по дням
+FULL_DAY_SHARE = 0.95
+
+GAP_COLUMNS = ['начало', 'конец', 'пропущено_интервалов']
+
+
+def timestamps_ns(index: pd.Index) -> np.ndarray:
+    """Отметки времени индекса как int64 (наносекунды)"""
+    return np.asarray(index, dtype='datetime64[ns]').view('int64')
+
+
+def day_counts(timestamps: np.ndarray) -> Tuple[int, np.ndarray]:
+    """
+    Количество строк по дням через bincount по номеру дня
+
+    Args:
+        timestamps: Отсортированные отметки времени int64 (наносекунды)
+
+    Returns:
+        Номер первого дня от эпохи и количества строк по всем дням подряд
+        от первого до последнего (дни без строк - 0)
+    """
+    days = timestamps // NS_PER_DAY
+    first_day = int(days[0])
+    return first_day, np.bincount(days - first_day)
+
+
+def rows_per_day(index: pd.Index) -> pd.Series:
+    """Количество строк за каждый день периода, включая дни без строк"""
+    if len(index) == 0:
+        return pd.Series(index=pd.DatetimeIndex([]), dtype='int64')
+    first_day, counts = day_counts(timestamps_ns(index))
+    days = pd.DatetimeIndex((first_day + np.arange(len(counts))) * NS_PER_DAY)
+    return pd.Series(counts.astype('int64'), index=days)
+
+
+def sampling_interval(timestamps: np.ndarray) -> Optional[int]:
+    """Шаг выгрузки (наносекунды): медиана положительных интервалов между строками"""
+    diffs = np.diff(timestamps)
+    diffs = diffs[diffs > 0]
+    if diffs.size == 0:
+        return None
+    return int(np.median(diffs))
+
+
+def find_gaps(timestamps: np.ndarray, interval: int) -> pd.DataFrame:
+    """
+    Разрывы в ряду отметок времени
+
+    Args:
+        timestamps: Отсортированные отметки времени int64 (наносекунды)
+        interval: Шаг выгрузки (наносекунды)
+
+    Returns:
+        pd.DataFrame: Начало и конец каждого разрыва (последняя строка до и первая
+        после) и число пропущенных интервалов
+    """
+    diffs = np.diff(timestamps)
+    gap_mask = diffs > interval * GAP_TOLERANCE
+    missing = np.rint(diffs[gap_mask] / interval).astype('int64') - 1
+    return pd.DataFrame({
+        GAP_COLUMNS[0]: pd.DatetimeIndex(timestamps[:-1][gap_mask]),
+        GAP_COLUMNS[1]: pd.DatetimeIndex(timestamps[1:][gap_mask]),
+        GAP_COLUMNS[2]: missing,
+    })
+
+
+def classify_days(counts_per_day: pd.Series, interval: Optional[int] = None) -> pd.DataFrame:
+    """
+    Полнота данных по дням
+
+    Args:
+        counts_per_day: Количество строк по дням (rows_per_day)
+        interval: Шаг выгрузки (наносекунды); без него ожидаемое число строк
+                  за день не считается
+
+    Returns:
+        pd.DataFrame по дням: строк, ожидалось строк, пропущено интервалов,
+        полный ли день (не меньше FULL_DAY_SHARE от максимума по дням)
+    """
+    counts = counts_per_day.to_numpy()
+    threshold = int(counts.max() * FULL_DAY_SHARE) if counts.size else 0
+    expected = NS_PER_DAY // interval if interval else 0
+    return pd.DataFrame({
+        'строк': counts,
+        'ожидалось': expected,
+        'пропущено': np.maximum(expected - counts, 0),
+        'полный': counts >= threshold,
+    }, index=counts_per_day.index)
@@ -0,0 +1,248 @@
+import hashlib
+import io
+import json
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Лист выгрузки счетчиков, из которого строится отчет
+DEFAULT_SHEET_NAME = "2025-04-01-00-00-00-e"
+
+
+def open_source(data: Union[bytes, str]):
+    """Источник для чтения файла: путь передается как есть, бинарные данные - как поток"""
+    return data if isinstance(data, str) else io.BytesIO(data)
+
+
+def list_data_sheets(excel_data: Union[bytes, str]) -> List[str]:
+    """
+    Возвращает листы книги, похожие на выгрузку показаний (есть столбцы «Дата» и «Время»)
+
+    Args:
+        excel_data: Бинарные данные Excel файла или путь к нему
+
+    Returns:
+        Имена листов с показаниями в порядке следования в книге
+    """
+    headers = pd.read_excel(open_source(excel_data), sheet_name=None, skiprows=1, nrows=0)
+    sheets = []
+    for sheet_name, header in headers.items():
+        columns = set(header.columns.astype(str).str.strip())
+        if {'Дата', 'Время'} <= columns:
+            sheets.append(sheet_name)
+    return sheets
+
+
+def read_dataset(excel_data: Union[bytes, str], sheet_name: Optional[str] = None) -> pd.DataFrame:
+    """
+    Загружает выгрузку счетчиков из Excel и приводит ее к числовой таблице
+
+    Args:
+        excel_data: Бинарные данные Excel файла или путь к нему
+        sheet_name: Имя листа с показаниями; по умолчанию DEFAULT_SHEET_NAME,
+                    а если такого листа нет - первый лист с показаниями
+
+    Returns:
+        pd.DataFrame: Показания по устройствам, индексированные по дате и времени
+    """
+    excel_file = pd.ExcelFile(open_source(excel_data))
+    if sheet_name is None:
+        if DEFAULT_SHEET_NAME in excel_file.sheet_names:
+            sheet_name = DEFAULT_SHEET_NAME
+        else:
+            data_sheets = list_data_sheets(excel_data)
+            if not data_sheets:
+                raise ValueError("Workbook has no sheets with meter readings")
+            sheet_name = data_sheets[0]
+
+    data = excel_file.parse(sheet_name=sheet_name, skiprows=1)
+
+    # Очистка заголовков и объединение даты и времени
+    data.columns = data.columns.astype(str).str.strip()
+    data['DateTime'] = pd.to_datetime(
+        data['Дата'].astype(str) + ' ' + data['Время'].astype(str),
+        dayfirst=True
+    )
+    data.set_index('DateTime', inplace=True)
+
+    # Оставляем только числовые значения; все показания - float64, чтобы набор данных
+    # был одной матрицей (см. SharedDataset) и хэш не зависел от того, есть ли в столбце дроби
+    data_numeric = data.drop(columns=['Дата', 'Время']).apply(pd.to_numeric, errors='coerce').astype('float64')
+    return data_numeric.sort_index()
+
+
+def normalize_device_name(name) -> str:
+    """Ключ сопоставления устройств из разных выгрузок: без лишних пробелов и регистра"""
+    return " ".join(str(name).split()).casefold()
+
+
+def merge_device_columns(frame: pd.DataFrame, canonical: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Сводит столбцы одного устройства под разными написаниями (см. normalize_device_name) в один
+
+    Иначе два столбца выгрузки дали бы одно устройство реестра и две сводки по нему.
+    Имя столбца берется из первого написания, показание - первое непустое по порядку столбцов.
+
+    Args:
+        frame: Показания по устройствам
+        canonical: Имена устройств по ключу сопоставления, общие для нескольких выгрузок;
+                   дополняются новыми устройствами
+
+    Returns:
+        pd.DataFrame: Показания с одним столбцом на устройство (frame, если сводить нечего)
+    """
+    canonical = {} if canonical is None else canonical
+    mapping = {
+        column: canonical.setdefault(normalize_device_name(column), str(column).strip())
+        for column in frame.columns
+    }
+    if all(column == name for column, name in mapping.items()) and not frame.columns.has_duplicates:
+        return frame
+    frame = frame.rename(columns=mapping)
+    if frame.columns.has_duplicates:
+        frame = pd.DataFrame(
+            {name: frame.loc[:, [name]].bfill(axis=1).iloc[:, 0] for name in dict.fromkeys(frame.columns)},
+            index=frame.index
+        )
+    return frame
+
+
+def merge_datasets(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Объединяет несколько выгрузок (файлов или листов) в один набор данных
+
+    Столбцы сопоставляются по нормализованному имени устройства, итоговое имя
+    берется из первой выгрузки, где устройство встретилось (см. merge_device_columns).
+    Строки объединяются по отметке времени; при пересечении берется первое непустое показание.
+
+    Args:
+        frames: Показания, полученные через read_dataset
+
+    Returns:
+        pd.DataFrame: Объединенные показания, отсортированные по времени
+    """
+    if len(frames) == 1:
+        return merge_device_columns(frames[0])
+
+    canonical: Dict[str, str] = {}
+    renamed = [merge_device_columns(frame, canonical) for frame in frames]
+
+    combined = pd.concat(renamed, axis=0, sort=False)
+    combined = combined[list(dict.fromkeys(canonical.values()))]
+    if combined.index.has_duplicates:
+        combined = combined.groupby(level=0).first()
+    return combined.sort_index()
+
+
+def devices_fingerprint(columns: Iterable[str]) -> str:
+    """Хэш набора устройств (имен столбцов) в порядке выгрузки"""
+    return hashlib.sha256("\x1f".join(map(str, columns)).encode("utf-8")).hexdigest()
+
+
+def dataset_fingerprint(data_numeric: pd.DataFrame, rows: Optional[int] = None, start: int = 0,
+                        prefix_hash: Optional[str] = None) -> str:
+    """
+    Хэш содержимого набора данных.
+
+    Хэш считается по построчным хэшам pandas и продолжает хэш предыдущих строк:
+    для строк с `start` по `rows` это sha256(prefix_hash + хэши строк), где для начала
+    набора вместо prefix_hash берется хэш устройств. Поэтому хэш дописанной выгрузки
+    считается только по новым строкам, а хэш набора из одной части совпадает с хэшем
+    всего набора за один проход.
+
+    Args:
+        data_numeric: Показания по устройствам
+        rows: Номер строки, до которой считается хэш (по умолчанию до конца)
+        start: Номер первой строки, по которой считается хэш
+        prefix_hash: Хэш строк до start (обязателен, если start > 0)
+    """
+    if prefix_hash is None:
+        if start:
+            raise ValueError("prefix_hash is required to hash rows after the start of a dataset")
+        prefix_hash = devices_fingerprint(data_numeric.columns)
+    row_hashes = pd.util.hash_pandas_object(data_numeric.iloc[start:rows], index=True).to_numpy(dtype=np.uint64)
+    digest = hashlib.sha256(prefix_hash.encode("ascii"))
+    digest.update(row_hashes.tobytes())
+    return digest.hexdigest()
+
+
+class DatasetManifest:
+    """
+    Состав набора данных, сохраненного в S3 по частям.
+
+    Каждая часть - строки одной загрузки, дописанные к предыдущим частям, с хэшем
+    набора по ее последнюю строку включительно (см. dataset_fingerprint). Досчитанный
+    отчет сохраняет только новую часть и манифест со ссылками на части предыдущего набора.
+    """
+
+    # Расширение манифеста; наборы, сохраненные одним pickle (.pkl), читаются как есть
+    SUFFIX = ".json"
+
+    def __init__(self, chunks: Iterable[Tuple[str, int, str]] = ()):
+        """
+        Args:
+            chunks: Части по порядку: (ключ в хранилище, число строк, хэш набора по конец части)
+        """
+        self.chunks = [(str(key), int(rows), str(chunk_hash)) for key, rows, chunk_hash in chunks]
+
+    @classmethod
+    def is_manifest(cls, object_key: str) -> bool:
+        return object_key.endswith(cls.SUFFIX)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DatasetManifest":
+        return cls(json.loads(data)["chunks"])
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({"chunks": self.chunks}).encode("utf-8")
+
+    @property
+    def rows(self) -> int:
+        return sum(rows for _, rows, _ in self.chunks)
+
+    @property
+    def dataset_hash(self) -> Optional[str]:
+        return self.chunks[-1][2] if self.chunks else None
+
+    def append(self, object_key: str, rows: int, dataset_hash: str) -> "DatasetManifest":
+        """Новый манифест с дописанной частью"""
+        return DatasetManifest(self.chunks + [(object_key, rows, dataset_hash)])
+
+    def matches_prefix(self, data_numeric: pd.DataFrame) -> bool:
+        """
+        Проверяет, что первые строки data_numeric - это сохраненный набор без изменений
+
+        Хэши считаются по границам частей, проверка прекращается на первой несовпавшей части.
+        """
+        if len(data_numeric) < self.rows:
+            return False
+        start, chunk_hash = 0, None
+        for _, rows, stored_hash in self.chunks:
+            chunk_hash = dataset_fingerprint(data_numeric, start + rows, start, chunk_hash)
+            if chunk_hash != stored_hash:
+                return False
+            start += rows
+        return True
+
+
+def dump_dataset(data_numeric: pd.DataFrame) -> bytes:
+    """Сериализует разобранный набор данных (или его часть) для хранения в S3"""
+    buffer = io.BytesIO()
+    data_numeric.to_pickle(buffer)
+    return buffer.getvalue()
+
+
+def load_dataset(data: bytes) -> pd.DataFrame:
+    """
+    Восстанавливает набор данных, сохраненный через dump_dataset; столбцы одного устройства
+    в наборах, сохраненных до их сведения при разборе, сводятся здесь
+    """
+    return merge_device_columns(pd.read_pickle(io.BytesIO(data)))
+
+
+def load_dataset_chunks(chunks: List[bytes]) -> pd.DataFrame:
+    """Восстанавливает набор данных из частей, сохраненных через dump_dataset (см. DatasetManifest)"""
+    if len(chunks) == 1:
+        return load_dataset(chunks[0])
+    return pd.concat([load_dataset(chunk) for chunk in chunks], axis=0)
@@ -0,0 +1,302 @@
+import io
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.chart import BarChart, LineChart, Reference
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from main_server.generation_reports.aggregates import DatasetAggregates
+from main_server.generation_reports.analysis import ReportAnalysis
+
+# Размер диаграмм на листе (в сантиметрах)
+CHART_WIDTH = 24
+CHART_HEIGHT = 12
+
+
+def generate_excel_report(
+        data_numeric: pd.DataFrame,
+        aggregates: Optional[DatasetAggregates] = None,
+        quality: str = 'full',
+        deadline: Optional[float] = None,
+        params: Optional[Dict[str, Any]] = None,
+        categories: Optional[Dict[str, str]] = None
+) -> bytes:
+    """
+    Генерирует отчет в формате xlsx: таблицы анализа и нативные диаграммы Excel
+
+    Args:
+        data_numeric: Показания по устройствам, индексированные по дате и времени
+        aggregates: Готовые агрегаты этого набора данных (опционально)
+        quality: Уровень качества: "draft" или "full"
+        deadline: Время (time.time()), после которого генерация прерывается TimeoutError
+        params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+        categories: Категории устройств из реестра: {столбец: категория} (опционально)
+
+    Returns:
+        bytes: Бинарные данные книги Excel
+    """
+    return ExcelReportGenerator(data_numeric, aggregates, quality, deadline, params, categories).render()
+
+
+def _value(value):
+    """Приводит значение pandas/numpy к типу, который понимает openpyxl"""
+    if value is None:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class ExcelReportGenerator(ReportAnalysis):
+    """
+    Строит отчет в формате xlsx в потоковом режиме (write_only).
+
+    Каждый раздел отчета - отдельный лист с таблицей; диаграммы ссылаются
+    на ячейки этих таблиц, поэтому растровые изображения не создаются.
+    """
+
+    def __init__(
+            self,
+            data_numeric: pd.DataFrame,
+            aggregates: Optional[DatasetAggregates] = None,
+            quality: str = 'full',
+            deadline: Optional[float] = None,
+            params: Optional[Dict[str, Any]] = None,
+            categories: Optional[Dict[str, str]] = None
+    ):
+        super().__init__(data_numeric, aggregates, quality, deadline, params, categories)
+        self.workbook = Workbook(write_only=True)
+
+    def render(self) -> bytes:
+        for add_sheet in (self._add_summary, self._add_daily, self._add_completeness, self._add_top_consumers,
+                          self._add_categories,
+                          self._add_hourly_profile, self._add_anomalies, self._add_idle,
+                          self._add_underutilization):
+            self._check_deadline()
+            add_sheet()
+
+        output = io.BytesIO()
+        self.workbook.save(output)
+        return output.getvalue()
+
+    def _header(self, sheet, values: Iterable) -> None:
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=str(value))
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        sheet.append(cells)
+
+    def _append(self, sheet, values: Iterable) -> None:
+        sheet.append([_value(value) for value in values])
+
+    def _add_chart(self, sheet, chart, data_ref: Reference, categories_ref: Reference, anchor_column: int,
+                   title: str, x_title: str, y_title: str) -> None:
+        chart.title = title
+        chart.x_axis.title = x_title
+        chart.y_axis.title = y_title
+        chart.width = CHART_WIDTH
+        chart.height = CHART_HEIGHT
+        chart.add_data(data_ref, titles_from_data=True)
+        chart.set_categories(categories_ref)
+        sheet.add_chart(chart, f"{get_column_letter(anchor_column)}2")
+
+    # === СВОДКА ===
+    def _add_summary(self):
+        sheet = self.workbook.create_sheet('Сводка')
+        daily_data = self.daily_data
+        peak_hours = self.typical_day.sum(axis=1)
+
+        self._header(sheet, ['Показатель', 'Значение'])
+        rows = [
+            ('Начало периода', daily_data.index.min().strftime('%d.%m.%Y')),
+            ('Конец периода', daily_data.index.max().strftime('%d.%m.%Y')),
+            ('Количество устройств', len(self.data_numeric.columns)),
+            ('Часов наблюдения', self.total_hours),
+            ('Пиковый час', f"{peak_hours.idxmax()}:00-{peak_hours.idxmax() + 1}:00"),
+            ('Пиковое потребление (кВт·ч)', peak_hours.max()),
+            ('Порог аномалий (σ)', self.params['sigma_threshold']),
+            ('Окно скользящего среднего (ч)', self.params['window_size']),
+            ('Метод недоиспользования для графиков', self.params['best_method']),
+        ]
+        for row in rows:
+            self._append(sheet, row)
+
+        sheet.append([])
+        self._header(sheet, ['Категория', 'Количество устройств'])
+        for category, cols in self.meter_categories.items():
+            self._append(sheet, [category, len(cols)])
+
+    # === РАЗДЕЛ 1: ОБЩИЙ АНАЛИЗ ПОТРЕБЛЕНИЯ ===
+    def _add_daily(self):
+        sheet = self.workbook.create_sheet('Суточное потребление')
+        # Устройства по убыванию потребления: топ-10 занимают первые столбцы для диаграммы
+        columns = list(self.total_consumption.index)
+        daily_data = self.daily_data[columns]
+        daily_total = daily_data.sum(axis=1)
+        full = self.days_status['полный']
+
+        self._header(sheet, ['Дата', 'Итого', 'Полный день', *columns])
+        for day, row in daily_data.iterrows():
+            self._append(sheet, [day.date(), daily_total[day], 'Да' if full[day] else 'Нет', *row.to_numpy()])
+
+        rows = len(daily_data) + 1
+        top_columns = min(len(self.top10), len(columns))
+        self._add_chart(
+            sheet, LineChart(),
+            Reference(sheet, min_col=4, max_col=3 + top_columns, min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=len(columns) + 5,
+            title='Суточное потребление: Топ-10 устройств', x_title='Дата', y_title='Потребление (кВт·ч)'
+        )
+        self._add_chart(
+            sheet, BarChart(),
+            Reference(sheet, min_col=2, min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=len(columns) + 20,
+            title='Суммарное потребление электроэнергии по дням', x_title='Дата', y_title='Потребление (кВт·ч)'
+        )
+
+    def _add_completeness(self):
+        sheet = self.workbook.create_sheet('Полнота данных')
+        self._header(sheet, ['Дата', 'Строк', 'Ожидалось строк', 'Пропущено интервалов', 'Полный день'])
+        for day, row in self.days_status.iterrows():
+            self._append(sheet, [day.date(), row['строк'], row['ожидалось'], row['пропущено'],
+                                 'Да' if row['полный'] else 'Нет'])
+
+        sheet.append([])
+        self._header(sheet, ['Начало разрыва', 'Конец разрыва', 'Пропущено интервалов'])
+        for gap in self.data_gaps.itertuples(index=False):
+            self._append(sheet, gap)
+
+    def _add_top_consumers(self):
+        sheet = self.workbook.create_sheet('Топ потребителей')
+        self._header(sheet, ['Устройство', 'Потребление (кВт·ч)'])
+        for device, value in self.total_consumption.items():
+            self._append(sheet, [device, value])
+
+        rows = min(len(self.total_consumption), 10) + 1
+        self._add_chart(
+            sheet, BarChart(),
+            Reference(sheet, min_col=2, min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=4,
+            title='Топ-10 потребителей электроэнергии', x_title='Устройство', y_title='Потребление (кВт·ч)'
+        )
+
+    def _add_categories(self):
+        sheet = self.workbook.create_sheet('Категории')
+        category_data = self.category_data
+
+        self._header(sheet, ['Дата', *category_data.columns])
+        for day, row in category_data.iterrows():
+            self._append(sheet, [day.date(), *row.to_numpy()])
+
+        rows = len(category_data) + 1
+        self._add_chart(
+            sheet, LineChart(),
+            Reference(sheet, min_col=2, max_col=1 + len(category_data.columns), min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=len(category_data.columns) + 3,
+            title='Суточное потребление по категориям оборудования', x_title='Дата', y_title='Потребление (кВт·ч)'
+        )
+
+    # === РАЗДЕЛ 2: АНАЛИЗ ВРЕМЕННЫХ ЗАКОНОМЕРНОСТЕЙ ===
+    def _add_hourly_profile(self):
+        sheet = self.workbook.create_sheet('Профиль суток')
+        typical_day = self.typical_day[list(self.top10)]
+
+        self._header(sheet, ['Час', *typical_day.columns])
+        for hour, row in typical_day.iterrows():
+            self._append(sheet, [hour, *row.to_numpy()])
+
+        rows = len(typical_day) + 1
+        self._add_chart(
+            sheet, LineChart(),
+            Reference(sheet, min_col=2, max_col=1 + len(typical_day.columns), min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=len(typical_day.columns) + 3,
+            title='Среднее потребление по часам суток (Топ-10 устройств)', x_title='Час дня',
+            y_title='Среднее потребление (кВт·ч)'
+        )
+
+    # === РАЗДЕЛ 3: АНАЛИЗ АНОМАЛИЙ ПОТРЕБЛЕНИЯ ===
+    def _add_anomalies(self):
+        sheet = self.workbook.create_sheet('Аномалии')
+        anomalies_df = self.anomalies_df
+
+        self._header(sheet, anomalies_df.columns)
+        for row in anomalies_df.itertuples(index=False):
+            self._append(sheet, row)
+        if anomalies_df.empty:
+            return
+
+        top_n, sigma_threshold = self.params['top_n'], self.params['sigma_threshold']
+        rows = min(len(anomalies_df), top_n) + 1
+        self._add_chart(
+            sheet, BarChart(),
+            Reference(sheet, min_col=5, min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=len(anomalies_df.columns) + 2,
+            title=f'Топ-{top_n} устройств по суммарному отклонению (±{sigma_threshold}σ)',
+            x_title='Устройство', y_title='Суммарное отклонение (кВт·ч)'
+        )
+
+    # === РАЗДЕЛ 4: АНАЛИЗ ВЫКЛЮЧЕННОГО ОБОРУДОВАНИЯ ===
+    def _add_idle(self):
+        sheet = self.workbook.create_sheet('Простой')
+        idle_stats = self.idle_stats
+
+        self._header(sheet, ['Устройство', 'Часов выключено', 'Процент выключено'])
+        for device, row in idle_stats.iterrows():
+            self._append(sheet, [device, row['часов_выключено'], row['процент_выключено']])
+
+        rows = min(len(idle_stats), 10) + 1
+        self._add_chart(
+            sheet, BarChart(),
+            Reference(sheet, min_col=2, min_row=1, max_row=rows),
+            Reference(sheet, min_col=1, min_row=2, max_row=rows),
+            anchor_column=5,
+            title='Топ-10 устройств по времени отключения', x_title='Устройство', y_title='Часов отключено'
+        )
+
+    def _add_underutilization(self):
+        sheet = self.workbook.create_sheet('Недоиспользование')
+        row_number = 0
+        best_rows: List[int] = []
+
+        # Таблицы методов идут блоками друг под другом
+        for method, result in self.underutilization.items():
+            stats, thresh = result['stats'], result['threshold']
+
+            self._header(sheet, [f'Метод: {method}'])
+            self._header(sheet, ['Устройство', 'Часов недоиспользования', 'Процент недоиспользования', 'Порог'])
+            row_number += 2
+            first_row = row_number + 1
+            for device, row in stats.iterrows():
+                threshold = thresh[device] if isinstance(thresh, pd.Series) else None
+                self._append(sheet, [device, row['часов_недоиспользования'], row['процент_недоиспользования'],
+                                     threshold])
+                row_number += 1
+            if method == self.params['best_method']:
+                best_rows = [first_row - 1, min(row_number, first_row + 9)]
+            sheet.append([])
+            row_number += 1
+
+        if best_rows:
+            self._add_chart(
+                sheet, BarChart(),
+                Reference(sheet, min_col=2, min_row=best_rows[0], max_row=best_rows[1]),
+                Reference(sheet, min_col=1, min_row=best_rows[0] + 1, max_row=best_rows[1]),
+                anchor_column=6,
+                title=f'Топ-10 недоиспользуемых устройств (метод {self.params["best_method"]})',
+                x_title='Устройство', y_title='Часов недоиспользования'
+            )
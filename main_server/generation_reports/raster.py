@@ -0,0 +1,222 @@
+import io
+import os
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Легковесная отрисовка простых графиков (линия, скользящее среднее, точки)
+# напрямую в изображение Pillow из массивов NumPy, без накладных расходов
+# matplotlib на каждый элемент графика. Подходит для миниатюр, где не нужно
+# полное оформление осей и легенд.
+
+Color = Tuple[int, int, int]
+
+SERIES_COLOR: Color = (110, 150, 225)
+OVERLAY_COLOR: Color = (220, 30, 30)
+POINTS_COLOR: Color = (220, 30, 30)
+GRID_COLOR: Color = (225, 225, 225)
+FRAME_COLOR: Color = (90, 90, 90)
+TEXT_COLOR: Color = (20, 20, 20)
+
+# Отрисовка идет в увеличенном масштабе и затем уменьшается со сглаживанием
+SUPERSAMPLING = 2
+
+
+@lru_cache(maxsize=8)
+def _font(size: int) -> ImageFont.ImageFont:
+    """Шрифт с кириллицей: DejaVu Sans из поставки matplotlib, иначе встроенный шрифт Pillow"""
+    try:
+        import matplotlib
+        path = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf')
+        return ImageFont.truetype(path, size)
+    except (ImportError, OSError):
+        return ImageFont.load_default()
+
+
+def _to_float(x) -> np.ndarray:
+    """Значения оси X (числа или даты) в float"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype('int64').astype('float64')
+    return x.astype('float64')
+
+
+def _envelope(px: np.ndarray, py: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Прореживание линии до разрешения изображения.
+
+    Для каждого столбца пикселей остаются первая, минимальная, максимальная
+    и последняя точки, поэтому форма линии и выбросы не теряются.
+    """
+    columns = np.round(px).astype('int64')
+    if columns.size <= 2 or np.unique(columns).size * 4 >= columns.size:
+        return px, py
+
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], columns.size] - 1
+    y_min = np.minimum.reduceat(py, starts)
+    y_max = np.maximum.reduceat(py, starts)
+
+    x = np.repeat(columns[starts].astype('float64'), 4)
+    y = np.column_stack([py[starts], y_min, y_max, py[ends]]).ravel()
+    return x, y
+
+
+class Panel:
+    """Один график сетки: основная линия, линия поверх нее и отмеченные точки"""
+
+    def __init__(
+            self,
+            title: str,
+            x,
+            y,
+            overlay=None,
+            points_x=None,
+            points_y=None
+    ):
+        """
+        Args:
+            title: Заголовок (может содержать перевод строки)
+            x: Значения оси X (числа или datetime64)
+            y: Значения основной линии
+            overlay: Значения второй линии на той же оси X (например, скользящее среднее)
+            points_x: X отмеченных точек (например, аномалий)
+            points_y: Y отмеченных точек
+        """
+        self.title = title
+        self.x_is_datetime = np.issubdtype(np.asarray(x).dtype, np.datetime64)
+        self.x = _to_float(x)
+        self.y = np.asarray(y, dtype='float64')
+        self.overlay = None if overlay is None else np.asarray(overlay, dtype='float64')
+        self.points_x = None if points_x is None else _to_float(points_x)
+        self.points_y = None if points_y is None else np.asarray(points_y, dtype='float64')
+
+
+def render_small_multiples(
+        panels: Sequence[Panel],
+        columns: int = 2,
+        panel_size: Tuple[int, int] = (700, 260),
+        dpi: int = 200,
+        line_width: int = 1,
+        point_radius: int = 2
+) -> bytes:
+    """
+    Рисует сетку небольших графиков и возвращает PNG
+
+    Args:
+        panels: Графики в порядке заполнения сетки по строкам
+        columns: Количество графиков в строке
+        panel_size: Размер одного графика в пикселях (ширина, высота)
+        dpi: Разрешение, записываемое в PNG (влияет на размер при вставке в документ)
+        line_width: Толщина линий в пикселях
+        point_radius: Радиус отмеченных точек в пикселях
+
+    Returns:
+        bytes: Изображение в формате PNG
+    """
+    rows = max(1, -(-len(panels) // columns))
+    width, height = panel_size[0] * columns, panel_size[1] * rows
+    scale = SUPERSAMPLING
+
+    image = Image.new('RGB', (width * scale, height * scale), 'white')
+    draw = ImageDraw.Draw(image)
+
+    for i, panel in enumerate(panels):
+        left = (i % columns) * panel_size[0] * scale
+        top = (i // columns) * panel_size[1] * scale
+        _draw_panel(draw, panel, (left, top, panel_size[0] * scale, panel_size[1] * scale),
+                    scale, line_width * scale, point_radius * scale)
+
+    image = image.resize((width, height), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format='PNG', dpi=(dpi, dpi), optimize=False)
+    return output.getvalue()
+
+
+def _draw_panel(draw: ImageDraw.ImageDraw, panel: Panel, box: Tuple[int, int, int, int],
+                scale: int, line_width: int, point_radius: int) -> None:
+    left, top, width, height = box
+    title_font = _font(11 * scale)
+    tick_font = _font(8 * scale)
+
+    title_lines = panel.title.count('\n') + 1
+    plot_left = left + 48 * scale
+    plot_right = left + width - 10 * scale
+    plot_top = top + (8 + 14 * title_lines) * scale
+    plot_bottom = top + height - 20 * scale
+
+    draw.multiline_text(((plot_left + plot_right) / 2, top + 4 * scale), panel.title, fill=TEXT_COLOR,
+                        font=title_font, anchor='ma', align='center')
+
+    finite = np.isfinite(panel.x) & np.isfinite(panel.y)
+    x, y = panel.x[finite], panel.y[finite]
+    if x.size == 0:
+        draw.rectangle((plot_left, plot_top, plot_right, plot_bottom), outline=FRAME_COLOR, width=scale)
+        return
+
+    x_min, x_max = x.min(), x.max()
+    y_values = [y]
+    if panel.overlay is not None:
+        y_values.append(panel.overlay[np.isfinite(panel.overlay)])
+    if panel.points_y is not None:
+        y_values.append(panel.points_y[np.isfinite(panel.points_y)])
+    all_y = np.concatenate(y_values)
+    y_min, y_max = all_y.min(), all_y.max()
+    if x_max == x_min:
+        x_max = x_min + 1
+    if y_max == y_min:
+        y_min, y_max = y_min - 1, y_max + 1
+    padding = (y_max - y_min) * 0.05
+    y_min, y_max = y_min - padding, y_max + padding
+
+    def to_pixels(xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        px = plot_left + (xs - x_min) / (x_max - x_min) * (plot_right - plot_left)
+        py = plot_bottom - (ys - y_min) / (y_max - y_min) * (plot_bottom - plot_top)
+        return px, py
+
+    # Сетка и подписи оси Y
+    for value in np.linspace(y_min + padding, y_max - padding, 4):
+        _, gy = to_pixels(np.array([x_min]), np.array([value]))
+        draw.line((plot_left, gy[0], plot_right, gy[0]), fill=GRID_COLOR, width=scale)
+        draw.text((plot_left - 4 * scale, gy[0]), _format_tick(value), fill=TEXT_COLOR, font=tick_font, anchor='rm')
+
+    _draw_line(draw, *to_pixels(x, y), SERIES_COLOR, line_width)
+    if panel.overlay is not None:
+        overlay_finite = finite & np.isfinite(panel.overlay)
+        _draw_line(draw, *to_pixels(panel.x[overlay_finite], panel.overlay[overlay_finite]),
+                   OVERLAY_COLOR, line_width)
+    if panel.points_x is not None and panel.points_x.size:
+        px, py = to_pixels(panel.points_x, panel.points_y)
+        for cx, cy in zip(px, py):
+            draw.ellipse((cx - point_radius, cy - point_radius, cx + point_radius, cy + point_radius),
+                         fill=POINTS_COLOR)
+
+    draw.rectangle((plot_left, plot_top, plot_right, plot_bottom), outline=FRAME_COLOR, width=scale)
+
+    # Подписи начала и конца оси X
+    for value, anchor, position in ((x_min, 'la', plot_left), (x_max, 'ra', plot_right)):
+        draw.text((position, plot_bottom + 4 * scale), _format_x(value, panel), fill=TEXT_COLOR,
+                  font=tick_font, anchor=anchor)
+
+
+def _draw_line(draw: ImageDraw.ImageDraw, px: np.ndarray, py: np.ndarray, color: Color, width: int) -> None:
+    if px.size < 2:
+        return
+    px, py = _envelope(px, py)
+    draw.line(list(zip(px.tolist(), py.tolist())), fill=color, width=width)
+
+
+def _format_tick(value: float) -> str:
+    if abs(value) >= 1000:
+        return f"{value:,.0f}".replace(',', ' ')
+    if abs(value) >= 10:
+        return f"{value:.0f}"
+    return f"{value:.2f}"
+
+
+def _format_x(value: float, panel: Panel) -> str:
+    if panel.x_is_datetime:
+        return np.datetime64(int(value), 'ns').astype('datetime64[D]').item().strftime('%d.%m.%Y')
+    return f"{value:g}"
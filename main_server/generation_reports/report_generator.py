@@ -0,0 +1,665 @@
+import io
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from docx.shared import Mm
+from docxtpl import DocxTemplate, InlineImage
+
+from main_server.generation_reports.aggregates import DatasetAggregates
+from main_server.generation_reports.analysis import (ReportAnalysis, build_aggregates, analysis_params,
+                                                     underutilization_methods, QUALITY_PROFILES)
+from main_server.generation_reports.dataset import dataset_fingerprint, open_source
+from main_server.generation_reports.excel_report import ExcelReportGenerator
+from main_server.generation_reports.raster import Panel, render_small_multiples
+from main_server.generation_reports.shared_dataset import SharedDataset, as_frame
+from main_server.generation_reports.section_cache import (PngImage, section_key, dump_fragment, load_fragment,
+                                                          get_section_cache)
+from main_server.generation_reports.template_cache import CachedDocxTemplate
+
+# Кэшируемые разделы отчета docx в порядке построения
+SECTIONS = ('overview', 'temporal_patterns', 'anomalies', 'idle', 'underutilization')
+# Часы недоиспользования по методам во фрагменте раздела недоиспользования (в шаблон не попадают):
+# сводки по устройствам берут их из фрагмента и не зависят от того, взят ли он из кэша
+UNDERUTILIZATION_HOURS_KEY = '_underutilization_hours'
+
+
+def section_params(section: str, quality: str, params: Optional[Dict[str, Any]] = None,
+                   categories: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Параметры, от которых зависит содержимое раздела (часть ключа кэша)
+
+    Args:
+        section: Название раздела из SECTIONS
+        quality: Уровень качества отчета
+        params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+        categories: Категории устройств из реестра: {столбец: категория}
+    """
+    profile = QUALITY_PROFILES[quality]
+    params = analysis_params(params)
+    result = {'dpi': profile['dpi']}
+    if section == 'overview' and categories:
+        # Переназначение категории в реестре меняет только общий раздел
+        result.update(categories=dict(sorted(categories.items())))
+    elif section == 'anomalies':
+        result.update(sigma_threshold=params['sigma_threshold'], window_size=params['window_size'],
+                      top_n=params['top_n'], max_plot_points=profile['max_plot_points'],
+                      miniatures=profile['miniatures'])
+    elif section == 'underutilization':
+        result.update(methods={method: params.get(method) for method in underutilization_methods(quality, params)},
+                      best_method=params['best_method'], max_plot_points=profile['max_plot_points'])
+    return result
+
+
+def section_keys(dataset_hash: str, quality: str, params: Optional[Dict[str, Any]] = None,
+                 categories: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Ключи кэша всех разделов отчета: {раздел: ключ}"""
+    return {
+        section: section_key(dataset_hash, section, section_params(section, quality, params, categories))
+        for section in SECTIONS
+    }
+
+
+def bind_images(value, doc: DocxTemplate):
+    """Заменяет PngImage во фрагментах контекста на InlineImage документа"""
+    if isinstance(value, PngImage):
+        return InlineImage(doc, io.BytesIO(value.data), width=Mm(150))
+    if isinstance(value, dict):
+        return {key: bind_images(item, doc) for key, item in value.items()}
+    if isinstance(value, list):
+        return [bind_images(item, doc) for item in value]
+    return value
+
+
+def generate_report_content(
+        data_numeric: pd.DataFrame,
+        template_data: Union[bytes, str],
+        aggregates: Optional[DatasetAggregates] = None,
+        quality: str = "full",
+        deadline: Optional[float] = None,
+        params: Optional[Dict[str, Any]] = None,
+        categories: Optional[Dict[str, str]] = None
+) -> bytes:
+    """
+    Генерирует отчет на основе показаний счетчиков и шаблона Word
+
+    Args:
+        data_numeric: Показания по устройствам, индексированные по дате и времени
+        template_data: Бинарные данные шаблона Word или путь к нему
+        aggregates: Готовые агрегаты этого набора данных (например, дополненные
+                    инкрементально); если не переданы, считаются по data_numeric
+        quality: Уровень качества: "draft" или "full"
+        deadline: Время (time.time()), после которого генерация прерывается TimeoutError
+        params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+        categories: Категории устройств из реестра: {столбец: категория} (опционально)
+
+    Returns:
+        bytes: Бинарные данные сгенерированного отчета
+    """
+    return ReportGenerator(data_numeric, template_data, aggregates, quality, deadline, params=params,
+                           categories=categories).render()
+
+
+def build_report(
+        data_numeric: Union[pd.DataFrame, SharedDataset],
+        template_data: Optional[Union[bytes, str]],
+        previous_aggregates: Optional[DatasetAggregates] = None,
+        output_format: str = "docx",
+        quality: str = "full",
+        deadline: Optional[float] = None,
+        dataset_hash: Optional[str] = None,
+        stored_fragments: Optional[Dict[str, bytes]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        categories: Optional[Dict[str, str]] = None
+) -> Tuple[bytes, DatasetAggregates, Dict[str, bytes], List[Dict[str, Any]]]:
+    """
+    Считает агрегаты и генерирует отчет; точка входа для процессов пула
+
+    Args:
+        data_numeric: Показания по устройствам или их описание в общих файлах (SharedDataset)
+        template_data: Бинарные данные шаблона Word или путь к нему (для xlsx не используется)
+        previous_aggregates: Агрегаты ранее загруженного префикса данных (опционально)
+        output_format: Формат отчета: "docx" или "xlsx"
+        quality: Уровень качества: "draft" или "full"
+        deadline: Время (time.time()), после которого генерация прерывается TimeoutError
+        dataset_hash: Хэш набора данных для ключей кэша разделов (по умолчанию считается здесь)
+        stored_fragments: Фрагменты разделов, загруженные из хранилища: {ключ: данные}
+        params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+        categories: Категории устройств из реестра: {столбец: категория}; устройства
+                    без категории классифицируются по CATEGORY_RULES
+
+    Returns:
+        Бинарные данные отчета, агрегаты набора данных, новые фрагменты разделов
+        для сохранения в хранилище и сводки по устройствам (ReportAnalysis.device_summaries)
+    """
+    data_numeric = as_frame(data_numeric)
+    resolved = analysis_params(params)
+    aggregates = build_aggregates(data_numeric, previous_aggregates, resolved['window_size'],
+                                  resolved['sigma_threshold'])
+    if output_format == "xlsx":
+        generator = ExcelReportGenerator(data_numeric, aggregates, quality, deadline, params, categories)
+        return generator.render(), aggregates, {}, generator.device_summaries()
+    if template_data is None:
+        raise ValueError("Template is required for docx reports")
+    generator = ReportGenerator(data_numeric, template_data, aggregates, quality, deadline, dataset_hash,
+                                stored_fragments, params, categories)
+    return generator.render(), aggregates, generator.new_fragments, generator.device_summaries()
+
+
+def validate_template(template_data: Union[bytes, str]) -> List[str]:
+    """
+    Проверяет, что шаблон открывается как docx-шаблон
+
+    Args:
+        template_data: Бинарные данные шаблона или путь к нему
+
+    Returns:
+        Переменные шаблона, которые заполняются при генерации
+
+    Raises:
+        ValueError: Если шаблон не удается разобрать
+    """
+    try:
+        return sorted(CachedDocxTemplate(open_source(template_data)).get_undeclared_template_variables())
+    except Exception as e:
+        raise ValueError(f"Invalid report template: {e}")
+
+
+class ReportGenerator(ReportAnalysis):
+    """
+    Строит контекст шаблона по разделам отчета и рендерит docx.
+
+    Каждый раздел возвращает фрагмент контекста (изображения - PngImage), фрагменты
+    кэшируются по ключу (хэш данных, раздел, параметры раздела, версия генератора):
+    в памяти процесса и, через сервис отчетов, в хранилище. Поэтому при смене
+    шаблона или параметров одного раздела остальные разделы не перестраиваются.
+    """
+
+    def __init__(
+            self,
+            data_numeric: pd.DataFrame,
+            template_data: Union[bytes, str],
+            aggregates: Optional[DatasetAggregates] = None,
+            quality: str = 'full',
+            deadline: Optional[float] = None,
+            dataset_hash: Optional[str] = None,
+            stored_fragments: Optional[Dict[str, bytes]] = None,
+            params: Optional[Dict[str, Any]] = None,
+            categories: Optional[Dict[str, str]] = None
+    ):
+        super().__init__(data_numeric, aggregates, quality, deadline, params, categories)
+
+        # Загружаем шаблон Word; разбор его разметки переиспользуется в процессе (см. CachedDocxTemplate)
+        self.doc = CachedDocxTemplate(open_source(template_data))
+        self.context = {}
+
+        self.dataset_hash = dataset_hash or dataset_fingerprint(data_numeric)
+        self.stored_fragments = stored_fragments or {}
+        # Фрагменты, построенные при этом рендеринге: {ключ: данные}
+        self.new_fragments: Dict[str, bytes] = {}
+        # Часы недоиспользования из фрагмента раздела (см. UNDERUTILIZATION_HOURS_KEY)
+        self._fragment_underutilization_hours: Optional[Dict[str, Dict[str, float]]] = None
+
+    def render(self) -> bytes:
+        builders = {
+            'overview': self._add_overview,
+            'temporal_patterns': self._add_temporal_patterns,
+            'anomalies': self._add_anomalies,
+            'idle': self._add_idle,
+            'underutilization': self._add_underutilization,
+        }
+        for section, key in section_keys(self.dataset_hash, self.quality, self.params, self.categories).items():
+            fragment = self._section_fragment(key, builders[section])
+            if section == 'underutilization':
+                self._fragment_underutilization_hours = fragment.pop(UNDERUTILIZATION_HOURS_KEY)
+            self.context.update(fragment)
+        self.context.update(self._add_conclusions())
+
+        # Рендеринг шаблона
+        self.doc.render(bind_images(self.context, self.doc))
+
+        # Сохранение документа в байтовый поток
+        output = io.BytesIO()
+        self.doc.save(output)
+        output.seek(0)
+
+        return output.getvalue()
+
+    def _section_fragment(self, key: str, build) -> Dict[str, Any]:
+        """Фрагмент раздела из кэша процесса, из хранилища или построенный заново"""
+        cache = get_section_cache()
+        data = cache.get(key) or self.stored_fragments.get(key)
+        if data is None:
+            self._check_deadline()
+            try:
+                data = dump_fragment(build())
+            finally:
+                # Процесс пула переиспользуется: фигуры раздела (и прерванного по дедлайну) не копятся
+                plt.close('all')
+            self.new_fragments[key] = data
+        cache.put(key, data)
+        return load_fragment(data)
+
+    def underutilization_hours(self) -> Dict[str, Dict[str, float]]:
+        """Часы недоиспользования из фрагмента раздела, если он уже получен, иначе рассчитанные"""
+        if self._fragment_underutilization_hours is not None:
+            return self._fragment_underutilization_hours
+        return super().underutilization_hours()
+
+    def _figure_image(self, **savefig_kwargs) -> PngImage:
+        """Сохраняет текущую фигуру matplotlib в PNG и закрывает ее"""
+        # Сохранение - самая долгая часть графика: после дедлайна фигура не рендерится
+        self._check_deadline()
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=self.profile['dpi'], **savefig_kwargs)
+        plt.close()
+        return PngImage(buf.getvalue())
+
+    def _plot_points(self, *series: pd.Series) -> List[pd.Series]:
+        """Прореживает временные ряды для графика до max_plot_points уровня качества"""
+        max_points = self.profile['max_plot_points']
+        if max_points is None or len(series[0]) <= max_points:
+            return list(series)
+        step = -(-len(series[0]) // max_points)
+        return [s.iloc[::step] for s in series]
+
+    # === РАЗДЕЛ 1: ОБЩИЙ АНАЛИЗ ПОТРЕБЛЕНИЯ ===
+    def _add_overview(self) -> Dict[str, Any]:
+        context = {}
+        daily_data = self.daily_data
+
+        # Добавляем базовую информацию в контекст
+        start_date = daily_data.index.min().strftime('%d.%m.%Y')
+        end_date = daily_data.index.max().strftime('%d.%m.%Y')
+        context['start_date'] = start_date
+        context['end_date'] = end_date
+        context['report_title'] = f'Отчет о потреблении электроэнергии за период с {start_date} по {end_date}'
+
+        # График 1: Все устройства
+        plt.figure(figsize=(14, 8))
+        for column in daily_data.columns:
+            self._check_deadline()
+            plt.plot(daily_data.index, daily_data[column], label=column)
+
+        plt.title('Суточное потребление электроэнергии (все устройства)')
+        plt.xlabel('Дата')
+        plt.ylabel('Потребление (кВт·ч)')
+        plt.grid(True)
+        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+        plt.subplots_adjust(right=0.75)
+
+        context['graph_all_devices'] = self._figure_image()
+        context['graph1_caption'] = 'Рисунок 1. Суточное потребление всех устройств.'
+
+        # График 2: Топ-10 потребителей
+        plt.figure(figsize=(12, 5))
+        for column in self.top10:
+            plt.plot(daily_data.index, daily_data[column], label=column)
+
+        plt.title('Суточное потребление: Топ-10 устройств')
+        plt.xlabel('Дата')
+        plt.ylabel('Потребление (кВт·ч)')
+        plt.grid(True)
+        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+        plt.subplots_adjust(right=0.75)
+
+        context['graph_top10'] = self._figure_image()
+        context['graph2_caption'] = 'Рисунок 2. Топ-10 потребителей электроэнергии.'
+
+        # Данные для таблицы топ-10 потребителей
+        top10_data = []
+        for name, value in self.total_consumption.head(10).items():
+            top10_data.append({'device': name, 'consumption': f"{value:.2f}"})
+        context['top10_consumers'] = top10_data
+
+        # Автоматическая агрегация по категориям
+        meter_categories = self.meter_categories
+        category_data = self.category_data
+
+        # Строим график категорий
+        plt.figure(figsize=(12, 6))
+        for column in category_data.columns:
+            plt.plot(category_data.index, category_data[column], label=column)
+
+        plt.title('Суточное потребление по автоматически определенным категориям оборудования')
+        plt.xlabel('Дата')
+        plt.ylabel('Потребление (кВт·ч)')
+        plt.grid(True)
+        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+
+        context['graph_categories'] = self._figure_image(bbox_inches='tight')
+        context['graph3_caption'] = 'Рисунок 3. Суммарное потребление по категориям оборудования.'
+
+        # Добавляем информацию о категориях
+        categories_info = []
+        for category, cols in meter_categories.items():
+            categories_info.append({'category': category, 'count': len(cols)})
+        context['categories_info'] = categories_info
+        return context
+
+    # === РАЗДЕЛ 2: АНАЛИЗ ВРЕМЕННЫХ ЗАКОНОМЕРНОСТЕЙ ===
+    def _add_temporal_patterns(self) -> Dict[str, Any]:
+        context = {}
+        daily_data = self.daily_data
+
+        # Суточные колебания (анализ по часам)
+        typical_day = self.typical_day
+
+        plt.figure(figsize=(14, 7))
+        for column in self.top10:
+            plt.plot(typical_day.index, typical_day[column], label=column)
+
+        plt.title('Среднее потребление по часам суток (Топ-10 устройств)')
+        plt.xlabel('Час дня')
+        plt.ylabel('Среднее потребление (кВт·ч)')
+        plt.xticks(np.arange(0, 24, 1))
+        plt.grid(True)
+        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+
+        context['graph_hourly'] = self._figure_image()
+        context['graph4_caption'] = 'Рисунок 4. Среднее потребление по часам суток для топ-10 устройств.'
+
+        # Анализ пикового потребления
+        peak_hours = typical_day.sum(axis=1)
+        peak_hour = peak_hours.idxmax()
+        context['peak_hour'] = peak_hour
+        context['peak_hour_next'] = peak_hour + 1
+        context['peak_consumption'] = f"{peak_hours.max():.2f}"
+
+        # Полнота данных: неполные дни и разрывы в ряду отметок времени
+        days_status = self.days_status
+        data_gaps = self.data_gaps
+        context['incomplete_days_count'] = int((~days_status['полный']).sum())
+        context['missing_intervals'] = int(data_gaps['пропущено_интервалов'].sum())
+        context['data_gaps'] = [
+            {
+                'start': gap['начало'].strftime('%d.%m.%Y %H:%M'),
+                'end': gap['конец'].strftime('%d.%m.%Y %H:%M'),
+                'missing': int(gap['пропущено_интервалов'])
+            }
+            for _, gap in data_gaps.nlargest(10, 'пропущено_интервалов').iterrows()
+        ]
+
+        # График полных и неполных дней
+        if len(daily_data) >= 2:
+            daily_total = daily_data.sum(axis=1)
+            full = days_status['полный']
+
+            combined = pd.DataFrame(index=daily_total.index)
+            combined['Полные дни'] = daily_total.where(full)
+            combined['Неполные дни'] = daily_total.where(~full)
+
+            combined.index = combined.index.strftime('%Y-%m-%d')
+
+            plt.figure(figsize=(14, 8))
+            combined.plot(kind='bar', stacked=False, color=['green', 'red'])
+
+            plt.title('Суммарное потребление электроэнергии по дням')
+            plt.xlabel('Дата')
+            plt.ylabel('Потребление (кВт·ч)')
+            plt.xticks(rotation=45)
+            plt.grid(True)
+            plt.tight_layout()
+
+            context['graph_daily'] = self._figure_image()
+            context['graph5_caption'] = 'Рисунок 5. Суммарное потребление по дням.'
+        return context
+
+    # === РАЗДЕЛ 3: АНАЛИЗ АНОМАЛИЙ ПОТРЕБЛЕНИЯ ===
+    def _add_anomalies(self) -> Dict[str, Any]:
+        context = {}
+        data_numeric = self.data_numeric
+        sigma_threshold = self.params['sigma_threshold']
+        window_size = self.params['window_size']
+        top_n = self.params['top_n']
+
+        context['sigma_threshold'] = sigma_threshold
+        context['window_size'] = window_size
+        context['top_n'] = top_n
+
+        # Таблица с результатами по аномалиям
+        anomalies_df = self.anomalies_df
+        if anomalies_df.empty:
+            context['has_anomalies'] = False
+            return context
+
+        top_anomalies = anomalies_df.head(top_n)
+
+        # Подготавливаем данные для шаблона
+        anomalies_data = []
+        for _, row in top_anomalies.iterrows():
+            anomalies_data.append({
+                'device': row['Устройство'],
+                'count': row['Кол-во аномалий'],
+                'max_dev': f"{row['Макс. отклонение (кВт·ч)']:.2f}",
+                'mean_dev': f"{row['Среднее отклонение (кВт·ч)']:.2f}",
+                'total_dev': f"{row['Суммарное отклонение (кВт·ч)']:.2f}"
+            })
+        context['anomalies_data'] = anomalies_data
+        context['has_anomalies'] = True
+
+        # Визуализация для топ-3 счетчиков с аномалиями
+        anomalies_graphs = []
+        for i, (_, row) in enumerate(top_anomalies.head(3).iterrows(), 1):
+            self._check_deadline()
+            device = row['Устройство']
+            device_data = data_numeric[device].dropna()
+
+            rolling_mean = device_data.rolling(window=window_size).mean()
+            rolling_std = device_data.rolling(window=window_size).std()
+            anomalies = device_data[(device_data > rolling_mean + sigma_threshold * rolling_std) |
+                                    (device_data < rolling_mean - sigma_threshold * rolling_std)]
+            # Аномалии найдены по полному ряду, прореживаются только линии графика
+            device_data, rolling_mean, rolling_std = self._plot_points(device_data, rolling_mean, rolling_std)
+
+            plt.figure(figsize=(14, 4))
+            plt.plot(device_data.index, device_data, label='Потребление', color='blue', alpha=0.6)
+            plt.plot(rolling_mean.index, rolling_mean, label='Скользящее среднее', color='red')
+            plt.scatter(anomalies.index, anomalies, color='red', s=20, label='Аномалии')
+            plt.fill_between(rolling_mean.index,
+                             rolling_mean - sigma_threshold * rolling_std,
+                             rolling_mean + sigma_threshold * rolling_std,
+                             color='gray', alpha=0.2, label=f'±{sigma_threshold}σ')
+            plt.title(f'Аномалии потребления для {device}')
+            plt.xlabel('Дата и время')
+            plt.ylabel('Потребление (кВт·ч)')
+            plt.legend()
+            plt.grid(True)
+
+            anomalies_graphs.append({
+                'image': self._figure_image(bbox_inches='tight'),
+                'device': device,
+                'position': i,
+                'caption': f'Рисунок {6 + i - 1}. Аномалии потребления для {device} (топ-{i}).'
+            })
+        context['anomalies_graphs'] = anomalies_graphs
+
+        # Миниатюры для топ-10 счетчиков с аномалиями
+        if self.profile['miniatures']:
+            context.update(self._add_anomalies_miniatures(top_anomalies))
+
+        # Выводы по аномалиям
+        top3_anomalies = []
+        for i, (_, row) in enumerate(top_anomalies.head(3).iterrows(), 1):
+            top3_anomalies.append({
+                'position': i,
+                'device': row['Устройство'],
+                'count': row['Кол-во аномалий'],
+                'max_dev': f"{row['Макс. отклонение (кВт·ч)']:.2f}",
+                'total_dev': f"{row['Суммарное отклонение (кВт·ч)']:.2f}"
+            })
+        context['top3_anomalies'] = top3_anomalies
+        return context
+
+    def _add_anomalies_miniatures(self, top_anomalies: pd.DataFrame) -> Dict[str, Any]:
+        """Миниатюры для топ-N счетчиков с аномалиями (легковесная отрисовка без matplotlib)"""
+        sigma_threshold = self.params['sigma_threshold']
+        window_size = self.params['window_size']
+        panels = []
+        for _, row in top_anomalies.iterrows():
+            self._check_deadline()
+            device = row['Устройство']
+            device_data = self.data_numeric[device].dropna()
+            rolling_mean = device_data.rolling(window=window_size).mean()
+            rolling_std = device_data.rolling(window=window_size).std()
+            anomalies = device_data[(device_data > rolling_mean + sigma_threshold * rolling_std) |
+                                    (device_data < rolling_mean - sigma_threshold * rolling_std)]
+            panels.append(Panel(
+                f"{device}\nАномалий: {row['Кол-во аномалий']}",
+                device_data.index, device_data.to_numpy(),
+                overlay=rolling_mean.to_numpy(),
+                points_x=anomalies.index, points_y=anomalies.to_numpy()
+            ))
+
+        return {
+            'anomalies_miniatures': PngImage(render_small_multiples(panels, columns=2)),
+            'anomalies_miniatures_caption': f'Рисунок {6 + 3}. Аномалии потребления для топ-{self.params["top_n"]} счетчиков.'
+        }
+
+    # === РАЗДЕЛ 4: АНАЛИЗ ВЫКЛЮЧЕННОГО ОБОРУДОВАНИЯ ===
+    def _add_idle(self) -> Dict[str, Any]:
+        context = {}
+
+        # 4.1 Статистика выключенного оборудования (значение = 0)
+        idle_stats = self.idle_stats
+
+        # Данные для таблицы топ-15 устройств по времени отключения
+        idle_devices = []
+        for device, row in idle_stats.head(15).iterrows():
+            idle_devices.append({
+                'device': device,
+                'hours': f"{row['часов_выключено']:.2f}",
+                'percentage': f"{row['процент_выключено']:.1f}"
+            })
+        context['idle_devices'] = idle_devices
+
+        # График времени отключения топ-10
+        plt.figure(figsize=(12, 6))
+        idle_top10 = idle_stats.head(10)
+        plt.bar(idle_top10.index, idle_top10['часов_выключено'], color='skyblue')
+        plt.title('Топ-10 устройств по времени отключения')
+        plt.xlabel('Устройство')
+        plt.ylabel('Часов отключено')
+        plt.xticks(rotation=45, ha='right')
+        plt.grid(axis='y', linestyle='--', alpha=0.7)
+        plt.tight_layout()
+
+        context['graph_idle'] = self._figure_image(bbox_inches='tight')
+        context['graph_idle_caption'] = 'Рисунок 10. Топ-10 устройств по времени отключения.'
+        return context
+
+    # === 4.2. НЕДОИСПОЛЬЗОВАНИЕ ОБОРУДОВАНИЯ ===
+    def _add_underutilization(self) -> Dict[str, Any]:
+        context = {}
+        data_numeric = self.data_numeric
+
+        # Применяем разные методы
+        results = self.underutilization
+        methods_data = []
+
+        for m, result in results.items():
+            stats, thresh = result['stats'], result['threshold']
+
+            # Подготовка данных для шаблона
+            method_top5 = []
+            for device, row in stats.head(5).iterrows():
+                method_top5.append({
+                    'device': device,
+                    'hours': f"{row['часов_недоиспользования']:.2f}",
+                    'percentage': f"{row['процент_недоиспользования']:.1f}"
+                })
+
+            method_info = {
+                'name': m,
+                'top5': method_top5,
+                'has_threshold': thresh is not None,
+                'is_series': isinstance(thresh, pd.Series) if thresh is not None else False
+            }
+            methods_data.append(method_info)
+
+        context['methods_data'] = methods_data
+        context[UNDERUTILIZATION_HOURS_KEY] = super().underutilization_hours()
+
+        # Выбираем "наилучший" метод для визуализации
+        best_method = self.params['best_method']
+        underutil_stats = results[best_method]['stats']
+
+        # График недоиспользования для топ-10 устройств по выбранному методу
+        plt.figure(figsize=(12, 6))
+        underutil_top10 = underutil_stats.head(10)
+        plt.bar(underutil_top10.index, underutil_top10['часов_недоиспользования'], color='salmon')
+        plt.title(f'Топ-10 недоиспользуемых устройств (метод {best_method})')
+        plt.xlabel('Устройство')
+        plt.ylabel('Часов недоиспользования')
+        plt.xticks(rotation=45, ha='right')
+        plt.grid(axis='y', linestyle='--', alpha=0.7)
+        plt.tight_layout()
+
+        context['graph_underutil'] = self._figure_image(bbox_inches='tight')
+        context['graph_underutil_caption'] = f'Рисунок 11. Топ-10 устройств по недоиспользованию (метод {best_method}).'
+        context['best_method'] = best_method
+
+        # Визуализация использования топ-3 недоиспользуемых устройств
+        top3_devices = underutil_stats.head(3).index
+        underutil_graphs = []
+
+        for i, device in enumerate(top3_devices, 1):
+            self._check_deadline()
+            device_data = data_numeric[device].dropna()
+
+            if best_method in ('fixed_pct', 'percentile', 'std_dev'):
+                threshold = results[best_method]['threshold'][device]
+            else:  # kmeans
+                threshold = None
+
+            if threshold is None:
+                continue
+
+            # Выделяем периоды недоиспользования
+            underutil_mask = device_data < threshold
+            underutil_points = device_data[underutil_mask]
+            device_data, = self._plot_points(device_data)
+
+            plt.figure(figsize=(14, 4))
+            plt.plot(device_data.index, device_data, label='Потребление', color='blue', alpha=0.7)
+            plt.axhline(y=threshold, color='red', linestyle='--', label=f'Порог недоиспользования')
+            plt.scatter(underutil_points.index, underutil_points, color='red', s=15, alpha=0.5)
+            plt.title(f'Анализ недоиспользования для {device}')
+            plt.xlabel('Дата и время')
+            plt.ylabel('Потребление (кВт·ч)')
+            plt.grid(True)
+            plt.legend()
+            plt.tight_layout()
+
+            underutil_graphs.append({
+                'image': self._figure_image(bbox_inches='tight'),
+                'caption': f'Рисунок {12 + i - 1}. Анализ недоиспользования для {device} (топ-{i}).',
+                'device': device,
+                'rank': i
+            })
+
+        context['underutil_graphs'] = underutil_graphs
+        context['top3_underutil_devices'] = list(top3_devices)
+        return context
+
+    # === РАЗДЕЛ 5: ВЫВОДЫ И РЕКОМЕНДАЦИИ ===
+    def _add_conclusions(self) -> Dict[str, Any]:
+        # Выводы строятся по агрегатам и готовым фрагментам, поэтому не кэшируются
+        context = {}
+
+        # Добавляем выводы в контекст
+        context['top3_consumers'] = list(self.total_consumption.head(3).index)
+        context['top3_idle_devices'] = list(self.idle_stats.head(3).index)
+        context['top3_underutil'] = self.context['top3_underutil_devices']
+
+        if not self.anomalies_df.empty:
+            context['has_significant_anomalies'] = True
+            context['top3_anomaly_devices'] = list(self.anomalies_df.head(3)['Устройство'])
+        else:
+            context['has_significant_anomalies'] = False
+        return context
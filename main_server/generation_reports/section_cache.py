@@ -0,0 +1,90 @@
+import hashlib
+import json
+import pickle
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from main_server.db.config import settings
+
+# Версия генератора разделов: увеличивается при любом изменении содержимого
+# фрагментов, чтобы не использовать фрагменты, построенные прежним кодом
+GENERATOR_VERSION = 3
+
+
+class PngImage:
+    """PNG-изображение во фрагменте раздела; в InlineImage превращается при рендеринге шаблона"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def section_key(dataset_hash: str, section: str, params: Dict[str, Any]) -> str:
+    """
+    Ключ кэша фрагмента раздела
+
+    Args:
+        dataset_hash: Хэш набора данных (dataset_fingerprint)
+        section: Название раздела
+        params: Параметры, от которых зависит содержимое раздела
+
+    Returns:
+        str: Хэш (набор данных, раздел, параметры, версия генератора)
+    """
+    payload = json.dumps([dataset_hash, section, params, GENERATOR_VERSION], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def dump_fragment(fragment: Dict[str, Any]) -> bytes:
+    """Сериализует фрагмент раздела для кэша"""
+    return pickle.dumps(fragment, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_fragment(data: bytes) -> Dict[str, Any]:
+    """Восстанавливает фрагмент, сохраненный через dump_fragment"""
+    return pickle.loads(data)
+
+
+class SectionCache:
+    """
+    LRU-кэш сериализованных фрагментов разделов в памяти процесса.
+
+    Суммарный размер фрагментов ограничен max_bytes: при превышении
+    вытесняются фрагменты, которые дольше всего не запрашивались.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        previous = self._items.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._items[key] = data
+        self.size += len(data)
+
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+_section_cache: Optional[SectionCache] = None
+
+
+def get_section_cache() -> SectionCache:
+    """Кэш фрагментов текущего процесса (у каждого процесса пула свой)"""
+    global _section_cache
+    if _section_cache is None:
+        _section_cache = SectionCache(settings.SECTION_CACHE_MEMORY_MB * 1024 * 1024)
+    return _section_cache
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from main_server.db.config import settings
+from main_server.generation_reports.dataset import read_dataset
+
+VALUES_FILE = 'values.npy'
+INDEX_FILE = 'index.npy'
+DIRECTORY_PREFIX = 'dataset-'
+
+
+def shared_datasets_dir() -> str:
+    """Каталог наборов данных, передаваемых между процессами"""
+    return os.path.join(settings.TEMP_FILES_DIR, 'datasets')
+
+
+class SharedDataset:
+    """
+    Набор данных в файлах NumPy под TEMP_FILES_DIR для передачи между процессами пула.
+
+    Между процессами передается только описание (путь к каталогу и имена столбцов),
+    а получатель открывает матрицу показаний через отображение в память: данные
+    не сериализуются, и все процессы читают одни и те же страницы.
+    Матрица хранится по столбцам (Fortran order), поэтому ряд каждого устройства непрерывен.
+    """
+
+    def __init__(self, path: str, columns: List[str], index_name: Optional[str] = None):
+        """
+        Args:
+            path: Каталог с файлами набора данных
+            columns: Имена столбцов (устройств)
+            index_name: Имя индекса отметок времени
+        """
+        self.path = path
+        self.columns = columns
+        self.index_name = index_name
+
+    @classmethod
+    def create(cls, data_numeric: pd.DataFrame, directory: Optional[str] = None) -> "SharedDataset":
+        """
+        Сохраняет показания в новый каталог; каталог удаляется через release()
+
+        Args:
+            data_numeric: Показания по устройствам (приводятся к float64)
+            directory: Родительский каталог (по умолчанию shared_datasets_dir())
+        """
+        directory = directory or shared_datasets_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=DIRECTORY_PREFIX, dir=directory)
+        try:
+            values = np.asfortranarray(data_numeric.to_numpy(dtype='float64'))
+            np.save(os.path.join(path, VALUES_FILE), values)
+            np.save(os.path.join(path, INDEX_FILE),
+                    data_numeric.index.to_numpy(dtype='datetime64[ns]').view('int64'))
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        return cls(path, list(data_numeric.columns), data_numeric.index.name)
+
+    def open(self) -> pd.DataFrame:
+        """Показания только для чтения, отображенные в память без копирования"""
+        values = np.load(os.path.join(self.path, VALUES_FILE), mmap_mode='r')
+        index = pd.DatetimeIndex(np.load(os.path.join(self.path, INDEX_FILE)).view('datetime64[ns]'),
+                                 name=self.index_name)
+        return pd.DataFrame(values, index=index, columns=self.columns, copy=False)
+
+    def release(self) -> None:
+        """
+        Удаляет файлы набора данных.
+
+        Уже открытые отображения остаются действительными до сборки мусора.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self) -> "SharedDataset":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+def as_frame(data: Union[pd.DataFrame, SharedDataset]) -> pd.DataFrame:
+    """DataFrame из показаний или из описания набора данных в общих файлах"""
+    if isinstance(data, SharedDataset):
+        return data.open()
+    return data
+
+
+def read_shared_dataset(excel_data: Union[bytes, str], sheet_name: Optional[str] = None) -> SharedDataset:
+    """
+    Разбирает выгрузку (см. read_dataset) и возвращает ее описание в общих файлах;
+    точка входа для процессов пула, вызывающий процесс освобождает набор через release()
+    """
+    return SharedDataset.create(read_dataset(excel_data, sheet_name))
+
+
+def cleanup_shared_datasets(max_age_seconds: float) -> None:
+    """
+    Удаляет каталоги наборов данных старше max_age_seconds
+
+    Каталог может остаться, если процесс завершился или запрос был прерван
+    по времени до вызова release().
+    """
+    directory = shared_datasets_dir()
+    if not os.path.isdir(directory):
+        return
+    expire_before = time.time() - max_age_seconds
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(DIRECTORY_PREFIX) and os.path.getmtime(path) < expire_before:
+            shutil.rmtree(path, ignore_errors=True)
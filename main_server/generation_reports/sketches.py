@@ -0,0 +1,149 @@
+import math
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Значения по модулю меньше этого порога считаются нулевыми
+_ZERO_EPSILON = 1e-12
+
+
+class _BucketStore:
+    """Разреженные счетчики логарифмических корзин: отсортированные ключи и количества"""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype='int64')
+        self.counts = np.empty(0, dtype='int64')
+
+    def add(self, keys: np.ndarray) -> None:
+        if keys.size == 0:
+            return
+        new_keys, new_counts = np.unique(keys, return_counts=True)
+        self.merge(new_keys, new_counts)
+
+    def merge(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        all_keys = np.concatenate([self.keys, keys])
+        all_counts = np.concatenate([self.counts, counts])
+        self.keys, inverse = np.unique(all_keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=all_counts).astype('int64')
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+
+class DeviceQuantileSketch:
+    """
+    Сливаемый квантильный скетч одного устройства с относительной погрешностью.
+
+    Значения раскладываются по логарифмическим корзинам с основанием
+    gamma = (1 + accuracy) / (1 - accuracy), поэтому любой квантиль
+    восстанавливается с относительной ошибкой не более accuracy,
+    а скетчи разных частей данных объединяются сложением счетчиков.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.positive = _BucketStore()
+        self.negative = _BucketStore()
+        self.zero_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> int:
+        return self.positive.total + self.negative.total + self.zero_count
+
+    def _keys(self, values: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(values) / self._log_gamma).astype('int64')
+
+    def _value(self, key: int) -> float:
+        # Середина корзины (gamma^(k-1), gamma^k] в смысле относительной ошибки
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def update(self, values: np.ndarray) -> None:
+        """Добавляет значения (NaN пропускаются)"""
+        values = np.asarray(values, dtype='float64')
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        zero = np.abs(values) < _ZERO_EPSILON
+        self.zero_count += int(zero.sum())
+        self.positive.add(self._keys(values[(values > 0) & ~zero]))
+        self.negative.add(self._keys(-values[(values < 0) & ~zero]))
+
+    def merge(self, other: "DeviceQuantileSketch") -> None:
+        """Объединяет скетч с другим скетчем той же точности"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        self.positive.merge(other.positive.keys, other.positive.counts)
+        self.negative.merge(other.negative.keys, other.negative.counts)
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Квантиль уровня q (0..1); NaN для пустого скетча"""
+        count = self.count
+        if count == 0:
+            return math.nan
+
+        rank = q * (count - 1)
+
+        # Отрицательные значения идут от больших по модулю к меньшим
+        negative_counts = np.cumsum(self.negative.counts[::-1])
+        if negative_counts.size and rank < negative_counts[-1]:
+            key = self.negative.keys[::-1][np.searchsorted(negative_counts, rank, side='right')]
+            return self._clamp(-self._value(key))
+        rank -= negative_counts[-1] if negative_counts.size else 0
+
+        if rank < self.zero_count:
+            return 0.0
+        rank -= self.zero_count
+
+        positive_counts = np.cumsum(self.positive.counts)
+        index = min(np.searchsorted(positive_counts, rank, side='right'), positive_counts.size - 1)
+        return self._clamp(self._value(self.positive.keys[index]))
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min), self.max)
+
+
+class QuantileSketch:
+    """Набор квантильных скетчей по устройствам"""
+
+    def __init__(self, columns: Sequence[str], relative_accuracy: float = 0.01):
+        self.columns = list(columns)
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[str, DeviceQuantileSketch] = {
+            column: DeviceQuantileSketch(relative_accuracy) for column in self.columns
+        }
+
+    def update_chunk(self, frame: pd.DataFrame) -> None:
+        for column in self.columns:
+            self.sketches[column].update(frame[column].to_numpy(dtype='float64'))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for column, sketch in other.sketches.items():
+            if column in self.sketches:
+                self.sketches[column].merge(sketch)
+            else:
+                self.columns.append(column)
+                self.sketches[column] = sketch
+
+    def quantile(self, q: float) -> pd.Series:
+        """Квантиль по устройствам, приближение data_numeric.quantile(q)"""
+        return pd.Series(
+            [self.sketches[column].quantile(q) for column in self.columns],
+            index=self.columns,
+            dtype='float64'
+        )
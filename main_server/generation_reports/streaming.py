@@ -0,0 +1,200 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Потоковые ядра статистики: обновляются по одному показанию или пачкой строк,
+# хранят компактное состояние по каждому устройству и дают те же результаты,
+# что и пакетный расчет по полному data_numeric.
+
+
+class WelfordState:
+    """Скользящие среднее и дисперсия по устройствам (алгоритм Уэлфорда)"""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        size = len(self.columns)
+        self.count = np.zeros(size, dtype='int64')
+        self.mean_ = np.zeros(size, dtype='float64')
+        self.m2 = np.zeros(size, dtype='float64')
+
+    def update(self, row: np.ndarray) -> None:
+        """Учитывает одну строку показаний (NaN пропускаются)"""
+        row = np.asarray(row, dtype='float64')
+        mask = ~np.isnan(row)
+        self.count[mask] += 1
+        delta = row[mask] - self.mean_[mask]
+        self.mean_[mask] += delta / self.count[mask]
+        self.m2[mask] += delta * (row[mask] - self.mean_[mask])
+
+    def update_chunk(self, values: np.ndarray) -> None:
+        """Учитывает пачку строк, объединяя ее статистику с накопленной (формула Чана)"""
+        values = np.asarray(values, dtype='float64')
+        if values.size == 0:
+            return
+        valid = ~np.isnan(values)
+        chunk_count = valid.sum(axis=0)
+        filled = np.where(valid, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunk_mean = np.where(chunk_count > 0, filled.sum(axis=0) / chunk_count, 0.0)
+        chunk_m2 = (np.where(valid, values - chunk_mean, 0.0) ** 2).sum(axis=0)
+
+        total = self.count + chunk_count
+        has_data = total > 0
+        delta = chunk_mean - self.mean_
+        weight = np.divide(chunk_count, total, out=np.zeros(len(total)), where=has_data)
+        self.m2 = self.m2 + chunk_m2 + delta ** 2 * self.count * weight
+        self.mean_ = self.mean_ + delta * weight
+        self.count = total
+
+    def mean(self) -> pd.Series:
+        """Среднее по устройствам, аналог data_numeric.mean()"""
+        return pd.Series(np.where(self.count > 0, self.mean_, np.nan), index=self.columns)
+
+    def std(self) -> pd.Series:
+        """Выборочное стандартное отклонение, аналог data_numeric.std()"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+        return pd.Series(np.sqrt(variance), index=self.columns)
+
+
+class IdleCounter:
+    """Счетчик нулевых показаний (оборудование выключено) по устройствам"""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        self.zeros = np.zeros(len(self.columns), dtype='int64')
+        self.rows = 0
+
+    def update(self, row: np.ndarray) -> None:
+        self.zeros += np.asarray(row) == 0
+        self.rows += 1
+
+    def update_chunk(self, values: np.ndarray) -> None:
+        values = np.asarray(values)
+        self.zeros += (values == 0).sum(axis=0)
+        self.rows += len(values)
+
+    def counts(self) -> pd.Series:
+        """Количество нулевых показаний, аналог (data_numeric == 0).sum()"""
+        return pd.Series(self.zeros, index=self.columns)
+
+
+class RollingAnomalyDetector:
+    """
+    Поиск аномалий ±σ относительно скользящего окна по каждому устройству.
+
+    Для каждого устройства хранится кольцевой буфер последних window показаний
+    (пропуски не попадают в окно, как при data_series.dropna().rolling(window)),
+    а также накопленные количество, максимальное и суммарное отклонение аномалий.
+    """
+
+    def __init__(self, columns: Sequence[str], window: int = 24, sigma: float = 2):
+        self.columns = list(columns)
+        self.window = window
+        self.sigma = sigma
+        size = len(self.columns)
+        self.buffer = np.zeros((size, window), dtype='float64')
+        self.position = np.zeros(size, dtype='int64')
+        self.filled = np.zeros(size, dtype='int64')
+
+        self.anomaly_count = np.zeros(size, dtype='int64')
+        self.max_deviation = np.zeros(size, dtype='float64')
+        self.total_deviation = np.zeros(size, dtype='float64')
+
+    def update(self, timestamp, row: np.ndarray) -> List[Dict]:
+        """
+        Учитывает одну строку показаний
+
+        Args:
+            timestamp: Отметка времени строки
+            row: Показания в порядке self.columns (NaN - нет показания)
+
+        Returns:
+            Список аномалий, найденных в этой строке
+        """
+        row = np.asarray(row, dtype='float64')
+        devices = np.flatnonzero(~np.isnan(row))
+        if devices.size == 0:
+            return []
+
+        self.buffer[devices, self.position[devices]] = row[devices]
+        self.position[devices] = (self.position[devices] + 1) % self.window
+        self.filled[devices] = np.minimum(self.filled[devices] + 1, self.window)
+
+        ready = devices[self.filled[devices] == self.window]
+        if ready.size == 0 or self.window < 2:
+            return []
+
+        windows = self.buffer[ready]
+        rolling_mean = windows.mean(axis=1)
+        rolling_std = windows.std(axis=1, ddof=1)
+        values = row[ready]
+        band = self.sigma * rolling_std
+        anomalous = (values > rolling_mean + band) | (values < rolling_mean - band)
+
+        alerts = []
+        for device, value, mean in zip(ready[anomalous], values[anomalous], rolling_mean[anomalous]):
+            deviation = abs(value - mean)
+            self._register(device, np.array([deviation]))
+            alerts.append({
+                'timestamp': timestamp,
+                'device': self.columns[device],
+                'value': float(value),
+                'rolling_mean': float(mean),
+                'deviation': float(deviation)
+            })
+        return alerts
+
+    def update_chunk(self, frame: pd.DataFrame) -> None:
+        """Учитывает пачку строк (столбцы в порядке self.columns)"""
+        for device, column in enumerate(self.columns):
+            values = frame[column].dropna().to_numpy(dtype='float64')
+            if values.size:
+                self._update_device(device, values)
+
+    def _ordered_window(self, device: int) -> np.ndarray:
+        """Содержимое буфера устройства в хронологическом порядке"""
+        filled = self.filled[device]
+        if filled < self.window:
+            return self.buffer[device, :filled]
+        return np.roll(self.buffer[device], -self.position[device])
+
+    def _update_device(self, device: int, values: np.ndarray) -> None:
+        # Для окон, заканчивающихся на новых показаниях, нужны последние window - 1 прошлых
+        history = self._ordered_window(device)
+        if history.size == self.window:
+            history = history[1:]
+        series = np.concatenate([history, values])
+
+        if self.window >= 2 and series.size >= self.window:
+            windows = sliding_window_view(series, self.window)
+            current = series[self.window - 1:]
+            rolling_mean = windows.mean(axis=1)
+            rolling_std = windows.std(axis=1, ddof=1)
+            band = self.sigma * rolling_std
+            anomalous = (current > rolling_mean + band) | (current < rolling_mean - band)
+            if anomalous.any():
+                self._register(device, np.abs(current[anomalous] - rolling_mean[anomalous]))
+
+        keep = series[-self.window:]
+        self.buffer[device, :keep.size] = keep
+        self.filled[device] = keep.size
+        self.position[device] = keep.size % self.window
+
+    def _register(self, device: int, deviations: np.ndarray) -> None:
+        self.anomaly_count[device] += deviations.size
+        self.max_deviation[device] = max(self.max_deviation[device], deviations.max())
+        self.total_deviation[device] += deviations.sum()
+
+    def stats(self) -> pd.DataFrame:
+        """Статистика аномалий по устройствам, у которых они найдены"""
+        stats = pd.DataFrame({
+            'count': self.anomaly_count,
+            'max_deviation': self.max_deviation,
+            'total_deviation': self.total_deviation
+        }, index=self.columns)
+        stats = stats[stats['count'] > 0].copy()
+        stats['mean_deviation'] = stats['total_deviation'] / stats['count']
+        return stats
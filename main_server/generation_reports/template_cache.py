@@ -0,0 +1,101 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+# Наибольшее число разобранных частей шаблонов (тело, колонтитулы, свойства) в процессе пула
+TEMPLATE_CACHE_SIZE = 64
+
+
+class TemplateCache:
+    """
+    LRU-кэш результатов разбора разметки шаблонов в памяти процесса.
+
+    Ключ - хэш исходного текста (XML части документа или jinja-шаблона), поэтому
+    отчеты по одному шаблону (например, пакет) разбирают его разметку один раз
+    на процесс пула, а измененный шаблон просто дает новые ключи.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+
+    @staticmethod
+    def key(kind: str, source: str) -> str:
+        return f"{kind}:{hashlib.sha256(source.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+
+_template_cache: Optional[TemplateCache] = None
+
+
+def get_template_cache() -> TemplateCache:
+    """Кэш разбора шаблонов текущего процесса (у каждого процесса пула свой)"""
+    global _template_cache
+    if _template_cache is None:
+        _template_cache = TemplateCache(TEMPLATE_CACHE_SIZE)
+    return _template_cache
+
+
+class CachingEnvironment(Environment):
+    """Окружение jinja2, компилирующее одинаковый текст шаблона один раз на процесс"""
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None or not isinstance(source, str):
+            return super().from_string(source, globals, template_class)
+        cache = get_template_cache()
+        key = cache.key('jinja', source)
+        template = cache.get(key)
+        if template is None:
+            template = super().from_string(source)
+            cache.put(key, template)
+        return template
+
+
+_environment: Optional[CachingEnvironment] = None
+
+
+def get_template_environment() -> CachingEnvironment:
+    """Окружение jinja2 процесса для рендеринга шаблонов docx"""
+    global _environment
+    if _environment is None:
+        _environment = CachingEnvironment()
+    return _environment
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """
+    Шаблон docx, переиспользующий в процессе разбор своей разметки.
+
+    docxtpl меняет документ при рендеринге, поэтому сам docx открывается для каждого
+    отчета заново. Очистка XML от разметки Word (patch_xml) и компиляция jinja2
+    зависят только от текста шаблона и берутся из кэша процесса (get_template_cache).
+    """
+
+    def patch_xml(self, src_xml: str) -> str:
+        cache = get_template_cache()
+        key = cache.key('xml', src_xml)
+        patched = cache.get(key)
+        if patched is None:
+            patched = super().patch_xml(src_xml)
+            cache.put(key, patched)
+        return patched
+
+    def render(self, context, jinja_env: Optional[Environment] = None, autoescape: bool = False) -> None:
+        # docxtpl включает autoescape в переданном окружении, общее окружение для этого не годится
+        if jinja_env is None and not autoescape:
+            jinja_env = get_template_environment()
+        super().render(context, jinja_env, autoescape)
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, TypeVar
+
+from main_server.db.config import settings
+
+T = TypeVar("T")
+
+# Время после дедлайна, за которое процесс пула должен сам прервать задачу
+# (проверки дедлайна в генераторе); иначе пул перезапускается
+WORKER_STOP_GRACE_SECONDS = 5
+
+# Singleton пул процессов для CPU-нагрузки отчетов (разбор Excel, анализ, графики)
+_worker_pool = None
+
+
+def _init_worker():
+    """Инициализация процесса пула: графики рисуются без GUI"""
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def get_worker_pool() -> ProcessPoolExecutor:
+    """
+    Получение пула процессов генерации отчетов.
+
+    Процессы запускаются через spawn, чтобы не наследовать потоки
+    планировщика и event loop основного процесса.
+
+    Returns:
+        ProcessPoolExecutor: Пул из settings.REPORT_WORKERS процессов
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ProcessPoolExecutor(
+            max_workers=settings.REPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+    return _worker_pool
+
+
+async def run_in_worker(func: Callable[..., T], *args, **kwargs) -> T:
+    """Выполняет функцию уровня модуля в пуле процессов, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_worker_pool(), partial(func, *args, **kwargs))
+
+
+async def run_in_worker_until(deadline: float, func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Выполняет функцию в пуле процессов с предельным временем.
+
+    Возвращает управление, только когда процесс пула действительно освободился:
+    после дедлайна задаче дается WORKER_STOP_GRACE_SECONDS на то, чтобы прерваться
+    самой, затем процессы пула завершаются и пул создается заново. Так генерация
+    занимает не больше дедлайна и WORKER_STOP_GRACE_SECONDS, а вызывающий код
+    (например, слот пакета) не освобождается раньше процесса.
+    Задачи, прерванные чужим перезапуском пула, повторяются один раз, если время осталось.
+
+    Args:
+        deadline: Время (time.time()), к которому задача должна завершиться
+        func: Функция уровня модуля
+
+    Raises:
+        TimeoutError: Если задача не завершилась к дедлайну
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in (1, 2):
+        pool = get_worker_pool()
+        future = loop.run_in_executor(pool, partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - time.time(), 0))
+        except BrokenProcessPool:
+            if attempt == 2 or time.time() >= deadline:
+                raise
+        except TimeoutError:
+            # TimeoutError завершившейся задачи - это ее собственная проверка дедлайна:
+            # процесс уже свободен, и пул не трогается
+            if not future.done():
+                await _stop_task(pool, future)
+            raise TimeoutError("Report generation exceeded the time limit")
+
+
+async def _stop_task(pool: ProcessPoolExecutor, future: asyncio.Future) -> None:
+    """Ждет, пока задача прервется по дедлайну сама; если не прервалась - перезапускает пул"""
+    if not future.done():
+        # asyncio.wait не пробрасывает ошибку задачи, поэтому ее TimeoutError
+        # не путается с истечением времени ожидания
+        await asyncio.wait({future}, timeout=WORKER_STOP_GRACE_SECONDS)
+    if future.done():
+        # Задача прервалась сама (TimeoutError процесса) или завершилась: ошибка уже не нужна
+        if not future.cancelled():
+            future.exception()
+        return
+    restart_worker_pool(pool)
+    try:
+        await future
+    except Exception:
+        pass
+
+
+def restart_worker_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Завершает процессы пула, не дожидаясь их задач; следующий get_worker_pool() создаст новый пул.
+
+    Остальные задачи этого пула завершаются BrokenProcessPool.
+    """
+    global _worker_pool
+    if _worker_pool is pool:
+        _worker_pool = None
+    # ProcessPoolExecutor не умеет прерывать выполняющиеся задачи, процессы завершаются напрямую
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_worker_pool():
+    """Останавливает пул процессов (при завершении приложения)"""
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.shutdown(cancel_futures=True)
+        _worker_pool = None
@@ -1,15 +1,47 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 import os
 
 from starlette.middleware.cors import CORSMiddleware
 
 import main_server.api.routers.reports
+import main_server.api.routers.devices
+import main_server.api.routers.analytics
+import main_server.api.routers.storage
 
+from main_server.db.config import settings
 from main_server.db.secret_config import secret_settings
+from main_server.generation_reports import shutdown_worker_pool, cleanup_shared_datasets
+from main_server.services.source_files import cleanup_spooled_uploads
+from main_server.core.dependencies import start_s3_client, stop_s3_client, verify_storage, schedule_storage_gc
 
 UPLOAD_FOLDER = os.path.abspath('../uploads')
 
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    # Наборы данных и исходные файлы, оставшиеся от прерванных генераций (дольше любой генерации)
+    cleanup_shared_datasets(max_age_seconds=2 * settings.REPORT_TIMEOUT_FULL_SECONDS)
+    cleanup_spooled_uploads(max_age_seconds=2 * settings.REPORT_TIMEOUT_FULL_SECONDS)
+    # Один клиент S3 с пулом соединений на процесс, общий для всех запросов
+    await start_s3_client()
+    await verify_storage()
+    # Периодическая сверка хранилища: объекты без отчетов и объем по пользователям
+    try:
+        await schedule_storage_gc()
+    except Exception as exc:
+        print(f"Не удалось запланировать сверку хранилища: {exc}")
+    try:
+        yield
+    finally:
+        await stop_s3_client()
+        shutdown_worker_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 # TODO add env fro allow domen
 # Настройка CORS
 app.add_middleware(
@@ -20,12 +52,11 @@ app.add_middleware(
     allow_headers=["*"],  # Разрешить все заголовки
 )
 app.include_router(main_server.api.routers.reports.router, prefix='/api')
+app.include_router(main_server.api.routers.devices.router, prefix='/api')
+app.include_router(main_server.api.routers.analytics.router, prefix='/api')
+app.include_router(main_server.api.routers.storage.router, prefix='/api')
 app.include_router(main_server.api.routers.auth.router, prefix='/api')
 app.include_router(main_server.api.routers.test.router, prefix='/api')
 app.include_router(main_server.api.routers.user.router, prefix='/api')
 
 app.include_router(main_server.api.routers.url_generate.router, prefix='/api')
-
-@app.on_event("startup")
-async def startup_event():
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
\ No newline at end of file
@@ -2,3 +2,4 @@ from .report_service import ReportService
 from .report_delivery_service import ReportDeliveryService
 from .auth_service import AuthService
 
+from .device_service import DeviceService
@@ -0,0 +1,314 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import pandas as pd
+
+from main_server.core.dictionir import ReportFormatEnum, ReportQualityEnum
+from main_server.db.config import settings
+from main_server.db.database import async_session_factory
+from main_server.db.repositories import ReportRepository, S3StorageRepository, DeviceRepository
+from main_server.services.report_service import ReportService
+from main_server.services.source_files import release_spooled, upload_source
+
+
+class BatchItem:
+    """Один отчет пакетной генерации"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, index: int, report_name: str, excel_path: Optional[str] = None,
+                 source_report_id: Optional[uuid.UUID] = None):
+        """
+        Args:
+            index: Номер отчета в пакете
+            report_name: Название отчета
+            excel_path: Путь к выгрузке из spool_upload; файл удаляется после обработки отчета
+            source_report_id: ID отчета, чей сохраненный набор данных используется
+        """
+        self.index = index
+        self.report_name = report_name
+        self.excel_path = excel_path
+        self.source_report_id = source_report_id
+        self.status = self.PENDING
+        self.report_id: Optional[uuid.UUID] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "report_name": self.report_name,
+            "source_report_id": self.source_report_id,
+            "status": self.status,
+            "report_id": self.report_id,
+            "error": self.error
+        }
+
+
+class BatchJob:
+    """Пакет отчетов по одному шаблону и его прогресс"""
+
+    def __init__(self, user_id: uuid.UUID, items: List[BatchItem],
+                 output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+                 quality: ReportQualityEnum = ReportQualityEnum.FULL,
+                 params: Optional[Dict[str, Any]] = None):
+        self.id = uuid4()
+        self.user_id = user_id
+        self.items = items
+        self.output_format = output_format
+        self.quality = quality
+        self.params = params
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return "finished"
+        if any(item.status != BatchItem.PENDING for item in self.items):
+            return "running"
+        return "pending"
+
+    def to_dict(self) -> Dict[str, Any]:
+        counts = {state: 0 for state in (BatchItem.PENDING, BatchItem.RUNNING, BatchItem.DONE, BatchItem.FAILED)}
+        for item in self.items:
+            counts[item.status] += 1
+        return {
+            "batch_id": self.id,
+            "status": self.status,
+            "output_format": self.output_format,
+            "quality": self.quality,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "total": len(self.items),
+            "completed": counts[BatchItem.DONE],
+            "failed": counts[BatchItem.FAILED],
+            "running": counts[BatchItem.RUNNING],
+            "pending": counts[BatchItem.PENDING],
+            "items": [item.to_dict() for item in self.items]
+        }
+
+
+class BatchReportService:
+    """
+    Пакетная генерация отчетов по одному шаблону.
+
+    Шаблон загружается в хранилище один раз и используется всеми отчетами пакета,
+    генерация распределяется по общему пулу процессов; разбор разметки шаблона
+    каждый процесс пула выполняет один раз (CachedDocxTemplate). Исходные файлы пакета лежат
+    на диске (spool_upload) и передаются в хранилище потоково; пакет удаляет их сам.
+    Состояние пакетов хранится в памяти процесса и удаляется через
+    settings.BATCH_JOB_TTL_MINUTES после завершения.
+    """
+
+    def __init__(
+            self,
+            s3_client_factory: Callable[[], AsyncContextManager],
+            storage_factory: Optional[Callable[[Any], S3StorageRepository]] = None
+    ):
+        """
+        Args:
+            s3_client_factory: Фабрика клиента S3 (асинхронный контекстный менеджер);
+                               пакет выполняется после ответа на запрос, поэтому
+                               клиент запроса ему не передается
+            storage_factory: Репозиторий хранилища по клиенту S3 (по умолчанию -
+                             бакет из настроек с параметрами передачи по умолчанию)
+        """
+        self._s3_client_factory = s3_client_factory
+        self._storage_factory = storage_factory or (lambda client: S3StorageRepository(client, settings.MINIO_BUCKET))
+        self._jobs: Dict[uuid.UUID, BatchJob] = {}
+
+    def get_job(self, batch_id: uuid.UUID, user_id: uuid.UUID) -> Optional[BatchJob]:
+        """Пакет пользователя по ID или None"""
+        self._prune()
+        job = self._jobs.get(batch_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def submit_files(
+            self,
+            user_id: uuid.UUID,
+            template_path: Optional[str],
+            files: List[Tuple[str, str]],
+            report_name: str,
+            output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+            quality: ReportQualityEnum = ReportQualityEnum.FULL,
+            params: Optional[Dict[str, Any]] = None
+    ) -> BatchJob:
+        """
+        Запускает пакет по загруженным выгрузкам
+
+        Временные файлы шаблона и выгрузок переходят пакету: каждая выгрузка
+        удаляется после своего отчета, шаблон - после завершения пакета.
+
+        Args:
+            user_id: UUID пользователя
+            template_path: Путь к общему шаблону из spool_upload (для xlsx не нужен)
+            files: Список пар (имя файла, путь к выгрузке из spool_upload)
+            report_name: Общее название; к нему добавляется имя файла
+            output_format: Формат отчетов пакета
+            quality: Уровень качества отчетов пакета
+            params: Параметры анализа отчетов пакета (см. DEFAULT_ANALYSIS_PARAMS)
+        """
+        items = [
+            BatchItem(index, f"{report_name} - {filename}", excel_path=path)
+            for index, (filename, path) in enumerate(files)
+        ]
+        return self._submit(user_id, template_path, items, output_format, quality, params)
+
+    def submit_datasets(
+            self,
+            user_id: uuid.UUID,
+            template_path: Optional[str],
+            reports: List[Any],
+            report_name: str,
+            output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+            quality: ReportQualityEnum = ReportQualityEnum.FULL,
+            params: Optional[Dict[str, Any]] = None
+    ) -> BatchJob:
+        """
+        Запускает пакет по ранее сохраненным наборам данных
+
+        Args:
+            user_id: UUID пользователя
+            template_path: Путь к общему шаблону из spool_upload (для xlsx не нужен);
+                           удаляется после завершения пакета
+            reports: Отчеты (GeneratedReport) с сохраненными наборами данных
+            report_name: Общее название; к нему добавляется название исходного отчета
+            output_format: Формат отчетов пакета
+            quality: Уровень качества отчетов пакета
+            params: Параметры анализа отчетов пакета (см. DEFAULT_ANALYSIS_PARAMS)
+        """
+        items = [
+            BatchItem(index, f"{report_name} - {report.report_name}", source_report_id=report.id)
+            for index, report in enumerate(reports)
+        ]
+        return self._submit(user_id, template_path, items, output_format, quality, params,
+                            sources={report.id: report for report in reports})
+
+    def _submit(self, user_id: uuid.UUID, template_path: Optional[str], items: List[BatchItem],
+                output_format: ReportFormatEnum, quality: ReportQualityEnum,
+                params: Optional[Dict[str, Any]] = None,
+                sources: Optional[Dict[uuid.UUID, Any]] = None) -> BatchJob:
+        self._prune()
+        job = BatchJob(user_id, items, output_format, quality, params)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, template_path, sources or {}))
+        return job
+
+    async def _run(self, job: BatchJob, template_path: Optional[str], sources: Dict[uuid.UUID, Any]) -> None:
+        date_prefix = datetime.now().strftime("%Y/%m/%d")
+        batch_prefix = f"{date_prefix}/{job.id}"
+        template_url = f"source/{batch_prefix}/template.docx" if template_path is not None else None
+
+        try:
+            async with self._s3_client_factory() as s3_client:
+                storage = self._storage_factory(s3_client)
+                if template_path is not None:
+                    await upload_source(storage, template_path, template_url)
+
+                # Одновременно обрабатывается столько отчетов, сколько процессов в пуле,
+                # чтобы не держать лишние подключения к БД и копии данных в памяти
+                limit = asyncio.Semaphore(settings.REPORT_WORKERS)
+
+                async def run_limited(item: BatchItem):
+                    async with limit:
+                        await self._run_item(storage, job, item, template_path, template_url,
+                                             f"{batch_prefix}/{item.index}", sources.get(item.source_report_id))
+
+                await asyncio.gather(*(run_limited(item) for item in job.items))
+        except Exception as e:
+            for item in job.items:
+                if item.status in (BatchItem.PENDING, BatchItem.RUNNING):
+                    item.status = BatchItem.FAILED
+                    item.error = str(e)
+        finally:
+            # Выгрузки отчетов, не дошедших до обработки, и шаблон больше не нужны
+            release_spooled([template_path] + [item.excel_path for item in job.items])
+            job.finished_at = datetime.now()
+
+    async def _run_item(
+            self,
+            storage: S3StorageRepository,
+            job: BatchJob,
+            item: BatchItem,
+            template_data: Optional[str],
+            template_url: Optional[str],
+            upload_prefix: str,
+            source_report: Optional[Any]
+    ) -> None:
+        item.status = BatchItem.RUNNING
+        try:
+            async with async_session_factory() as session:
+                service = ReportService(storage, ReportRepository(session), DeviceRepository(session))
+                # Предельное время считается для каждого отчета с начала его обработки
+                deadline = service.report_deadline(job.quality)
+
+                source_upload = None
+                if source_report is not None:
+                    excel_url = source_report.excel_url
+                    dataset_url = source_report.dataset_url
+                else:
+                    excel_url = f"source/{upload_prefix}/data.xlsx"
+                    dataset_url = None
+                    # Выгрузка сохраняется параллельно с разбором и генерацией
+                    source_upload = asyncio.ensure_future(upload_source(storage, item.excel_path, excel_url))
+
+                try:
+                    if source_report is not None:
+                        data_numeric: pd.DataFrame = await service.load_stored_dataset(source_report.dataset_url)
+                    else:
+                        data_numeric = await service.read_sources([item.excel_path], all_sheets=False,
+                                                                  deadline=deadline)
+
+                    report = await service.generate_from_dataset(
+                        data_numeric=data_numeric,
+                        template_data=template_data,
+                        report_name=item.report_name,
+                        user_id=job.user_id,
+                        excel_url=excel_url,
+                        template_url=template_url,
+                        upload_prefix=upload_prefix,
+                        source_urls=(service.derived_source_urls(source_report, template_url)
+                                     if source_report is not None else None),
+                        dataset_url=dataset_url,
+                        dataset_hash=source_report.dataset_hash if source_report is not None else None,
+                        output_format=job.output_format,
+                        quality=job.quality,
+                        deadline=deadline,
+                        params=job.params,
+                        source_uploads=source_upload
+                    )
+                except BaseException:
+                    if source_upload is not None:
+                        await service.abort_uploads(source_upload, [excel_url])
+                    raise
+                finally:
+                    # Выгрузка уже в хранилище или отчет не удался: временный файл больше не нужен
+                    release_spooled([item.excel_path])
+                    item.excel_path = None
+            item.report_id = report.id
+            item.status = BatchItem.DONE
+        except TimeoutError:
+            item.status = BatchItem.FAILED
+            item.error = "Report generation exceeded the time limit"
+        except Exception as e:
+            item.status = BatchItem.FAILED
+            item.error = str(e)
+
+    def _prune(self) -> None:
+        """Удаляет завершенные пакеты старше settings.BATCH_JOB_TTL_MINUTES"""
+        expire_before = datetime.now() - timedelta(minutes=settings.BATCH_JOB_TTL_MINUTES)
+        expired = [
+            batch_id for batch_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < expire_before
+        ]
+        for batch_id in expired:
+            del self._jobs[batch_id]
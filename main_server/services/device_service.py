@@ -0,0 +1,114 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from main_server.core.dictionir import MeterCategoryEnum
+from main_server.db.models import Device, DeviceReportSummary
+from main_server.db.repositories import DeviceRepository
+from main_server.generation_reports import classify_device, normalize_device_name
+
+
+class DeviceService:
+    """
+    Реестр устройств: постоянный ID и категория каждого счетчика.
+
+    Устройство определяется ключом сопоставления (normalize_device_name), поэтому
+    один счетчик из разных выгрузок - одна запись реестра. Новые устройства
+    классифицируются правилами CATEGORY_RULES один раз при первом появлении,
+    категорию можно переназначить вручную.
+    """
+
+    def __init__(self, device_repo: DeviceRepository):
+        self._repo = device_repo
+
+    async def resolve_devices(self, names: Iterable[str]) -> Dict[str, Device]:
+        """
+        Записи реестра для названий устройств; отсутствующие устройства регистрируются
+
+        Args:
+            names: Названия устройств (столбцы набора данных)
+
+        Returns:
+            {название: устройство}
+        """
+        keys = {name: normalize_device_name(name) for name in names}
+        devices = await self._repo.get_by_normalized_names(keys.values())
+
+        missing = {}
+        for name, key in keys.items():
+            if key not in devices and key not in missing:
+                missing[key] = (str(name).strip(), MeterCategoryEnum(classify_device(name)))
+        if missing:
+            devices.update(await self._repo.register_devices(missing))
+
+        return {name: devices[key] for name, key in keys.items()}
+
+    @staticmethod
+    def categories(devices: Dict[str, Device]) -> Dict[str, str]:
+        """Категории устройств для генерации отчета: {название: категория}"""
+        return {name: MeterCategoryEnum(device.category).value for name, device in devices.items()}
+
+    @staticmethod
+    def summary_rows(
+            summaries: List[Dict[str, Any]],
+            devices: Dict[str, Device],
+            user_id: uuid.UUID,
+            period_start: datetime,
+            period_end: datetime
+    ) -> List[DeviceReportSummary]:
+        """
+        Строки сводок отчета по устройствам реестра
+
+        Args:
+            summaries: Сводки генератора (ReportAnalysis.device_summaries)
+            devices: Устройства реестра: {название: устройство}
+            user_id: ID владельца отчета
+            period_start: Начало периода данных отчета
+            period_end: Конец периода данных отчета
+        """
+        return [
+            DeviceReportSummary(
+                device_id=devices[summary['device']].id,
+                user_id=user_id,
+                period_start=period_start,
+                period_end=period_end,
+                total_consumption=summary['total_consumption'],
+                idle_hours=summary['idle_hours'],
+                anomaly_count=summary['anomaly_count'],
+                anomaly_deviation=summary['anomaly_deviation'],
+                underutilization_hours=summary['underutilization_hours']
+            )
+            for summary in summaries if summary['device'] in devices
+        ]
+
+    async def update_device(
+            self,
+            device_id: uuid.UUID,
+            category: Optional[MeterCategoryEnum] = None,
+            reset_category: bool = False,
+            metadata: Optional[Dict[str, Any]] = None
+    ) -> Optional[Device]:
+        """
+        Переназначает категорию и/или метаданные устройства
+
+        Args:
+            device_id: ID устройства
+            category: Категория, заданная вручную
+            reset_category: Снять ручное назначение и вернуть категорию по правилам
+            metadata: Новые метаданные устройства
+
+        Returns:
+            Обновленное устройство или None, если устройство не найдено
+        """
+        if reset_category:
+            device = await self._repo.get(device_id)
+            if device is None:
+                return None
+            return await self._repo.update_device(
+                device_id, category=MeterCategoryEnum(classify_device(device.name)),
+                category_override=False, metadata=metadata
+            )
+        return await self._repo.update_device(
+            device_id, category=category, category_override=True if category is not None else None,
+            metadata=metadata
+        )
@@ -117,6 +117,8 @@ class EmailService:
                     mime_type = 'application/msword'
                 elif filename.lower().endswith('.docx'):
                     mime_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                elif filename.lower().endswith('.xlsx'):
+                    mime_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
                 elif filename.lower().endswith('.pdf'):
                     mime_type = 'application/pdf'
                 else:
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import aiofiles.os
+
+from main_server.db.config import settings
+from main_server.db.repositories import S3StorageRepository
+
+# Каталог записи только с временным файлом моложе этого возраста - идущее скачивание
+# (возможно, в другом процессе); старше - прерванное, такой каталог удаляется
+DOWNLOAD_STALE_SECONDS = 600
+DOWNLOAD_PREFIX = '.download-'
+# Каталоги рассылок (<дата>_<id отчета>) в TEMP_FILES_DIR с копиями файлов для отложенных задач отправки
+DELIVERY_DIR_PATTERN = re.compile(r'^\d{8}_[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}$')
+
+
+def _discard_download(temp_path: str) -> None:
+    """Удаляет временный файл скачивания и каталог записи, если в нем больше ничего нет"""
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.rmdir(os.path.dirname(temp_path))
+    except OSError:
+        pass
+
+
+def _link_file(path: str, target: str) -> None:
+    """
+    Жесткая ссылка на файл (копия, если ссылку создать нельзя, например, на другом разделе);
+    существующий target заменяется атомарно
+    """
+    temp_path = os.path.join(os.path.dirname(target), f"{DOWNLOAD_PREFIX}{uuid.uuid4().hex}")
+    try:
+        try:
+            os.link(path, temp_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(path, temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def object_cache_dir() -> str:
+    """Каталог локального кэша объектов хранилища"""
+    return os.path.join(settings.TEMP_FILES_DIR, 'objects')
+
+
+class ObjectCache:
+    """
+    Локальный дисковый кэш объектов хранилища с ограничением общего размера.
+
+    Запись кэша - каталог <хэш ключа и ETag>/ с файлом под исходным именем объекта,
+    поэтому вложения писем сохраняют имя файла. Измененный объект (новый ETag)
+    попадает в новую запись, а старая со временем вытесняется.
+    Каталог общий для всех процессов приложения и для сверки хранилища, поэтому
+    состояние кэша берется с диска: после каждого скачивания размер считается
+    заново и вытесняются записи, которые дольше всего не запрашивались
+    (время запроса - время изменения файла), пока размер больше предела.
+    Файл скачивается во временный файл и переименовывается в запись атомарно;
+    одновременные запросы одного объекта в процессе ждут одно скачивание.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Args:
+            directory: Каталог кэша
+            max_bytes: Предельный общий размер файлов кэша
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Размер кэша по последнему подсчету на диске
+        self.size = 0
+        self._downloads: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def entry_name(object_name: str, etag: str) -> str:
+        return hashlib.sha256(f"{object_name}\0{etag}".encode('utf-8')).hexdigest()
+
+    async def get_path(self, storage: S3StorageRepository, object_name: str) -> str:
+        """
+        Путь к локальной копии объекта; скачивает объект, если актуальной копии нет
+
+        Args:
+            storage: Репозиторий хранилища
+            object_name: Ключ объекта
+
+        Returns:
+            str: Путь к файлу в кэше
+
+        Raises:
+            RuntimeError: Если объекта нет или скачать его не удалось
+        """
+        info = await storage.get_object_info(object_name)
+        if info is None:
+            raise RuntimeError(f"Object not found: {object_name}")
+        entry = self.entry_name(object_name, info["ETag"])
+        path = os.path.join(self.directory, entry, os.path.basename(object_name))
+
+        try:
+            # Отметка запроса для вытеснения; запись могли удалить другой процесс или сверка
+            await asyncio.to_thread(os.utime, path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        download = self._downloads.get(entry)
+        if download is None:
+            download = asyncio.ensure_future(self._download(storage, object_name, entry, path))
+            self._downloads[entry] = download
+            download.add_done_callback(lambda _: self._downloads.pop(entry, None))
+        # Отмена одного ожидающего не прерывает скачивание для остальных
+        return await asyncio.shield(download)
+
+    async def get_copy(self, storage: S3StorageRepository, object_name: str, directory: str) -> str:
+        """
+        Копия объекта в каталоге directory для задач, читающих файл позже (например, вложения писем)
+
+        Файл записи кэша может быть вытеснен в любой момент, поэтому задача получает
+        жесткую ссылку на него: данные остаются на диске, пока не удален каталог копии.
+
+        Args:
+            storage: Репозиторий хранилища
+            object_name: Ключ объекта
+            directory: Каталог копии (создается при необходимости)
+
+        Returns:
+            str: Путь к копии под исходным именем объекта
+        """
+        await aiofiles.os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, os.path.basename(object_name))
+        for attempt in (1, 2):
+            path = await self.get_path(storage, object_name)
+            try:
+                await asyncio.to_thread(_link_file, path, target)
+                return target
+            except FileNotFoundError:
+                # Запись вытеснена между запросом и созданием ссылки - объект скачивается заново
+                if attempt == 2:
+                    raise
+
+    async def _download(self, storage: S3StorageRepository, object_name: str, entry: str, path: str) -> str:
+        entry_dir = os.path.dirname(path)
+        await aiofiles.os.makedirs(entry_dir, exist_ok=True)
+        # Свой временный файл у каждого скачивания: тот же объект может скачивать другой процесс
+        temp_path = os.path.join(entry_dir, f"{DOWNLOAD_PREFIX}{uuid.uuid4().hex}")
+        try:
+            await storage.download_to_file(object_name, temp_path)
+            await aiofiles.os.replace(temp_path, path)
+        except BaseException:
+            await asyncio.to_thread(_discard_download, temp_path)
+            raise
+        await self._evict(keep=entry)
+        return path
+
+    async def _evict(self, keep: str) -> None:
+        """
+        Считает размер кэша по диску и удаляет самые давно запрошенные записи,
+        пока он больше предела; предел важнее давности запроса
+        """
+        entries = await asyncio.to_thread(self._scan)
+        self.size = sum(size for _, size, _ in entries)
+        for entry, size, _ in sorted(entries, key=lambda item: item[2]):
+            if self.size <= self.max_bytes:
+                break
+            if entry == keep or entry in self._downloads:
+                continue
+            await asyncio.to_thread(shutil.rmtree, os.path.join(self.directory, entry), True)
+            self.size -= size
+
+    def _scan(self) -> List[Tuple[str, int, float]]:
+        """Записи кэша на диске: (запись, размер, время последнего запроса)"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for entry in os.listdir(self.directory):
+            entry_dir = os.path.join(self.directory, entry)
+            try:
+                if not os.path.isdir(entry_dir):
+                    os.remove(entry_dir)
+                    continue
+                names = os.listdir(entry_dir)
+                files = [name for name in names if not name.startswith(DOWNLOAD_PREFIX)]
+                if not files:
+                    if time.time() - os.path.getmtime(entry_dir) > DOWNLOAD_STALE_SECONDS:
+                        shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                stat = os.stat(os.path.join(entry_dir, files[0]))
+            except FileNotFoundError:
+                # Запись удалена другим процессом во время обхода
+                continue
+            entries.append((entry, stat.st_size, stat.st_mtime))
+        return entries
+
+
+_object_cache: Optional[ObjectCache] = None
+
+
+def get_object_cache() -> ObjectCache:
+    """Кэш объектов процесса"""
+    global _object_cache
+    if _object_cache is None:
+        _object_cache = ObjectCache(object_cache_dir(), settings.DELIVERY_CACHE_MB * 1024 * 1024)
+    return _object_cache
+
+
+def _tree_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path) for name in files
+    )
+
+
+def cleanup_delivery_files(max_age_seconds: float) -> Tuple[int, int]:
+    """
+    Удаляет записи кэша объектов и каталоги рассылок, не запрашивавшиеся дольше max_age_seconds
+
+    Кэш процесса приложения замечает удаленную запись при следующем запросе
+    и скачивает объект заново.
+
+    Returns:
+        Tuple[int, int]: Число удаленных каталогов и освобожденный объем в байтах
+    """
+    expire_before = time.time() - max_age_seconds
+    removed, freed = 0, 0
+    candidates = []
+    cache_dir = object_cache_dir()
+    if os.path.isdir(cache_dir):
+        candidates.extend(os.path.join(cache_dir, name) for name in os.listdir(cache_dir))
+    if os.path.isdir(settings.TEMP_FILES_DIR):
+        candidates.extend(
+            os.path.join(settings.TEMP_FILES_DIR, name) for name in os.listdir(settings.TEMP_FILES_DIR)
+            if DELIVERY_DIR_PATTERN.match(name)
+        )
+    for path in candidates:
+        try:
+            # Время запроса записи кэша - время изменения ее файла (см. ObjectCache.get_path)
+            used_at = max([os.path.getmtime(path)] + [
+                os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)
+            ])
+            if used_at >= expire_before:
+                continue
+            size = _tree_size(path)
+        except OSError:
+            # Не каталог или удален, пока шла проверка
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+        freed += size
+    return removed, freed
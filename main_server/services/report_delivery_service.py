@@ -1,13 +1,14 @@
 import aiohttp
 import os
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 from main_server.core.dictionir import DeliveryMethodEnum, DeliveryStatusEnum
 from main_server.db.models import ReportDeliveryLog
 from main_server.db.repositories import UserRepository, S3StorageRepository, ReportRepository
 from main_server.db.repositories import ReportDeliveryLogRepository
 from main_server.services.email_schedule_send import EmailScheduleSend
+from main_server.services.object_cache import ObjectCache, get_object_cache
 from main_server.db.secret_config import secret_settings
 
 class ReportDeliveryService:
@@ -19,7 +20,9 @@ class ReportDeliveryService:
                  s3_storage_repository: S3StorageRepository,
                  report_repository: ReportRepository,
                  report_delivery_log_repository: ReportDeliveryLogRepository,
-                 tg_bot_api_url: str = secret_settings.TG_BOT_API_URL):
+                 tg_bot_api_url: str = secret_settings.TG_BOT_API_URL,
+                 object_cache: Optional[ObjectCache] = None):
+        self.object_cache = object_cache or get_object_cache()
         self.user_repository = user_repository
         self.email_schedule_send = email_schedule_send
         self.s3_storage_repository = s3_storage_repository
@@ -309,22 +312,16 @@ class ReportDeliveryService:
         report = await self.report_repository.get_report_by_id(report_id)
         report_file_path = ""
         if report:
-            # Создаем уникальную директорию для этой рассылки
-            date_prefix = datetime.now().strftime("%Y%m%d")
-            report_dir = os.path.join(self.temp_files_dir, f"{date_prefix}_{report_id}")
-            os.makedirs(report_dir, exist_ok=True)
-
-            # Скачиваем файл отчета из S3
-            file_name = os.path.basename(report.report_url)
-            report_file_path = os.path.join(report_dir, file_name)
-
-            if not os.path.exists(report_file_path):
-                try:
-                    file_data = await self.s3_storage_repository.download_file(report.report_url)
-                    with open(report_file_path, "wb") as f:
-                        f.write(file_data.getvalue())
-                except Exception as e:
-                    raise RuntimeError(f"Failed to download report file: {str(e)}")
+            # Файл отчета берется из локального кэша (при отсутствии скачивается из S3).
+            # Письма отправляются отложенной задачей, поэтому им передается копия в каталоге
+            # рассылки: запись кэша может быть вытеснена раньше, чем задача прочитает файл
+            try:
+                delivery_dir = os.path.join(self.temp_files_dir, f"{datetime.now():%Y%m%d}_{report_id}")
+                report_file_path = await self.object_cache.get_copy(
+                    self.s3_storage_repository, report.report_url, delivery_dir
+                )
+            except Exception as e:
+                raise RuntimeError(f"Failed to download report file: {str(e)}")
 
         for user_info in users_info:
             user_id, methods = user_info
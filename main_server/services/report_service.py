@@ -1,706 +1,733 @@
+import os
+import time
 import uuid
-from typing import Optional, List
+from typing import Any, Awaitable, Dict, Iterable, Optional, List, Tuple, Union
 from uuid import uuid4
 from datetime import datetime
 from fastapi import HTTPException
+from main_server.core.dictionir import ReportFormatEnum, ReportQualityEnum
+from main_server.db.config import settings
 from main_server.db.models import GeneratedReport
-from main_server.db.repositories import ReportRepository, S3StorageRepository
+from main_server.db.repositories import ReportRepository, S3StorageRepository, DeviceRepository
+from main_server.generation_reports import (DatasetAggregates, DatasetManifest, list_data_sheets, merge_datasets,
+                                            dataset_fingerprint, devices_fingerprint, dump_dataset, build_report,
+                                            run_in_worker_until, section_keys, load_dataset, load_dataset_chunks,
+                                            SharedDataset, read_shared_dataset)
+from main_server.services.device_service import DeviceService
+from main_server.services.source_files import spool_path, release_spooled, upload_source
 import asyncio
+import pandas as pd
+
+# Предельное время генерации отчета по уровням качества
+REPORT_TIMEOUTS = {
+    ReportQualityEnum.DRAFT: settings.REPORT_TIMEOUT_DRAFT_SECONDS,
+    ReportQualityEnum.FULL: settings.REPORT_TIMEOUT_FULL_SECONDS,
+}
+
+# Префикс фрагментов разделов отчета в хранилище
+SECTION_CACHE_PREFIX = "cache/sections"
+# Префикс исходных файлов, загружаемых клиентом напрямую в хранилище
+SOURCE_UPLOADS_PREFIX = "source/uploads"
+
+
+def user_uploads_prefix(user_id: uuid.UUID) -> str:
+    """Префикс прямых загрузок пользователя в хранилище"""
+    return f"{SOURCE_UPLOADS_PREFIX}/{user_id}"
+
 
 class ReportService:
     def __init__(
             self,
             storage_repo: S3StorageRepository,
-            report_repo: ReportRepository
+            report_repo: ReportRepository,
+            device_repo: Optional[DeviceRepository] = None
     ):
+        """
+        Args:
+            storage_repo: Репозиторий хранилища
+            report_repo: Репозиторий отчетов
+            device_repo: Репозиторий реестра устройств; без него категории
+                         устройств определяются правилами при каждой генерации
+        """
         self._storage = storage_repo
         self._repo = report_repo
+        self._devices = DeviceService(device_repo) if device_repo is not None else None
 
     async def generate_report(
             self,
-            excel_data: bytes,
-            template_data: bytes,
+            excel_files: List[Union[bytes, str]],
+            template_data: Optional[Union[bytes, str]],
             report_name: str,
-            user_id: uuid4
+            user_id: uuid4,
+            incremental: bool = False,
+            all_sheets: bool = False,
+            output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+            quality: ReportQualityEnum = ReportQualityEnum.FULL,
+            params: Optional[Dict[str, Any]] = None
     ) -> GeneratedReport:
-        """Generate and save reports"""
+        """
+        Generate and save reports
+
+        Несколько выгрузок (файлы и/или все листы с показаниями) разбираются
+        параллельно в пуле процессов и объединяются по отметке времени в один отчет.
+
+        В инкрементальном режиме для выгрузки, продолжающей ранее загруженную
+        (те же устройства, то же начало периода, совпадающий префикс строк),
+        только по новым строкам считаются агрегаты (суточные и почасовые суммы,
+        простои, аномалии, статистики порогов), хэш набора данных и сохраняемая
+        часть набора. Остальное по-прежнему зависит от всего периода: выгрузка
+        разбирается и сверяется с сохраненным префиксом целиком, а часы
+        недоиспользования (пороги меняются с каждой новой строкой, kmeans)
+        и графики показаний строятся по всем строкам.
+
+        Отчет в формате xlsx строится без шаблона: таблицы анализа и диаграммы Excel.
+
+        Выгрузки и шаблон передаются бинарными данными или путями к временным
+        файлам (spool_upload): файлы разбираются по пути, а в хранилище
+        загружаются потоково по частям, не читаясь в память целиком.
+
+        Исходные файлы загружаются в хранилище параллельно с разбором и генерацией;
+        запись об отчете создается, только когда завершились и загрузки, и генерация.
+        При ошибке загруженные объекты удаляются.
+
+        Разбор и генерация ограничены временем уровня качества (REPORT_TIMEOUTS);
+        при превышении возвращается ошибка 504.
+
+        params переопределяет параметры анализа (см. DEFAULT_ANALYSIS_PARAMS).
+        """
         try:
+            deadline = self.report_deadline(quality)
+            if template_data is None and output_format == ReportFormatEnum.DOCX:
+                raise ValueError("Template is required for docx reports")
+
             upload_id = str(uuid4())
             date_prefix = datetime.now().strftime("%Y/%m/%d")
 
-            paths = {
-                "excel": f"source/{date_prefix}/{upload_id}/data.xlsx",
-                "template": f"source/{date_prefix}/{upload_id}/template.docx",
-                "report": f"reports/{date_prefix}/{upload_id}/report.docx"
-            }
+            if len(excel_files) == 1:
+                excel_paths = [f"source/{date_prefix}/{upload_id}/data.xlsx"]
+            else:
+                excel_paths = [f"source/{date_prefix}/{upload_id}/data_{i}.xlsx" for i in range(len(excel_files))]
+
+            source_paths = list(excel_paths)
+            upload_tasks = [self._upload_source(data, path) for data, path in zip(excel_files, excel_paths)]
+            template_path = None
+            if template_data is not None:
+                template_path = f"source/{date_prefix}/{upload_id}/template.docx"
+                source_paths.append(template_path)
+                upload_tasks.append(self._upload_source(template_data, template_path))
+            # Генерация не зависит от исходных файлов в хранилище: загрузка идет параллельно
+            source_uploads = asyncio.ensure_future(self.wait_uploads(upload_tasks))
+
+            try:
+                return await self._generate_from_sources(
+                    excel_files=excel_files,
+                    template_data=template_data,
+                    report_name=report_name,
+                    user_id=user_id,
+                    # Для нескольких файлов в excel_url сохраняется первый, все - в source_urls
+                    excel_url=excel_paths[0],
+                    template_url=template_path,
+                    source_urls=source_paths,
+                    upload_prefix=f"{date_prefix}/{upload_id}",
+                    deadline=deadline,
+                    incremental=incremental,
+                    all_sheets=all_sheets,
+                    output_format=output_format,
+                    quality=quality,
+                    params=params,
+                    source_uploads=source_uploads
+                )
+            except BaseException:
+                await self.abort_uploads(source_uploads, source_paths)
+                raise
+
+        except TimeoutError:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Report generation exceeded the time limit for quality '{ReportQualityEnum(quality).value}'"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Report generation failed: {str(e)}"
+            )
 
-            upload_tasks = [
-                self._storage.upload_file(excel_data, paths["excel"]),
-                self._storage.upload_file(template_data, paths["template"])
-            ]
-            await asyncio.gather(*upload_tasks)
+    async def generate_from_objects(
+            self,
+            excel_keys: List[str],
+            template_key: Optional[str],
+            report_name: str,
+            user_id: uuid.UUID,
+            incremental: bool = False,
+            all_sheets: bool = False,
+            output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+            quality: ReportQualityEnum = ReportQualityEnum.FULL,
+            params: Optional[Dict[str, Any]] = None
+    ) -> GeneratedReport:
+        """
+        Генерирует отчет по исходным файлам, загруженным в хранилище напрямую
+        по ссылкам source_upload_urls(), минуя API
 
-            report_data = self._generate_report_content(excel_data, template_data)
+        Объекты должны лежать под префиксом загрузок пользователя. Они скачиваются
+        во временные файлы для разбора; повторно в хранилище не загружаются
+        и при ошибке генерации не удаляются, чтобы запрос можно было повторить.
 
-            await self._storage.upload_file(report_data, paths["report"])
+        Args:
+            excel_keys: Ключи выгрузок в хранилище
+            template_key: Ключ шаблона (для xlsx не нужен)
+            report_name: Название отчета
+            user_id: UUID пользователя
+            incremental, all_sheets, output_format, quality, params: как в generate_report
 
-            return await self._repo.create_report(
+        Returns:
+            GeneratedReport: Запись о сгенерированном отчете
+        """
+        if template_key is None and output_format == ReportFormatEnum.DOCX:
+            raise HTTPException(status_code=400, detail="template_key is required for docx reports")
+        keys = excel_keys + ([template_key] if template_key is not None else [])
+        prefix = f"{user_uploads_prefix(user_id)}/"
+        if not excel_keys or any(not key.startswith(prefix) or ".." in key for key in keys):
+            raise HTTPException(status_code=403, detail="Objects must be uploaded via source upload URLs")
+        infos = await asyncio.gather(*(self._storage.get_object_info(key) for key in keys))
+        missing = [key for key, info in zip(keys, infos) if info is None]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Objects not found: {', '.join(missing)}")
+
+        spooled: List[str] = []
+        try:
+            deadline = self.report_deadline(quality)
+            for key in keys:
+                spooled.append(spool_path(os.path.splitext(key)[1]))
+            await asyncio.gather(*(self._storage.download_to_file(key, path) for key, path in zip(keys, spooled)))
+
+            return await self._generate_from_sources(
+                excel_files=spooled[:len(excel_keys)],
+                template_data=spooled[len(excel_keys)] if template_key is not None else None,
                 report_name=report_name,
-                report_url=paths["report"],
-                excel_url=paths["excel"],
-                template_url=paths["template"],
-                user_id=user_id
+                user_id=user_id,
+                excel_url=excel_keys[0],
+                template_url=template_key,
+                source_urls=keys,
+                upload_prefix=f"{datetime.now().strftime('%Y/%m/%d')}/{uuid4()}",
+                deadline=deadline,
+                incremental=incremental,
+                all_sheets=all_sheets,
+                output_format=output_format,
+                quality=quality,
+                params=params
+            )
+        except TimeoutError:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Report generation exceeded the time limit for quality '{ReportQualityEnum(quality).value}'"
             )
-
         except Exception as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Report generation failed: {str(e)}"
             )
+        finally:
+            release_spooled(spooled)
 
-    async def get_user_reports(
+    async def _generate_from_sources(
             self,
+            excel_files: List[Union[bytes, str]],
+            template_data: Optional[Union[bytes, str]],
+            report_name: str,
             user_id: uuid.UUID,
-            date_from: Optional[datetime] = None,
-            date_to: Optional[datetime] = None
-    ) -> List[GeneratedReport]:
+            excel_url: str,
+            template_url: Optional[str],
+            source_urls: List[str],
+            upload_prefix: str,
+            deadline: float,
+            incremental: bool,
+            all_sheets: bool,
+            output_format: ReportFormatEnum,
+            quality: ReportQualityEnum,
+            params: Optional[Dict[str, Any]],
+            source_uploads: Optional[Awaitable] = None
+    ) -> GeneratedReport:
+        """Разбирает выгрузки (агрегаты досчитываются от предыдущей выгрузки) и генерирует отчет"""
+        data_numeric = await self.read_sources(excel_files, all_sheets, deadline)
+
+        previous_aggregates, previous_dataset = None, None
+        if incremental:
+            previous = await self._load_previous_dataset(user_id, data_numeric)
+            if previous is not None:
+                previous_aggregates, previous_dataset = previous
+
+        return await self.generate_from_dataset(
+            data_numeric=data_numeric,
+            template_data=template_data,
+            report_name=report_name,
+            user_id=user_id,
+            excel_url=excel_url,
+            template_url=template_url,
+            source_urls=source_urls,
+            upload_prefix=upload_prefix,
+            previous_aggregates=previous_aggregates,
+            previous_dataset=previous_dataset,
+            output_format=output_format,
+            quality=quality,
+            deadline=deadline,
+            params=params,
+            source_uploads=source_uploads
+        )
+
+    async def generate_from_dataset(
+            self,
+            data_numeric: pd.DataFrame,
+            template_data: Optional[bytes],
+            report_name: str,
+            user_id: uuid.UUID,
+            excel_url: str,
+            template_url: Optional[str],
+            upload_prefix: str,
+            source_urls: Optional[List[str]] = None,
+            previous_aggregates: Optional[DatasetAggregates] = None,
+            previous_dataset: Optional[DatasetManifest] = None,
+            dataset_url: Optional[str] = None,
+            dataset_hash: Optional[str] = None,
+            output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+            quality: ReportQualityEnum = ReportQualityEnum.FULL,
+            deadline: Optional[float] = None,
+            params: Optional[Dict[str, Any]] = None,
+            source_uploads: Optional[Awaitable] = None
+    ) -> GeneratedReport:
         """
-        Получает все отчеты, сгенерированные указанным пользователем
+        Генерирует отчет по уже разобранному набору данных и сохраняет его
+
+        Запись об отчете создается после того, как загружены результаты и завершились
+        загрузки исходных файлов (source_uploads). При ошибке результаты, уже
+        записанные в хранилище, удаляются; исходные файлы удаляет вызывающий код.
 
         Args:
+            data_numeric: Показания по устройствам
+            template_data: Бинарные данные шаблона (для xlsx не нужен)
+            report_name: Название отчета
             user_id: UUID пользователя
-            date_from: Начальная дата для фильтрации (опционально)
-            date_to: Конечная дата для фильтрации (опционально)
+            excel_url: Путь к исходной выгрузке в хранилище
+            template_url: Путь к шаблону в хранилище (None для отчета без шаблона)
+            upload_prefix: Префикс путей для результатов (<дата>/<id загрузки>)
+            source_urls: Пути ко всем исходным файлам в хранилище; по умолчанию excel_url и template_url
+            previous_aggregates: Агрегаты предыдущей части выгрузки (опционально)
+            previous_dataset: Сохраненный набор предыдущей части выгрузки (опционально);
+                              сохраняются и хэшируются только строки после него
+            dataset_url: Путь к уже сохраненному набору данных; если не задан,
+                         набор данных сохраняется рядом с отчетом
+            dataset_hash: Хэш уже сохраненного набора данных (вместе с dataset_url)
+            output_format: Формат отчета
+            quality: Уровень качества отчета
+            deadline: Время (time.time()), к которому генерация должна завершиться;
+                      по умолчанию - предельное время уровня качества от текущего момента
+            params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+            source_uploads: Незавершенная загрузка исходных файлов (опционально)
 
         Returns:
-            Список объектов GeneratedReport
+            GeneratedReport: Запись о сгенерированном отчете
 
         Raises:
-            HTTPException: Если произошла ошибка при получении отчетов
+            TimeoutError: Если генерация не уложилась в предельное время
         """
+        if deadline is None:
+            deadline = self.report_deadline(quality)
+
+        paths = {
+            "report": f"reports/{upload_prefix}/report.{ReportFormatEnum(output_format).value}",
+            "dataset": dataset_url or f"datasets/{upload_prefix}/dataset{DatasetManifest.SUFFIX}",
+            "aggregates": f"datasets/{upload_prefix}/aggregates.pkl"
+        }
+
+        manifest = None
+        if dataset_url is None:
+            # Новая часть набора - строки после сохраненного префикса (при досчете) или весь набор
+            prefix = previous_dataset or DatasetManifest()
+            paths["chunk"] = f"datasets/{upload_prefix}/dataset-{len(prefix.chunks)}.pkl"
+            dataset_hash = await asyncio.to_thread(
+                dataset_fingerprint, data_numeric, None, prefix.rows, prefix.dataset_hash
+            )
+            manifest = prefix.append(paths["chunk"], len(data_numeric) - prefix.rows, dataset_hash)
+        elif dataset_hash is None:
+            dataset_hash = await asyncio.to_thread(dataset_fingerprint, data_numeric)
+
+        # Устройства и их категории берутся из реестра одним запросом
+        devices, categories = {}, None
+        if self._devices is not None:
+            devices = await self._devices.resolve_devices(data_numeric.columns)
+            categories = DeviceService.categories(devices)
+
+        stored_fragments = {}
+        if output_format == ReportFormatEnum.DOCX:
+            stored_fragments = await self._load_section_fragments(
+                section_keys(dataset_hash, ReportQualityEnum(quality).value, params, categories).values()
+            )
+
+        output_paths = [paths["report"], paths["aggregates"]]
+        if manifest is not None:
+            output_paths.extend((paths["chunk"], paths["dataset"]))
+        dataset_upload = None
         try:
-            return await self._repo.get_reports_by_user_id(
+            if manifest is not None:
+                # Набор данных не зависит от результата генерации и сохраняется параллельно с ней
+                dataset_upload = asyncio.ensure_future(self._upload_dataset(
+                    data_numeric.iloc[len(data_numeric) - manifest.chunks[-1][1]:], paths["chunk"],
+                    manifest, paths["dataset"]
+                ))
+
+            # Процесс пула получает только описание набора данных и читает показания из общих файлов.
+            # Процесс сам прерывает генерацию по deadline; не прервавшийся процесс завершается
+            dataset = await asyncio.to_thread(SharedDataset.create, data_numeric)
+            try:
+                report_data, aggregates, new_fragments, summaries = await run_in_worker_until(
+                    deadline, build_report, dataset, template_data, previous_aggregates,
+                    ReportFormatEnum(output_format).value, ReportQualityEnum(quality).value, deadline,
+                    dataset_hash, stored_fragments, params=params, categories=categories
+                )
+            finally:
+                dataset.release()
+
+            upload_tasks = [
+                self._storage.upload_file(report_data, paths["report"]),
+                self._storage.upload_file(aggregates.to_bytes(), paths["aggregates"])
+            ]
+            upload_tasks.extend(
+                self._storage.upload_file(data, f"{SECTION_CACHE_PREFIX}/{key}.pkl")
+                for key, data in new_fragments.items()
+            )
+            upload_tasks.extend(task for task in (dataset_upload, source_uploads) if task is not None)
+            await self.wait_uploads(upload_tasks)
+            if new_fragments:
+                await self._prune_section_cache()
+
+            data_start = data_numeric.index.min().to_pydatetime()
+            data_end = data_numeric.index.max().to_pydatetime()
+            # Сводки по устройствам сохраняются вместе с записью об отчете
+            return await self._repo.create_report(
+                report_name=report_name,
+                report_url=paths["report"],
+                report_size=len(report_data),
+                excel_url=excel_url,
+                template_url=template_url,
+                source_urls=[url for url in source_urls or [excel_url, template_url] if url],
                 user_id=user_id,
-                date_from=date_from,
-                date_to=date_to
+                dataset_url=paths["dataset"],
+                aggregates_url=paths["aggregates"],
+                dataset_hash=dataset_hash,
+                devices_hash=devices_fingerprint(data_numeric.columns),
+                data_start=data_start,
+                data_end=data_end,
+                device_summaries=DeviceService.summary_rows(summaries, devices, user_id, data_start, data_end)
+            )
+        except BaseException:
+            # Фрагменты разделов не удаляются: это кэш, пригодный для следующих генераций
+            await self.abort_uploads(dataset_upload, output_paths)
+            raise
+
+    async def rerender_report(
+            self,
+            report: GeneratedReport,
+            report_name: str,
+            user_id: uuid.UUID,
+            template_data: Optional[Union[bytes, str]] = None,
+            output_format: ReportFormatEnum = ReportFormatEnum.DOCX,
+            quality: ReportQualityEnum = ReportQualityEnum.FULL,
+            params: Optional[Dict[str, Any]] = None
+    ) -> GeneratedReport:
+        """
+        Строит новый отчет по сохраненному набору данных существующего отчета
+
+        Исходная выгрузка не скачивается и не разбирается заново: используются
+        сохраненные набор данных и агрегаты, а разделы с неизменными параметрами
+        берутся из кэша фрагментов.
+
+        Args:
+            report: Исходный отчет с сохраненным набором данных
+            report_name: Название нового отчета
+            user_id: UUID пользователя
+            template_data: Новый шаблон (данные или путь к файлу); по умолчанию - шаблон исходного отчета
+            output_format: Формат нового отчета
+            quality: Уровень качества нового отчета
+            params: Параметры анализа (см. DEFAULT_ANALYSIS_PARAMS)
+
+        Returns:
+            GeneratedReport: Запись о новом отчете
+        """
+        try:
+            deadline = self.report_deadline(quality)
+            if report.dataset_url is None:
+                raise ValueError("Report has no stored dataset")
+
+            upload_id = str(uuid4())
+            date_prefix = datetime.now().strftime("%Y/%m/%d")
+
+            template_url = None
+            template_upload = None
+            if output_format == ReportFormatEnum.DOCX:
+                if template_data is not None:
+                    template_url = f"source/{date_prefix}/{upload_id}/template.docx"
+                    # Новый шаблон сохраняется параллельно с генерацией
+                    template_upload = asyncio.ensure_future(self._upload_source(template_data, template_url))
+                elif report.template_url is not None:
+                    template_url = report.template_url
+                    template_data = (await self._storage.download_file(template_url)).getvalue()
+                else:
+                    raise ValueError("Template is required for docx reports")
+
+            try:
+                data_numeric = await self.load_stored_dataset(report.dataset_url)
+
+                # Агрегаты исходного отчета подходят, если окно и порог аномалий не изменились
+                previous_aggregates = None
+                if report.aggregates_url is not None:
+                    stored = await self._storage.download_file(report.aggregates_url)
+                    try:
+                        previous_aggregates = DatasetAggregates.from_bytes(stored.getvalue())
+                    except ValueError:
+                        previous_aggregates = None
+
+                return await self.generate_from_dataset(
+                    data_numeric=data_numeric,
+                    template_data=template_data,
+                    report_name=report_name,
+                    user_id=user_id,
+                    excel_url=report.excel_url,
+                    template_url=template_url,
+                    source_urls=self.derived_source_urls(report, template_url),
+                    upload_prefix=f"{date_prefix}/{upload_id}",
+                    previous_aggregates=previous_aggregates,
+                    dataset_url=report.dataset_url,
+                    dataset_hash=report.dataset_hash,
+                    output_format=output_format,
+                    quality=quality,
+                    deadline=deadline,
+                    params=params,
+                    source_uploads=template_upload
+                )
+            except BaseException:
+                if template_upload is not None:
+                    await self.abort_uploads(template_upload, [template_url])
+                raise
+
+        except TimeoutError:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Report generation exceeded the time limit for quality '{ReportQualityEnum(quality).value}'"
             )
         except Exception as e:
             raise HTTPException(
                 status_code=500,
-                detail=f"Failed to get user reports: {str(e)}"
+                detail=f"Report generation failed: {str(e)}"
             )
 
-    # TODO remove
-    def _generate_report_content(self, excel_data: bytes, template_data: bytes) -> bytes:
+    @staticmethod
+    def derived_source_urls(report: GeneratedReport, template_url: Optional[str]) -> List[str]:
+        """Исходные файлы отчета, построенного по набору данных report: выгрузки report и шаблон template_url"""
+        excel_urls = [url for url in report.source_urls or [report.excel_url] if url and url != report.template_url]
+        return excel_urls + ([template_url] if template_url else [])
+
+    async def _upload_source(self, source: Union[bytes, str], object_name: str) -> None:
+        """Загружает исходный файл: бинарные данные целиком, файл по пути - потоково по частям"""
+        await upload_source(self._storage, source, object_name)
+
+    async def _upload_dataset(self, chunk: pd.DataFrame, chunk_path: str,
+                              manifest: DatasetManifest, path: str) -> None:
+        """Сохраняет новую часть набора данных и затем манифест, ссылающийся на нее"""
+        data = await asyncio.to_thread(dump_dataset, chunk)
+        await self._storage.upload_file(data, chunk_path)
+        await self._storage.upload_file(manifest.to_bytes(), path)
+
+    async def load_stored_dataset(self, dataset_url: str) -> pd.DataFrame:
+        """
+        Загружает набор данных отчета: части по манифесту параллельно
+        или набор, сохраненный одним файлом до хранения по частям
+        """
+        stored = await self._storage.download_file(dataset_url)
+        if not DatasetManifest.is_manifest(dataset_url):
+            return await asyncio.to_thread(load_dataset, stored.getvalue())
+        manifest = DatasetManifest.from_bytes(stored.getvalue())
+        chunks = await asyncio.gather(*(self._storage.download_file(key) for key, _, _ in manifest.chunks))
+        return await asyncio.to_thread(load_dataset_chunks, [chunk.getvalue() for chunk in chunks])
+
+    @staticmethod
+    async def wait_uploads(uploads: Iterable[Awaitable]) -> None:
+        """
+        Дожидается всех загрузок, даже если часть из них завершилась ошибкой,
+        и затем пробрасывает первую ошибку: после выхода ни одна загрузка
+        не может записать объект, который уже удален при очистке
+        """
+        results = await asyncio.gather(*uploads, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def abort_uploads(self, uploads: Optional[asyncio.Future], paths: Iterable[str]) -> None:
         """
-        Генерирует отчет на основе данных Excel и шаблона Word
+        Отменяет незавершенную загрузку и удаляет объекты неудачной генерации
+
+        Ошибки удаления не пробрасываются, чтобы не скрыть исходную ошибку.
 
         Args:
-            excel_data: Бинарные данные Excel файла
-            template_data: Бинарные данные шаблона Word
+            uploads: Незавершенная загрузка (future) или None
+            paths: Объекты хранилища, которые нужно удалить
+        """
+        if uploads is not None:
+            uploads.cancel()
+            await asyncio.gather(uploads, return_exceptions=True)
+        await asyncio.gather(*(self._storage.delete_file(path) for path in paths), return_exceptions=True)
+
+    async def _load_section_fragments(self, keys) -> Dict[str, bytes]:
+        """Фрагменты разделов из хранилища: {ключ: данные}; отсутствующие пропускаются"""
+        keys = list(keys)
+        results = await asyncio.gather(
+            *(self._storage.download_file(f"{SECTION_CACHE_PREFIX}/{key}.pkl") for key in keys),
+            return_exceptions=True
+        )
+        return {
+            key: result.getvalue() for key, result in zip(keys, results)
+            if not isinstance(result, BaseException)
+        }
+
+    async def _prune_section_cache(self) -> None:
+        """
+        Ограничивает объем фрагментов в хранилище settings.SECTION_CACHE_STORAGE_MB,
+        удаляя самые старые. Ошибки не прерывают генерацию: кэш лишь ускоряет ее.
+        """
+        try:
+            objects = await self._storage.list_objects(f"{SECTION_CACHE_PREFIX}/")
+            total = sum(obj["Size"] for obj in objects)
+            limit = settings.SECTION_CACHE_STORAGE_MB * 1024 * 1024
+            for obj in sorted(objects, key=lambda item: item["LastModified"]):
+                if total <= limit:
+                    break
+                await self._storage.delete_file(obj["Key"])
+                total -= obj["Size"]
+        except RuntimeError:
+            pass
+
+    @staticmethod
+    def report_deadline(quality: ReportQualityEnum) -> float:
+        """Время (time.time()), к которому должна завершиться генерация отчета уровня quality"""
+        return time.time() + REPORT_TIMEOUTS[ReportQualityEnum(quality)]
+
+    async def read_sources(
+            self,
+            excel_files: List[Union[bytes, str]],
+            all_sheets: bool,
+            deadline: float
+    ) -> pd.DataFrame:
+        """
+        Разбирает выгрузки параллельно в пуле процессов и объединяет их
+
+        Args:
+            excel_files: Бинарные данные Excel файлов или пути к ним
+            all_sheets: Читать все листы с показаниями, а не только основной
+            deadline: Время (time.time()), к которому разбор должен завершиться
 
         Returns:
-            bytes: Бинарные данные сгенерированного отчета
+            pd.DataFrame: Объединенные показания по устройствам
+
+        Raises:
+            TimeoutError: Если разбор не уложился в предельное время
         """
-        import pandas as pd
-        import matplotlib.pyplot as plt
-        from docxtpl import DocxTemplate, InlineImage
-        from docx.shared import Mm
-        import io
-        import numpy as np
-        from sklearn.cluster import KMeans
-
-        # Загрузка данных из бинарных объектов
-        excel_buffer = io.BytesIO(excel_data)
-        template_buffer = io.BytesIO(template_data)
-
-        # === 1. Загрузка и подготовка данных ===
-        data = pd.read_excel(
-            excel_buffer,
-            sheet_name="2025-04-01-00-00-00-e",
-            skiprows=1
-        )
+        if all_sheets:
+            # Ошибка одного файла выдается после завершения всех: процессы пула освобождены
+            sheet_lists = await asyncio.gather(
+                *(run_in_worker_until(deadline, list_data_sheets, data) for data in excel_files),
+                return_exceptions=True
+            )
+            for result in sheet_lists:
+                if isinstance(result, BaseException):
+                    raise result
+            jobs = [(data, sheet) for data, sheets in zip(excel_files, sheet_lists) for sheet in sheets]
+        else:
+            jobs = [(data, None) for data in excel_files]
 
-        # Загружаем шаблон Word из байтового потока
-        doc = DocxTemplate(template_buffer)
+        if not jobs:
+            raise ValueError("No sheets with meter readings found")
 
-        # Очистка заголовков и объединение даты и времени
-        data.columns = data.columns.astype(str).str.strip()
-        data['DateTime'] = pd.to_datetime(
-            data['Дата'].astype(str) + ' ' + data['Время'].astype(str),
-            dayfirst=True
+        # Процессы пула возвращают описания наборов в общих файлах, а не сами DataFrame
+        results = await asyncio.gather(
+            *(run_in_worker_until(deadline, read_shared_dataset, data, sheet) for data, sheet in jobs),
+            return_exceptions=True
         )
-        data.set_index('DateTime', inplace=True)
-
-        # Оставляем только числовые значения
-        data_numeric = data.drop(columns=['Дата', 'Время']).apply(pd.to_numeric, errors='coerce')
-        time_delta = (data_numeric.index[1] - data_numeric.index[0]).total_seconds() / 3600
-        total_hours = (data_numeric.index.max() - data_numeric.index.min()).total_seconds() / 3600
-
-        # Ресемплируем по дням для анализа
-        daily_data = data_numeric.resample('D').sum()
-
-        # Создаем словарь контекста для шаблона
-        context = {}
-
-        # Добавляем базовую информацию в контекст
-        start_date = daily_data.index.min().strftime('%d.%m.%Y')
-        end_date = daily_data.index.max().strftime('%d.%m.%Y')
-        context['start_date'] = start_date
-        context['end_date'] = end_date
-        context['report_title'] = f'Отчет о потреблении электроэнергии за период с {start_date} по {end_date}'
-
-        # === РАЗДЕЛ 1: ОБЩИЙ АНАЛИЗ ПОТРЕБЛЕНИЯ ===
-        # График 1: Все устройства
-        plt.figure(figsize=(14, 8))
-        for column in daily_data.columns:
-            plt.plot(daily_data.index, daily_data[column], label=column)
-
-        plt.title('Суточное потребление электроэнергии (все устройства)')
-        plt.xlabel('Дата')
-        plt.ylabel('Потребление (кВт·ч)')
-        plt.grid(True)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.tight_layout()
-        plt.subplots_adjust(right=0.75)
-
-        buf1 = io.BytesIO()
-        plt.savefig(buf1, format='png', dpi=300)
-        buf1.seek(0)
-        plt.close()
-
-        context['graph_all_devices'] = InlineImage(doc, buf1, width=Mm(150))
-        context['graph1_caption'] = 'Рисунок 1. Суточное потребление всех устройств.'
-
-        # График 2: Топ-10 потребителей
-        total_consumption = daily_data.sum().sort_values(ascending=False)
-        top10 = total_consumption.head(10).index
-
-        plt.figure(figsize=(12, 5))
-        for column in top10:
-            plt.plot(daily_data.index, daily_data[column], label=column)
-
-        plt.title('Суточное потребление: Топ-10 устройств')
-        plt.xlabel('Дата')
-        plt.ylabel('Потребление (кВт·ч)')
-        plt.grid(True)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.tight_layout()
-        plt.subplots_adjust(right=0.75)
-
-        buf2 = io.BytesIO()
-        plt.savefig(buf2, format='png', dpi=300)
-        buf2.seek(0)
-        plt.close()
-
-        context['graph_top10'] = InlineImage(doc, buf2, width=Mm(150))
-        context['graph2_caption'] = 'Рисунок 2. Топ-10 потребителей электроэнергии.'
-
-        # Данные для таблицы топ-10 потребителей
-        top10_data = []
-        for name, value in total_consumption.head(10).items():
-            top10_data.append({'device': name, 'consumption': f"{value:.2f}"})
-        context['top10_consumers'] = top10_data
-
-        # Автоматическая агрегация по категориям
-        def classify_meters(column_names):
-            """Классифицирует счетчики по типам на основе их названий"""
-            categories = {
-                'PzS_12V': [],
-                'China': [],
-                'SM': [],
-                'MO': [],
-                'BG': [],
-                'DIG': [],
-                'CP-300': [],
-                'Other': []
-            }
-
-            for col in column_names:
-                col_lower = col.lower()
-
-                if 'pzs' in col_lower and '12v' in col_lower:
-                    categories['PzS_12V'].append(col)
-                elif 'china' in col_lower:
-                    categories['China'].append(col)
-                elif ' sm' in col_lower or 'sm ' in col_lower:
-                    categories['SM'].append(col)
-                elif ' mo' in col_lower or 'mo ' in col_lower:
-                    categories['MO'].append(col)
-                elif ' bg' in col_lower or 'bg ' in col_lower:
-                    categories['BG'].append(col)
-                elif 'dig' in col_lower:
-                    categories['DIG'].append(col)
-                elif 'cp-300' in col_lower:
-                    categories['CP-300'].append(col)
-                else:
-                    categories['Other'].append(col)
-
-            # Удаляем пустые категории
-            return {k: v for k, v in categories.items() if v}
-
-        # Получаем классификацию счетчиков
-        meter_categories = classify_meters(daily_data.columns)
-
-        # Создаем DataFrame с агрегированными данными
-        category_data = pd.DataFrame()
-        for category, cols in meter_categories.items():
-            category_data[category] = daily_data[cols].sum(axis=1)
-
-        # Строим график категорий
-        plt.figure(figsize=(12, 6))
-        for column in category_data.columns:
-            plt.plot(category_data.index, category_data[column], label=column)
-
-        plt.title('Суточное потребление по автоматически определенным категориям оборудования')
-        plt.xlabel('Дата')
-        plt.ylabel('Потребление (кВт·ч)')
-        plt.grid(True)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.tight_layout()
-
-        buf3 = io.BytesIO()
-        plt.savefig(buf3, format='png', dpi=300, bbox_inches='tight')
-        buf3.seek(0)
-        plt.close()
-
-        context['graph_categories'] = InlineImage(doc, buf3, width=Mm(150))
-        context['graph3_caption'] = 'Рисунок 3. Суммарное потребление по категориям оборудования.'
-
-        # Добавляем информацию о категориях
-        categories_info = []
-        for category, cols in meter_categories.items():
-            categories_info.append({'category': category, 'count': len(cols)})
-        context['categories_info'] = categories_info
-
-        # === РАЗДЕЛ 2: АНАЛИЗ ВРЕМЕННЫХ ЗАКОНОМЕРНОСТЕЙ ===
-        # Суточные колебания (анализ по часам)
-        hourly_data = data_numeric.resample('h').mean()
-        typical_day = hourly_data.groupby(hourly_data.index.hour).mean()
-
-        plt.figure(figsize=(14, 7))
-        for column in top10:
-            plt.plot(typical_day.index, typical_day[column], label=column)
-
-        plt.title('Среднее потребление по часам суток (Топ-10 устройств)')
-        plt.xlabel('Час дня')
-        plt.ylabel('Среднее потребление (кВт·ч)')
-        plt.xticks(np.arange(0, 24, 1))
-        plt.grid(True)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.tight_layout()
-
-        buf4 = io.BytesIO()
-        plt.savefig(buf4, format='png', dpi=300)
-        buf4.seek(0)
-        plt.close()
-
-        context['graph_hourly'] = InlineImage(doc, buf4, width=Mm(150))
-        context['graph4_caption'] = 'Рисунок 4. Среднее потребление по часам суток для топ-10 устройств.'
-
-        # Анализ пикового потребления
-        peak_hours = typical_day.sum(axis=1)
-        peak_hour = peak_hours.idxmax()
-        context['peak_hour'] = peak_hour
-        context['peak_hour_next'] = peak_hour + 1
-        context['peak_consumption'] = f"{peak_hours.max():.2f}"
-
-        # График полных и неполных дней
-        if len(daily_data) >= 2:
-            daily_total = daily_data.sum(axis=1)
-            daily_total.index = pd.to_datetime(daily_total.index)
-
-            timestamps_per_day = data_numeric.groupby(data_numeric.index.date).apply(lambda x: x.index)
-            counts_per_day = timestamps_per_day.apply(len)
-            max_intervals_per_day = counts_per_day.max()
-            threshold = int(max_intervals_per_day * 0.95)
-
-            full_days = counts_per_day[counts_per_day >= threshold].index
-            partial_days = counts_per_day[counts_per_day < threshold].index
-
-            index_dates = pd.Series(daily_total.index.date, index=daily_total.index)
-
-            combined = pd.DataFrame(index=daily_total.index)
-            combined['Полные дни'] = daily_total.where(index_dates.isin(full_days))
-            combined['Неполные дни'] = daily_total.where(index_dates.isin(partial_days))
-
-            combined.index = combined.index.strftime('%Y-%m-%d')
-
-            plt.figure(figsize=(14, 8))
-            combined.plot(kind='bar', stacked=False, color=['green', 'red'])
-
-            plt.title('Суммарное потребление электроэнергии по дням')
-            plt.xlabel('Дата')
-            plt.ylabel('Потребление (кВт·ч)')
-            plt.xticks(rotation=45)
-            plt.grid(True)
-            plt.tight_layout()
-
-            buf5 = io.BytesIO()
-            plt.savefig(buf5, format='png', dpi=300)
-            buf5.seek(0)
-            plt.close()
-
-            context['graph_daily'] = InlineImage(doc, buf5, width=Mm(150))
-            context['graph5_caption'] = 'Рисунок 5. Суммарное потребление по дням.'
-
-        # === РАЗДЕЛ 3: АНАЛИЗ АНОМАЛИЙ ПОТРЕБЛЕНИЯ ===
-        # Параметры анализа
-        sigma_threshold = 2  # Пороговое значение σ для определения аномалий
-        window_size = 24  # Размер окна для скользящего среднего (в часах)
-        top_n = 10  # Количество топовых счетчиков для отображения
-
-        context['sigma_threshold'] = sigma_threshold
-        context['window_size'] = window_size
-        context['top_n'] = top_n
-
-        # Функция для анализа аномалий
-        def analyze_anomalies(device_name, data_series, window=24, sigma=2):
-            rolling_mean = data_series.rolling(window=window).mean()
-            rolling_std = data_series.rolling(window=window).std()
-
-            anomalies_mask = (data_series > rolling_mean + sigma * rolling_std) | \
-                             (data_series < rolling_mean - sigma * rolling_std)
-            anomalies = data_series[anomalies_mask]
-
-            if not anomalies.empty:
-                deviations = np.abs(anomalies - rolling_mean[anomalies.index])
-                return {
-                    'count': len(anomalies),
-                    'max_deviation': deviations.max(),
-                    'mean_deviation': deviations.mean(),
-                    'total_deviation': deviations.sum(),
-                    'anomaly_points': anomalies
-                }
+        datasets = [result for result in results if isinstance(result, SharedDataset)]
+        try:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            return await asyncio.to_thread(merge_datasets, [dataset.open() for dataset in datasets])
+        finally:
+            for dataset in datasets:
+                dataset.release()
+
+    async def _load_previous_dataset(
+            self,
+            user_id: uuid.UUID,
+            data_numeric: pd.DataFrame
+    ) -> Optional[Tuple[DatasetAggregates, DatasetManifest]]:
+        """
+        Ищет ранее загруженную выгрузку, продолжением которой является data_numeric
+
+        Returns:
+            Агрегаты и состав сохраненного набора предыдущей выгрузки или None, если подходящей нет
+        """
+        previous = await self._repo.get_latest_dataset_report(
+            user_id=user_id,
+            devices_hash=devices_fingerprint(data_numeric.columns),
+            data_start=data_numeric.index.min().to_pydatetime()
+        )
+        if previous is None or previous.dataset_url is None or previous.data_end >= data_numeric.index.max():
             return None
 
-        # Анализ всех счетчиков
-        all_anomalies = []
-        for device in data_numeric.columns:
-            result = analyze_anomalies(device, data_numeric[device].dropna(),
-                                       window=window_size, sigma=sigma_threshold)
-            if result:
-                all_anomalies.append({
-                    'Устройство': device,
-                    'Кол-во аномалий': result['count'],
-                    'Макс. отклонение (кВт·ч)': result['max_deviation'],
-                    'Среднее отклонение (кВт·ч)': result['mean_deviation'],
-                    'Суммарное отклонение (кВт·ч)': result['total_deviation']
-                })
-
-        # Таблица с результатами по аномалиям
-        anomalies_df = pd.DataFrame(all_anomalies)
-        if not anomalies_df.empty:
-            anomalies_df = anomalies_df.sort_values('Суммарное отклонение (кВт·ч)', ascending=False)
-            top_anomalies = anomalies_df.head(top_n)
-
-            # Подготавливаем данные для шаблона
-            anomalies_data = []
-            for _, row in top_anomalies.iterrows():
-                anomalies_data.append({
-                    'device': row['Устройство'],
-                    'count': row['Кол-во аномалий'],
-                    'max_dev': f"{row['Макс. отклонение (кВт·ч)']:.2f}",
-                    'mean_dev': f"{row['Среднее отклонение (кВт·ч)']:.2f}",
-                    'total_dev': f"{row['Суммарное отклонение (кВт·ч)']:.2f}"
-                })
-            context['anomalies_data'] = anomalies_data
-            context['has_anomalies'] = True
-
-            # Визуализация для топ-3 счетчиков с аномалиями
-            anomalies_graphs = []
-            for i, (_, row) in enumerate(top_anomalies.head(3).iterrows(), 1):
-                device = row['Устройство']
-                device_data = data_numeric[device].dropna()
-
-                rolling_mean = device_data.rolling(window=window_size).mean()
-                rolling_std = device_data.rolling(window=window_size).std()
-                anomalies = device_data[(device_data > rolling_mean + sigma_threshold * rolling_std) |
-                                        (device_data < rolling_mean - sigma_threshold * rolling_std)]
-
-                plt.figure(figsize=(14, 4))
-                plt.plot(device_data.index, device_data, label='Потребление', color='blue', alpha=0.6)
-                plt.plot(rolling_mean.index, rolling_mean, label='Скользящее среднее', color='red')
-                plt.scatter(anomalies.index, anomalies, color='red', s=20, label='Аномалии')
-                plt.fill_between(rolling_mean.index,
-                                 rolling_mean - sigma_threshold * rolling_std,
-                                 rolling_mean + sigma_threshold * rolling_std,
-                                 color='gray', alpha=0.2, label=f'±{sigma_threshold}σ')
-                plt.title(f'Аномалии потребления для {device}')
-                plt.xlabel('Дата и время')
-                plt.ylabel('Потребление (кВт·ч)')
-                plt.legend()
-                plt.grid(True)
-
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-                buf.seek(0)
-                plt.close()
-
-                anomalies_graphs.append({
-                    'image': InlineImage(doc, buf, width=Mm(150)),
-                    'device': device,
-                    'position': i,
-                    'caption': f'Рисунок {6 + i - 1}. Аномалии потребления для {device} (топ-{i}).'
-                })
-            context['anomalies_graphs'] = anomalies_graphs
-
-            # Миниатюры для топ-10 счетчиков с аномалиями
-            plt.figure(figsize=(14, 12))
-            for i, (_, row) in enumerate(top_anomalies.iterrows(), 1):
-                device = row['Устройство']
-                device_data = data_numeric[device].dropna()
-                rolling_mean = device_data.rolling(window=window_size).mean()
-                rolling_std = device_data.rolling(window=window_size).std()
-
-                plt.subplot(5, 2, i)
-                plt.plot(device_data.index, device_data, color='blue', alpha=0.6, linewidth=0.8)
-                plt.plot(rolling_mean.index, rolling_mean, color='red', linewidth=0.8)
-                anomalies = device_data[(device_data > rolling_mean + sigma_threshold * rolling_std) |
-                                        (device_data < rolling_mean - sigma_threshold * rolling_std)]
-                plt.scatter(anomalies.index, anomalies, color='red', s=10)
-                plt.title(f"{device}\nАномалий: {row['Кол-во аномалий']}", fontsize=8)
-                plt.grid(True, alpha=0.3)
-                plt.xticks(fontsize=6)
-                plt.yticks(fontsize=6)
-
-            plt.tight_layout()
-
-            buf_final = io.BytesIO()
-            plt.savefig(buf_final, format='png', dpi=300, bbox_inches='tight')
-            buf_final.seek(0)
-            plt.close()
-
-            context['anomalies_miniatures'] = InlineImage(doc, buf_final, width=Mm(150))
-            context[
-                'anomalies_miniatures_caption'] = f'Рисунок {6 + 3}. Аномалии потребления для топ-{top_n} счетчиков.'
-
-            # Выводы по аномалиям
-            top3_anomalies = []
-            for i, (_, row) in enumerate(top_anomalies.head(3).iterrows(), 1):
-                top3_anomalies.append({
-                    'position': i,
-                    'device': row['Устройство'],
-                    'count': row['Кол-во аномалий'],
-                    'max_dev': f"{row['Макс. отклонение (кВт·ч)']:.2f}",
-                    'total_dev': f"{row['Суммарное отклонение (кВт·ч)']:.2f}"
-                })
-            context['top3_anomalies'] = top3_anomalies
+        prefix_rows = int(data_numeric.index.searchsorted(pd.Timestamp(previous.data_end), side="right"))
+        if DatasetManifest.is_manifest(previous.dataset_url):
+            stored = await self._storage.download_file(previous.dataset_url)
+            manifest = DatasetManifest.from_bytes(stored.getvalue())
         else:
-            context['has_anomalies'] = False
-
-        # === РАЗДЕЛ 4: АНАЛИЗ ВЫКЛЮЧЕННОГО ОБОРУДОВАНИЯ ===
-        # 4.1 Статистика выключенного оборудования (значение = 0)
-        idle_mask = data_numeric == 0
-        idle_counts = idle_mask.sum()
-        idle_hours = idle_counts * time_delta
-        idle_perc = idle_hours / total_hours * 100
-        idle_stats = pd.DataFrame({'часов_выключено': idle_hours, 'процент_выключено': idle_perc})
-        idle_stats.sort_values('часов_выключено', ascending=False, inplace=True)
-
-        # Данные для таблицы топ-15 устройств по времени отключения
-        idle_devices = []
-        for device, row in idle_stats.head(15).iterrows():
-            idle_devices.append({
-                'device': device,
-                'hours': f"{row['часов_выключено']:.2f}",
-                'percentage': f"{row['процент_выключено']:.1f}"
-            })
-        context['idle_devices'] = idle_devices
-
-        # График времени отключения топ-10
-        plt.figure(figsize=(12, 6))
-        idle_top10 = idle_stats.head(10)
-        plt.bar(idle_top10.index, idle_top10['часов_выключено'], color='skyblue')
-        plt.title('Топ-10 устройств по времени отключения')
-        plt.xlabel('Устройство')
-        plt.ylabel('Часов отключено')
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.tight_layout()
-
-        buf_idle = io.BytesIO()
-        plt.savefig(buf_idle, format='png', dpi=300, bbox_inches='tight')
-        buf_idle.seek(0)
-        plt.close()
-
-        context['graph_idle'] = InlineImage(doc, buf_idle, width=Mm(150))
-        context['graph_idle_caption'] = 'Рисунок 10. Топ-10 устройств по времени отключения.'
-
-        # === 4.2. МЕТОДЫ ОПРЕДЕЛЕНИЯ НЕДОИСПОЛЬЗОВАНИЯ ОБОРУДОВАНИЯ ===
-        # Функция для расчета недоиспользования
-        def compute_underutilization(method='fixed_pct', param=0.2):
-            """
-            method:
-              'fixed_pct' - фиксированный процент от среднего (param = доля, например 0.2)
-              'percentile' - порог на основе k-го перцентиля (param = перцентиль, 5 = 5%)
-              'std_dev' - порог = среднее - param * std (param = множитель)
-              'kmeans' - кластеризация на 2 группы, низкое/высокое
-            """
-            if method == 'fixed_pct':
-                mean_cons = data_numeric.mean()
-                thresh = mean_cons * param
-                mask = data_numeric.lt(thresh)
-
-            elif method == 'percentile':
-                thresh = data_numeric.quantile(param / 100)
-                mask = data_numeric.lt(thresh)
-
-            elif method == 'std_dev':
-                mean_cons = data_numeric.mean()
-                std_cons = data_numeric.std()
-                thresh = mean_cons - param * std_cons
-                thresh = thresh.clip(lower=0)  # Предотвращаем отрицательные пороги
-                mask = data_numeric.lt(thresh)
-
-            elif method == 'kmeans':
-                # Для каждого устройства: кластеризация значений на два кластера
-                mask = pd.DataFrame(index=data_numeric.index, columns=data_numeric.columns)
-                for col in data_numeric:
-                    vals = data_numeric[[col]].dropna().values
-                    if len(vals) > 1:  # Проверка на достаточное количество данных
-                        vals = vals.reshape(-1, 1)
-                        kmeans = KMeans(n_clusters=2, random_state=42).fit(vals)
-                        # кластеры, отсортированные по центру
-                        centers = sorted([(c, i) for i, c in enumerate(kmeans.cluster_centers_.flatten())])
-                        low_label = centers[0][1]
-                        labels = pd.Series(kmeans.labels_, index=data_numeric.dropna().index)
-                        mask[col] = labels.map(lambda x: x == low_label)
-                    else:
-                        mask[col] = False
-                thresh = None
+            # Набор, сохраненный одним файлом, становится первой частью нового набора
+            manifest = DatasetManifest([(previous.dataset_url, prefix_rows, previous.dataset_hash)])
 
-            else:
-                raise ValueError('Unknown method')
-
-            counts = mask.sum()
-            hours = counts * time_delta
-            perc = hours / total_hours * 100
-            stats = pd.DataFrame({
-                'часов_недоиспользования': hours,
-                'процент_недоиспользования': perc,
-                'метод': method
-            }).sort_values('часов_недоиспользования', ascending=False)
-            return stats, thresh
-
-        # Применяем разные методы
-        methods = ['fixed_pct', 'percentile', 'std_dev', 'kmeans']
-        params = {'fixed_pct': 0.2, 'percentile': 5, 'std_dev': 1, 'kmeans': None}
-        results = {}
-        methods_data = []
-
-        for m in methods:
-            stats, thresh = compute_underutilization(method=m, param=params[m])
-            results[m] = {'stats': stats, 'threshold': thresh}
-
-            # Подготовка данных для шаблона
-            method_top5 = []
-            for device, row in stats.head(5).iterrows():
-                method_top5.append({
-                    'device': device,
-                    'hours': f"{row['часов_недоиспользования']:.2f}",
-                    'percentage': f"{row['процент_недоиспользования']:.1f}"
-                })
-
-            method_info = {
-                'name': m,
-                'top5': method_top5,
-                'has_threshold': thresh is not None,
-                'is_series': isinstance(thresh, pd.Series) if thresh is not None else False
-            }
-            methods_data.append(method_info)
-
-        context['methods_data'] = methods_data
-
-        # Выбираем "наилучший" метод для визуализации
-        best_method = 'percentile'
-        underutil_stats = results[best_method]['stats']
-
-        # График недоиспользования для топ-10 устройств по выбранному методу
-        plt.figure(figsize=(12, 6))
-        underutil_top10 = underutil_stats.head(10)
-        plt.bar(underutil_top10.index, underutil_top10['часов_недоиспользования'], color='salmon')
-        plt.title(f'Топ-10 недоиспользуемых устройств (метод {best_method})')
-        plt.xlabel('Устройство')
-        plt.ylabel('Часов недоиспользования')
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.tight_layout()
-
-        buf_underutil = io.BytesIO()
-        plt.savefig(buf_underutil, format='png', dpi=300, bbox_inches='tight')
-        buf_underutil.seek(0)
-        plt.close()
-
-        context['graph_underutil'] = InlineImage(doc, buf_underutil, width=Mm(150))
-        context['graph_underutil_caption'] = f'Рисунок 11. Топ-10 устройств по недоиспользованию (метод {best_method}).'
-        context['best_method'] = best_method
-
-        # Визуализация использования топ-3 недоиспользуемых устройств
-        top3_devices = underutil_stats.head(3).index
-        underutil_graphs = []
-
-        for i, device in enumerate(top3_devices, 1):
-            device_data = data_numeric[device].dropna()
-
-            if best_method == 'fixed_pct':
-                threshold = results[best_method]['threshold'][device]
-            elif best_method == 'percentile':
-                threshold = results[best_method]['threshold'][device]
-            elif best_method == 'std_dev':
-                threshold = results[best_method]['threshold'][device]
-            else:  # kmeans
-                threshold = None
-
-            plt.figure(figsize=(14, 4))
-            plt.plot(device_data.index, device_data, label='Потребление', color='blue', alpha=0.7)
-
-            if threshold is not None:
-                plt.axhline(y=threshold, color='red', linestyle='--', label=f'Порог недоиспользования')
-                # Выделяем периоды недоиспользования
-                underutil_mask = device_data < threshold
-                underutil_points = device_data[underutil_mask]
-                plt.scatter(underutil_points.index, underutil_points, color='red', s=15, alpha=0.5)
-                plt.title(f'Анализ недоиспользования для {device}')
-                plt.xlabel('Дата и время')
-                plt.ylabel('Потребление (кВт·ч)')
-                plt.grid(True)
-                plt.legend()
-                plt.tight_layout()
-
-                buf_device = io.BytesIO()
-                plt.savefig(buf_device, format='png', dpi=300, bbox_inches='tight')
-                buf_device.seek(0)
-                plt.close()
-
-                underutil_graphs.append({
-                    'image': InlineImage(doc, buf_device, width=Mm(150)),
-                    'caption': f'Рисунок {12 + i - 1}. Анализ недоиспользования для {device} (топ-{i}).',
-                    'device': device,
-                    'rank': i
-                })
-
-            context['underutil_graphs'] = underutil_graphs
-            context['top3_underutil_devices'] = list(top3_devices)
-
-            # === РАЗДЕЛ 5: ВЫВОДЫ И РЕКОМЕНДАЦИИ ===
-            # Добавляем выводы в контекст
-            context['top3_consumers'] = list(total_consumption.head(3).index)
-            context['top3_idle_devices'] = list(idle_stats.head(3).index)
-            context['top3_underutil'] = list(underutil_stats.head(3).index)
-
-            if not anomalies_df.empty:
-                context['has_significant_anomalies'] = True
-                context['top3_anomaly_devices'] = list(anomalies_df.head(3)['Устройство'])
-            else:
-                context['has_significant_anomalies'] = False
+        # Новая выгрузка должна содержать старую как префикс без изменений
+        if manifest.rows != prefix_rows or manifest.dataset_hash != previous.dataset_hash:
+            return None
+        if not await asyncio.to_thread(manifest.matches_prefix, data_numeric):
+            return None
 
-            # Рендеринг шаблона
-            doc.render(context)
+        stored = await self._storage.download_file(previous.aggregates_url)
+        try:
+            return DatasetAggregates.from_bytes(stored.getvalue()), manifest
+        except ValueError:
+            # Агрегаты старого формата пересчитываются заново
+            return None
 
-            # Сохранение документа в байтовый поток
-            output = io.BytesIO()
-            doc.save(output)
-            output.seek(0)
+    async def get_user_reports(
+            self,
+            user_id: uuid.UUID,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None
+    ) -> List[GeneratedReport]:
+        """
+        Получает все отчеты, сгенерированные указанным пользователем
 
-            return output.getvalue()
\ No newline at end of file
+        Args:
+            user_id: UUID пользователя
+            date_from: Начальная дата для фильтрации (опционально)
+            date_to: Конечная дата для фильтрации (опционально)
+
+        Returns:
+            Список объектов GeneratedReport
+
+        Raises:
+            HTTPException: Если произошла ошибка при получении отчетов
+        """
+        try:
+            return await self._repo.get_reports_by_user_id(
+                user_id=user_id,
+                date_from=date_from,
+                date_to=date_to
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to get user reports: {str(e)}"
+            )
@@ -1,23 +1,97 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
 from fastapi import HTTPException
 
+from main_server.db.config import settings
 from main_server.db.repositories import S3StorageRepository
+from main_server.services.report_service import user_uploads_prefix
+
+
+class PresignedUrlCache:
+    """
+    Cache of presigned download URLs.
+
+    A URL is handed out again while at least min_remaining_share of its
+    lifetime is left, so clients always get a URL that stays valid long enough.
+    The oldest URLs are dropped when the cache is full.
+    """
+
+    def __init__(self, max_size: int, min_remaining_share: float):
+        self.max_size = max_size
+        self.min_remaining_share = min_remaining_share
+        # {(object key, expiration): (url, expires at)}
+        self._items: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+
+    def get(self, object_key: str, expiration: int) -> Optional[Tuple[str, float]]:
+        item = self._items.get((object_key, expiration))
+        if item is None:
+            return None
+        if item[1] - time.time() < expiration * self.min_remaining_share:
+            del self._items[(object_key, expiration)]
+            return None
+        return item
+
+    def put(self, object_key: str, expiration: int, url: str, expires_at: float) -> None:
+        self._items[(object_key, expiration)] = (url, expires_at)
+        self._items.move_to_end((object_key, expiration))
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+_url_cache: Optional[PresignedUrlCache] = None
+
+
+def get_presigned_url_cache() -> PresignedUrlCache:
+    """Process-wide presigned URL cache"""
+    global _url_cache
+    if _url_cache is None:
+        _url_cache = PresignedUrlCache(settings.PRESIGNED_URL_CACHE_SIZE, settings.PRESIGNED_URL_MIN_REMAINING_SHARE)
+    return _url_cache
 
 
 class S3UrlGenerateService:
-    def __init__(self, storage_repo: S3StorageRepository):
+    def __init__(self, storage_repo: S3StorageRepository, url_cache: Optional[PresignedUrlCache] = None):
         self._storage = storage_repo
+        self._url_cache = url_cache or get_presigned_url_cache()
 
     async def generate_download_url(self, object_key: str, expiration: int = 3600) -> str:
         """
         Generate a temporary download URL for an S3 object.
         """
+        url, _ = await self._download_url(object_key, expiration)
+        return url
+
+    async def generate_download_urls(self, object_keys: Iterable[str], expiration: int = 3600) -> List[Dict[str, Any]]:
+        """
+        Generate temporary download URLs for several S3 objects.
+
+        URLs are signed locally (no storage round trip); still valid URLs are reused.
+
+        Returns:
+            Items with key, url and expires_at (unix time)
+        """
+        keys = list(dict.fromkeys(object_keys))
+        results = await asyncio.gather(*(self._download_url(key, expiration) for key in keys))
+        return [{"key": key, "url": url, "expires_at": expires_at} for key, (url, expires_at) in zip(keys, results)]
+
+    async def _download_url(self, object_key: str, expiration: int) -> Tuple[str, float]:
+        cached = self._url_cache.get(object_key, expiration)
+        if cached is not None:
+            return cached
+        expires_at = time.time() + expiration
         try:
-            return await self._storage.generate_presigned_url(object_key, expiration)
+            url = await self._storage.generate_presigned_url(object_key, expiration)
         except Exception as exc:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to generate presigned download URL: {exc}"
             )
+        self._url_cache.put(object_key, expiration, url, expires_at)
+        return url, expires_at
 
     async def generate_upload_url(self, object_key: str, expiration: int = 3600) -> str:
         """
@@ -30,3 +104,31 @@ class S3UrlGenerateService:
                 status_code=500,
                 detail=f"Failed to generate presigned upload URL: {exc}"
             )
+
+
+    async def generate_source_upload_urls(
+            self,
+            user_id: uuid.UUID,
+            excel_count: int,
+            with_template: bool,
+            expiration: int = 3600
+    ) -> Dict[str, Any]:
+        """
+        Generate presigned PUT URLs for report sources uploaded directly to storage.
+
+        Object keys are chosen by the server under the user's upload prefix,
+        so they can be passed to report generation from object keys.
+        """
+        upload_id = uuid.uuid4()
+        prefix = f"{user_uploads_prefix(user_id)}/{upload_id}"
+        excel_keys = [f"{prefix}/data_{i}.xlsx" for i in range(excel_count)]
+        template_key = f"{prefix}/template.docx" if with_template else None
+        keys = excel_keys + ([template_key] if template_key is not None else [])
+        urls = await asyncio.gather(*(self.generate_upload_url(key, expiration) for key in keys))
+        files = [{"key": key, "url": url} for key, url in zip(keys, urls)]
+        return {
+            "upload_id": upload_id,
+            "excel_files": files[:excel_count],
+            "template_file": files[excel_count] if with_template else None,
+            "expires_in": expiration,
+        }
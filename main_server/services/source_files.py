@@ -0,0 +1,88 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import Iterable, Optional, Union
+
+import aiofiles
+
+from main_server.db.config import settings
+
+# Размер части при копировании загруженных файлов
+SPOOL_CHUNK_SIZE = 1024 * 1024
+SPOOL_PREFIX = 'upload-'
+
+
+def uploads_dir() -> str:
+    """Каталог исходных файлов запросов, ожидающих разбора"""
+    return os.path.join(settings.TEMP_FILES_DIR, 'uploads')
+
+
+def spool_path(suffix: str = '') -> str:
+    """Создает пустой временный файл для исходного файла; удаляется через release_spooled()"""
+    directory = uploads_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
+
+
+async def spool_upload(upload, suffix: str = '') -> str:
+    """
+    Копирует загруженный файл по частям во временный файл под TEMP_FILES_DIR
+
+    Файл целиком в память не читается; процессы пула разбирают его по пути,
+    а в хранилище он загружается потоково (S3StorageRepository.upload_stream).
+
+    Args:
+        upload: Загруженный файл (UploadFile или объект с асинхронным read(size))
+        suffix: Расширение временного файла
+
+    Returns:
+        str: Путь к временному файлу; удаляется через release_spooled()
+    """
+    path = spool_path(suffix)
+    try:
+        async with aiofiles.open(path, 'wb') as spool:
+            while chunk := await upload.read(SPOOL_CHUNK_SIZE):
+                await spool.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+async def upload_source(storage, source: Union[bytes, str], object_name: str) -> None:
+    """
+    Загружает исходный файл в хранилище: бинарные данные целиком,
+    файл по пути (например, из spool_upload) - потоково по частям
+
+    Args:
+        storage: Репозиторий хранилища (S3StorageRepository)
+        source: Бинарные данные или путь к файлу
+        object_name: Ключ объекта в хранилище
+    """
+    if isinstance(source, bytes):
+        await storage.upload_file(source, object_name)
+        return
+    with open(source, 'rb') as file:
+        await storage.upload_stream(lambda size: asyncio.to_thread(file.read, size), object_name)
+
+
+def release_spooled(paths: Iterable[Optional[str]]) -> None:
+    """Удаляет временные файлы spool_upload()"""
+    for path in paths:
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+
+def cleanup_spooled_uploads(max_age_seconds: float) -> None:
+    """Удаляет временные файлы старше max_age_seconds, оставшиеся после прерванных запросов"""
+    directory = uploads_dir()
+    if not os.path.isdir(directory):
+        return
+    expire_before = time.time() - max_age_seconds
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(SPOOL_PREFIX) and os.path.getmtime(path) < expire_before:
+            os.remove(path)
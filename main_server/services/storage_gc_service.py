@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import posixpath
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from main_server.db.config import settings
+from main_server.db.repositories import ReportRepository, S3StorageRepository, StorageUsageRepository
+from main_server.generation_reports import DatasetManifest
+from main_server.services.email_schedule_send import EventLoopEngineManager, run_async_in_thread
+from main_server.services.object_cache import cleanup_delivery_files
+
+logger = logging.getLogger(__name__)
+
+# Разделы хранилища с файлами отчетов; фрагменты разделов (cache/sections)
+# ограничиваются по объему при генерации и сверкой не затрагиваются
+GC_PREFIXES = ("source/", "reports/", "datasets/")
+STORAGE_GC_JOB_ID = 'storage_gc'
+
+
+class StorageGcService:
+    """
+    Сверка хранилища с таблицей generated_reports.
+
+    Объекты без ссылки из отчетов (исходные файлы генераций, завершившихся ошибкой,
+    неиспользованные прямые загрузки) удаляются пакетами DeleteObjects.
+    Объект считается используемым, если его ключ записан в отчете (в том числе
+    в списке исходных файлов source_urls) или в манифесте набора данных отчета:
+    части набора могут лежать в каталогах предыдущих загрузок. У отчетов без
+    source_urls (созданных до его появления) используемыми считаются и файлы
+    в каталоге первой выгрузки - там лежат остальные выгрузки (data_<i>.xlsx).
+    По используемым объектам рассчитывается объем хранилища по авторам отчетов.
+    """
+
+    def __init__(
+            self,
+            storage: S3StorageRepository,
+            report_repository: ReportRepository,
+            usage_repository: StorageUsageRepository
+    ):
+        """
+        Args:
+            storage: Репозиторий хранилища
+            report_repository: Репозиторий отчетов
+            usage_repository: Репозиторий объема хранилища по пользователям
+        """
+        self.storage = storage
+        self.report_repository = report_repository
+        self.usage_repository = usage_repository
+
+    async def list_all(self) -> List[Dict[str, Any]]:
+        """
+        Объекты разделов GC_PREFIXES.
+
+        Каждый раздел делится на подкаталоги первого уровня (даты, загрузки),
+        которые перечисляются параллельно, не более S3_MAX_CONCURRENCY одновременно.
+        """
+        levels = await asyncio.gather(*(self.storage.list_children(prefix) for prefix in GC_PREFIXES))
+        objects = [obj for level_objects, _ in levels for obj in level_objects]
+        semaphore = asyncio.Semaphore(settings.S3_MAX_CONCURRENCY)
+
+        async def list_prefix(prefix: str) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self.storage.list_objects(prefix)
+
+        listings = await asyncio.gather(*(
+            list_prefix(prefix) for _, prefixes in levels for prefix in prefixes
+        ))
+        for listing in listings:
+            objects.extend(listing)
+        return objects
+
+    @staticmethod
+    def _owners(keys_by_user: Dict[Optional[UUID], set]) -> Dict[str, Optional[UUID]]:
+        """Авторы отчетов по ключам объектов"""
+        return {key: user_id for user_id, keys in keys_by_user.items() for key in keys}
+
+    async def chunk_owners(self, key_owners: Dict[str, Optional[UUID]]) -> Optional[Dict[str, Optional[UUID]]]:
+        """
+        Авторы отчетов по ключам частей наборов данных из манифестов отчетов
+
+        Манифесты читаются параллельно, не более S3_MAX_CONCURRENCY одновременно.
+
+        Returns:
+            Словарь {ключ части: UUID автора} или None, если какой-либо манифест
+            прочитать не удалось (тогда неизвестно, какие части используются)
+        """
+        manifests = [key for key in key_owners if DatasetManifest.is_manifest(key)]
+        semaphore = asyncio.Semaphore(settings.S3_MAX_CONCURRENCY)
+
+        async def load(key: str) -> DatasetManifest:
+            async with semaphore:
+                return DatasetManifest.from_bytes((await self.storage.download_file(key)).getvalue())
+
+        results = await asyncio.gather(*(load(key) for key in manifests), return_exceptions=True)
+        owners = {}
+        for key, result in zip(manifests, results):
+            if isinstance(result, BaseException):
+                logger.warning("Storage GC: cannot read dataset manifest %s: %s", key, result)
+                return None
+            for chunk_key, _, _ in result.chunks:
+                owners.setdefault(chunk_key, key_owners[key])
+        return owners
+
+    async def run(self, min_age: timedelta) -> Dict[str, int]:
+        """
+        Удаляет объекты без ссылок старше min_age и пересчитывает объем хранилища по пользователям
+
+        Args:
+            min_age: Возраст, моложе которого объекты не удаляются (идущие генерации и загрузки)
+
+        Returns:
+            Dict[str, int]: Итоги сверки (число и объем объектов, удаленных объектов и освобожденный объем)
+        """
+        # Хранилище перечисляется раньше чтения ссылок: объект, на который сослался
+        # новый отчет во время перечисления, уже будет среди ссылок
+        objects = await self.list_all()
+        key_owners = self._owners(await self.report_repository.get_object_keys_by_user())
+        dir_owners = {
+            posixpath.dirname(key): user_id
+            for key, user_id in self._owners(await self.report_repository.get_legacy_source_keys_by_user()).items()
+        }
+        chunk_owners = await self.chunk_owners(key_owners)
+        # Без всех манифестов части наборов данных не удаляются
+        keep_datasets = chunk_owners is None
+        for key, user_id in (chunk_owners or {}).items():
+            key_owners.setdefault(key, user_id)
+
+        expire_before = datetime.now(timezone.utc) - min_age
+        usage: Dict[UUID, Tuple[int, int]] = {}
+        orphans = []
+        for obj in objects:
+            key = obj["Key"]
+            if key in key_owners:
+                owner = key_owners[key]
+            elif posixpath.dirname(key) in dir_owners:
+                owner = dir_owners[posixpath.dirname(key)]
+            else:
+                if obj["LastModified"] < expire_before and not (keep_datasets and key.startswith("datasets/")):
+                    orphans.append(obj)
+                continue
+            if owner is not None:
+                count, size = usage.get(owner, (0, 0))
+                usage[owner] = (count + 1, size + obj["Size"])
+
+        failed = set(await self.storage.delete_objects([obj["Key"] for obj in orphans]))
+        deleted = [obj for obj in orphans if obj["Key"] not in failed]
+
+        await self.usage_repository.replace_usage(usage, datetime.utcnow() + timedelta(hours=3))
+
+        stats = {
+            "objects": len(objects),
+            "bytes": sum(obj["Size"] for obj in objects),
+            "deleted_objects": len(deleted),
+            "deleted_bytes": sum(obj["Size"] for obj in deleted),
+            "failed_objects": len(failed)
+        }
+        logger.info("Storage GC: %s", stats)
+        return stats
+
+
+@run_async_in_thread
+async def storage_gc_task(db_url_asyncpg: str) -> Dict[str, int]:
+    """Задача планировщика: сверка хранилища и очистка локального кэша доставки"""
+    # Клиент S3 процесса привязан к циклу событий приложения, задача создает свой
+    from main_server.core.dependencies import s3_client_context, storage_repository
+
+    removed, freed = await asyncio.to_thread(
+        cleanup_delivery_files, settings.DELIVERY_CACHE_MAX_AGE_HOURS * 3600
+    )
+    logger.info("Delivery cache cleanup: %d directories, %d bytes", removed, freed)
+
+    try:
+        local_session_factory = EventLoopEngineManager.get_engine_factory(db_url_asyncpg)
+        async with s3_client_context() as s3_client, local_session_factory() as session:
+            service = StorageGcService(
+                storage_repository(s3_client),
+                ReportRepository(session),
+                StorageUsageRepository(session)
+            )
+            stats = await service.run(timedelta(hours=settings.STORAGE_GC_MIN_AGE_HOURS))
+            await session.commit()
+        return stats
+    finally:
+        await EventLoopEngineManager.cleanup()